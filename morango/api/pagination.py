@@ -0,0 +1,46 @@
+import uuid
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+
+
+class BufferPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination of buffers, which also supports keyset pagination when the `after`
+    query param is provided, with the `BUFFER_KEYSET_PAGINATION` capability. Keyset pages are
+    ordered by `model_uuid`, and contain the buffers with a `model_uuid` greater than `after`,
+    so each page is a range query on the transfer session and model UUID unique index, rather
+    than a scan over all the preceding records. An empty `after` starts from the `offset`.
+    """
+
+    keyset_query_param = "after"
+    invalid_keyset_message = "Invalid keyset"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.after = request.query_params.get(self.keyset_query_param)
+        if self.after is None:
+            return super(BufferPagination, self).paginate_queryset(
+                queryset, request, view=view
+            )
+
+        queryset = queryset.order_by("model_uuid")
+        if self.after:
+            try:
+                after = uuid.UUID(self.after).hex
+            except ValueError:
+                raise NotFound(self.invalid_keyset_message)
+            queryset = queryset.filter(model_uuid__gt=after)
+
+        # keyset pages skip the count, since that would again scan all the records
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        if self.limit is None:
+            return list(queryset[self.offset :])
+        return list(queryset[self.offset : self.offset + self.limit])
+
+    def get_paginated_response(self, data):
+        if self.after is None:
+            return super(BufferPagination, self).get_paginated_response(data)
+        return Response(OrderedDict([("results", data)]))
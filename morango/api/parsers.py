@@ -1,22 +1,51 @@
-import io
-import json
-
 from rest_framework.parsers import BaseParser
 
+from morango.codecs import get_json_codec
+from morango.compression import GzipCompression
+from morango.compression import Lz4Compression
+from morango.compression import ZstdCompression
+
 
-class GzipParser(BaseParser):
+class CompressedParser(BaseParser):
     """
-    Parses Gzipped data.
+    Parses compressed JSON data, with the compression of the parser's media type.
     """
 
-    media_type = "application/gzip"
+    compression = None
 
     def parse(self, stream, media_type=None, parser_context=None):
         """
-        Parses the incoming bytestream by decompressing the gzipped data and returns the resulting data as a dictionary.
+        Parses the incoming bytestream by decompressing the data and returns the resulting data as a dictionary.
         """
-        import gzip
+        data = self.compression.decompress(stream.read())
+        return get_json_codec().loads(data.decode("utf-8"))
+
+
+class GzipParser(CompressedParser):
+    """
+    Parses Gzipped data.
+    """
+
+    compression = GzipCompression()
+    media_type = compression.media_type
+
+
+class ZstdParser(CompressedParser):
+    """
+    Parses Zstandard compressed data.
+    """
+
+    compression = ZstdCompression()
+    media_type = compression.media_type
+
+
+class Lz4Parser(CompressedParser):
+    """
+    Parses LZ4 compressed data.
+    """
+
+    compression = Lz4Compression()
+    media_type = compression.media_type
+
 
-        with gzip.GzipFile(fileobj=io.BytesIO(stream.read())) as f:
-            data = f.read()
-        return json.loads(data.decode("utf-8"))
+COMPRESSED_PARSERS = (ZstdParser, Lz4Parser, GzipParser)
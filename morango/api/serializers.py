@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from rest_framework import exceptions
 from rest_framework import serializers
 from rest_framework.fields import ReadOnlyField
@@ -158,11 +160,40 @@ class RecordMaxCounterBufferSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class BufferListSerializer(serializers.ListSerializer):
+    """
+    Serializes a list of buffers, loading the record max counter buffers for all of them together
+    rather than querying them separately for each buffer
+    """
+
+    # keeps the number of query params within SQLite's limit on variables
+    rmcb_query_batch_size = 500
+
+    def to_representation(self, data):
+        buffers = list(data.all() if hasattr(data, "all") else data)
+
+        rmcbs = defaultdict(list)
+        for i in range(0, len(buffers), self.rmcb_query_batch_size):
+            batch = buffers[i : i + self.rmcb_query_batch_size]
+            for rmcb in RecordMaxCounterBuffer.objects.filter(
+                transfer_session_id__in=set(b.transfer_session_id for b in batch),
+                model_uuid__in=[b.model_uuid for b in batch],
+            ):
+                rmcbs[(rmcb.transfer_session_id, rmcb.model_uuid)].append(rmcb)
+
+        for buffer in buffers:
+            buffer.prefetch_rmcb_list(
+                rmcbs[(buffer.transfer_session_id, buffer.model_uuid)]
+            )
+        return super(BufferListSerializer, self).to_representation(buffers)
+
+
 class BufferSerializer(serializers.ModelSerializer):
     rmcb_list = RecordMaxCounterBufferSerializer(many=True)
 
     class Meta:
         model = Buffer
+        list_serializer_class = BufferListSerializer
         fields = (
             "serialized",
             "deleted",
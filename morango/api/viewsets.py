@@ -4,10 +4,10 @@ import platform
 import uuid
 
 from django.core.exceptions import ValidationError
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from ipware.ip import get_ip
 from rest_framework import mixins
-from rest_framework import pagination
 from rest_framework import response
 from rest_framework import status
 from rest_framework import viewsets
@@ -17,10 +17,14 @@ import morango
 from morango import errors
 from morango.api import permissions
 from morango.api import serializers
+from morango.api.pagination import BufferPagination
+from morango.api.parsers import COMPRESSED_PARSERS
+from morango.codecs import get_json_codec
+from morango.compression import GzipCompression
+from morango.compression import negotiate_compression
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.constants.capabilities import ASYNC_OPERATIONS
-from morango.constants.capabilities import GZIP_BUFFER_POST
 from morango.models import certificates
 from morango.models.core import Buffer
 from morango.models.core import Certificate
@@ -35,12 +39,11 @@ from morango.utils import CAPABILITIES
 from morango.utils import parse_capabilities_from_server_request
 
 
-if GZIP_BUFFER_POST in CAPABILITIES:
-    from .parsers import GzipParser
-
-    parsers = (GzipParser, JSONParser)
-else:
-    parsers = (JSONParser,)
+parsers = tuple(
+    parser
+    for parser in COMPRESSED_PARSERS
+    if parser.compression.push_capability in CAPABILITIES
+) + (JSONParser,)
 
 
 def controller_signal_logger(context=None):
@@ -56,6 +59,63 @@ def controller_signal_logger(context=None):
         logging.info("Encountered error during stage '{}'".format(context.stage))
 
 
+def _iter_serialized(serializer, instances):
+    """
+    Serializes instances in batches with a list serializer, such as the `BufferListSerializer`
+    which loads the record max counter buffers of each batch together
+
+    :type serializer: rest_framework.serializers.ListSerializer
+    :param instances: An iterable of model instances
+    :return: A generator of serialized records
+    """
+    batch_size = getattr(serializer, "rmcb_query_batch_size", 500)
+    batch = []
+    for instance in instances:
+        batch.append(instance)
+        if len(batch) >= batch_size:
+            for record in serializer.to_representation(batch):
+                yield record
+            batch = []
+    if batch:
+        for record in serializer.to_representation(batch):
+            yield record
+
+
+def _iter_compressed_json(data, compression):
+    """
+    Encodes and compresses an iterable of records, or a page of them with the records under
+    `results`, one record at a time, so the whole encoded list isn't held in memory alongside its
+    compression
+
+    :param data: An iterable of dicts, or a dict with a `results` iterable of dicts
+    :type compression: morango.compression.BaseCompression
+    :return: A generator of compressed bytes
+    """
+    json_codec = get_json_codec()
+    if isinstance(data, dict):
+        envelope = dict(data)
+        records = envelope.pop("results")
+        prefix = json_codec.dumps(envelope)[:-1]
+        prefix += '{}"results": ['.format(", " if envelope else "")
+        suffix = "]}"
+    else:
+        records = data
+        prefix = "["
+        suffix = "]"
+
+    compressor = compression.compressobj()
+    pieces = [prefix]
+    for i, record in enumerate(records):
+        pieces.append((", " if i else "") + json_codec.dumps(record))
+        # compress in batches of records, rather than each tiny piece separately
+        if len(pieces) >= 100:
+            yield compressor.compress("".join(pieces).encode("utf-8"))
+            pieces = []
+    pieces.append(suffix)
+    yield compressor.compress("".join(pieces).encode("utf-8"))
+    yield compressor.flush()
+
+
 session_controller = SessionController.build()
 session_controller.signals.connect(controller_signal_logger)
 
@@ -472,7 +532,7 @@ class TransferSessionViewSet(
 class BufferViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     permission_classes = (permissions.BufferPermissions,)
     serializer_class = serializers.BufferSerializer
-    pagination_class = pagination.LimitOffsetPagination
+    pagination_class = BufferPagination
     parser_classes = parsers
 
     def create(self, request):
@@ -507,6 +567,53 @@ class BufferViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
 
         return response.Response(status=response_status)
 
+    def list(self, request, *args, **kwargs):
+        compression = self.get_response_compression()
+        if compression is None:
+            return super(BufferViewSet, self).list(request, *args, **kwargs)
+
+        # stream the compressed response, serializing batches of records as they're compressed,
+        # rather than serializing and rendering the whole page and then compressing it all
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(many=True)
+        if page is None:
+            data = _iter_serialized(serializer, queryset.iterator())
+        else:
+            data = self.get_paginated_response(_iter_serialized(serializer, page)).data
+
+        if compression.name == GzipCompression.name:
+            # gzip is sent as a content encoding, which clients decode transparently
+            compressed_response = StreamingHttpResponse(
+                _iter_compressed_json(data, compression),
+                content_type="application/json",
+            )
+            compressed_response["Content-Encoding"] = "gzip"
+            compressed_response["Vary"] = "Accept-Encoding"
+        else:
+            compressed_response = StreamingHttpResponse(
+                _iter_compressed_json(data, compression),
+                content_type=compression.media_type,
+            )
+        return compressed_response
+
+    def get_response_compression(self):
+        """
+        :return: The compression negotiated with the client for buffer responses, if any, where
+            gzip also requires that the client accepts the gzip content encoding
+        :rtype: morango.compression.BaseCompression|None
+        """
+        client_capabilities = parse_capabilities_from_server_request(self.request)
+        compression = negotiate_compression(client_capabilities, pull=True)
+        accept_encoding = self.request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if (
+            compression is not None
+            and compression.name == GzipCompression.name
+            and "gzip" not in accept_encoding
+        ):
+            return None
+        return compression
+
     def get_queryset(self):
         session_id = self.request.query_params["transfer_session_id"]
         return Buffer.objects.filter(transfer_session_id=session_id).order_by("pk")
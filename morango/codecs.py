@@ -0,0 +1,87 @@
+"""
+JSON codecs used for encoding and decoding the serialized payloads of store and buffer records.
+The codec in use is configured through the `MORANGO_JSON_CODEC` setting.
+"""
+import json
+import sys
+from collections import OrderedDict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from morango.errors import MorangoError
+from morango.utils import do_import
+from morango.utils import SETTINGS
+
+try:
+    import orjson
+
+    ORJSON_EXISTS = True
+except ImportError:
+    ORJSON_EXISTS = False
+
+
+class JSONCodec(object):
+    """
+    The default codec, using the standard library's `json` module along with Django's encoder,
+    which handles dates, times, decimals and UUIDs
+    """
+
+    def __init__(self):
+        # the encoder holds no state between calls, so reuse one rather than creating one each time
+        self._encoder = DjangoJSONEncoder()
+        # before python 3.7, dicts don't keep the order of their keys, so objects are decoded
+        # into ordered dicts for re-encoding them to give the same JSON
+        self._decoder = json.JSONDecoder(
+            object_pairs_hook=OrderedDict if sys.version_info < (3, 7) else None
+        )
+
+    def dumps(self, obj):
+        """
+        :param obj: The object to encode
+        :return: A JSON str
+        """
+        return self._encoder.encode(obj)
+
+    def loads(self, data):
+        """
+        :param data: A JSON str
+        :return: The decoded object
+        """
+        return self._decoder.decode(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    A faster codec using `orjson`, which must be installed. Values `orjson` doesn't natively
+    support, and dates and times, are encoded the same way as `JSONCodec`. Its output is compact,
+    without whitespace between separators, but otherwise decodes identically to `JSONCodec`'s.
+    """
+
+    def __init__(self):
+        if not ORJSON_EXISTS:
+            raise MorangoError("OrjsonCodec requires the orjson package to be installed")
+        super(OrjsonCodec, self).__init__()
+        self._option = orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj):
+        return orjson.dumps(
+            obj, default=self._encoder.default, option=self._option
+        ).decode("utf-8")
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+_codecs = {}
+
+
+def get_json_codec():
+    """
+    :return: An instance of the codec configured by the `MORANGO_JSON_CODEC` setting
+    :rtype: JSONCodec
+    """
+    import_string = SETTINGS.MORANGO_JSON_CODEC
+    codec = _codecs.get(import_string)
+    if codec is None:
+        codec = _codecs[import_string] = do_import(import_string)()
+    return codec
@@ -0,0 +1,242 @@
+"""
+Compressions of the buffer payloads sent between morango instances, when pushing and pulling. The
+compression used is negotiated through capabilities, by the sender choosing the first in the order
+of the `MORANGO_COMPRESSION` setting which both instances support.
+"""
+from collections import OrderedDict
+
+from morango.codecs import get_json_codec
+from morango.constants.capabilities import GZIP_BUFFER_GET
+from morango.constants.capabilities import GZIP_BUFFER_POST
+from morango.constants.capabilities import LZ4_BUFFER_COMPRESSION
+from morango.constants.capabilities import ZSTD_BUFFER_COMPRESSION
+from morango.utils import CAPABILITIES
+from morango.utils import SETTINGS
+
+try:
+    import zstandard
+
+    ZSTD_EXISTS = True
+except ImportError:
+    ZSTD_EXISTS = False
+
+try:
+    import lz4.frame
+
+    LZ4_EXISTS = True
+except ImportError:
+    LZ4_EXISTS = False
+
+
+class BaseCompression(object):
+    """
+    A compression of payloads, negotiated with the remote instance through the capabilities
+    """
+
+    # the name of the compression, used in the `MORANGO_COMPRESSION` setting
+    name = None
+    # the content type of payloads sent with the compression
+    media_type = None
+    # the capabilities required for pushing and pulling payloads with the compression
+    push_capability = None
+    pull_capability = None
+    # the default, lowest and highest compression levels
+    default_level = None
+    min_level = None
+    max_level = None
+
+    def from_gzip_level(self, gzip_level):
+        """
+        Maps a gzip compression level, such as a connection's `compresslevel`, onto the levels of
+        this compression, where gzip's lowest, default and highest levels map to this compression's
+
+        :param gzip_level: A gzip compression level from 1 to 9, or None for the default level
+        :return: The compression level, or None for the default level
+        """
+        if gzip_level is None:
+            return None
+        gzip_level = max(
+            GzipCompression.min_level, min(gzip_level, GzipCompression.max_level)
+        )
+        if gzip_level <= GzipCompression.default_level:
+            low, high = self.min_level, self.default_level
+            gzip_low, gzip_high = GzipCompression.min_level, GzipCompression.default_level
+        else:
+            low, high = self.default_level, self.max_level
+            gzip_low, gzip_high = GzipCompression.default_level, GzipCompression.max_level
+        fraction = float(gzip_level - gzip_low) / (gzip_high - gzip_low)
+        return int(round(low + fraction * (high - low)))
+
+    def compressobj(self, level=None):
+        """
+        :param level: The compression level, defaulting to `default_level`
+        :return: An object with `compress` and `flush` methods, for compressing in pieces
+        """
+        raise NotImplementedError("Compression `compressobj` method is missing")
+
+    def compress(self, data, level=None):
+        """
+        :param data: The bytes to compress
+        :param level: The compression level, defaulting to `default_level`
+        :return: The compressed bytes
+        """
+        compressor = self.compressobj(level=level)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data):
+        """
+        :param data: The compressed bytes
+        :return: The decompressed bytes
+        """
+        raise NotImplementedError("Compression `decompress` method is missing")
+
+
+class GzipCompression(BaseCompression):
+    """
+    Gzip, at a lower level than its max of 9 by default, which compresses buffer payloads only
+    marginally smaller for several times the CPU time
+    """
+
+    name = "gzip"
+    media_type = "application/gzip"
+    push_capability = GZIP_BUFFER_POST
+    pull_capability = GZIP_BUFFER_GET
+    default_level = 6
+    min_level = 1
+    max_level = 9
+
+    def compressobj(self, level=None):
+        import zlib
+
+        # the wbits offset of 16 writes a gzip header and trailer
+        return zlib.compressobj(
+            self.default_level if level is None else level,
+            zlib.DEFLATED,
+            16 + zlib.MAX_WBITS,
+        )
+
+    def decompress(self, data):
+        import zlib
+
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+class ZstdCompression(BaseCompression):
+    """
+    Zstandard, using the `zstandard` package, which compresses close to gzip's ratio at several
+    times its speed
+    """
+
+    name = "zstd"
+    media_type = "application/zstd"
+    push_capability = ZSTD_BUFFER_COMPRESSION
+    pull_capability = ZSTD_BUFFER_COMPRESSION
+    default_level = 3
+    min_level = 1
+    # the levels above 19 require more memory to decompress
+    max_level = 19
+
+    def compressobj(self, level=None):
+        return zstandard.ZstdCompressor(
+            level=self.default_level if level is None else level
+        ).compressobj()
+
+    def decompress(self, data):
+        # a streamed frame doesn't include its content size, which `decompress` requires
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+class _Lz4FrameCompressor(object):
+    """
+    Adapts `lz4.frame.LZ4FrameCompressor` to the `compress` and `flush` methods of a compressobj
+    """
+
+    __slots__ = ("_compressor", "_header")
+
+    def __init__(self, level):
+        self._compressor = lz4.frame.LZ4FrameCompressor(compression_level=level)
+        self._header = self._compressor.begin()
+
+    def compress(self, data):
+        header, self._header = self._header, b""
+        return header + self._compressor.compress(data)
+
+    def flush(self):
+        header, self._header = self._header, b""
+        return header + self._compressor.flush()
+
+
+class Lz4Compression(BaseCompression):
+    """
+    LZ4, using the `lz4` package, which compresses to a lower ratio than gzip and zstd but is the
+    fastest, for when the link is faster than the CPU
+    """
+
+    name = "lz4"
+    media_type = "application/x-lz4"
+    push_capability = LZ4_BUFFER_COMPRESSION
+    pull_capability = LZ4_BUFFER_COMPRESSION
+    default_level = 0
+    min_level = 0
+    max_level = 16
+
+    def compressobj(self, level=None):
+        return _Lz4FrameCompressor(self.default_level if level is None else level)
+
+    def decompress(self, data):
+        return lz4.frame.decompress(data)
+
+
+COMPRESSIONS = OrderedDict(
+    (compression.name, compression)
+    for compression in (ZstdCompression(), Lz4Compression(), GzipCompression())
+)
+
+
+def negotiate_compression(remote_capabilities, pull=False):
+    """
+    :param remote_capabilities: The capabilities of the instance receiving the payload
+    :param pull: Whether the payload is a pulled page of buffers, otherwise a pushed chunk
+    :return: The first compression of the `MORANGO_COMPRESSION` setting that both this and the
+        remote instance support, or None
+    :rtype: BaseCompression|None
+    """
+    for name in SETTINGS.MORANGO_COMPRESSION:
+        compression = COMPRESSIONS.get(name)
+        if compression is None:
+            continue
+        capability = (
+            compression.pull_capability if pull else compression.push_capability
+        )
+        if capability in remote_capabilities and capability in CAPABILITIES:
+            return compression
+    return None
+
+
+def get_compression_for_media_type(media_type):
+    """
+    :param media_type: A content type, which may include parameters
+    :return: The compression with the media type, or None
+    :rtype: BaseCompression|None
+    """
+    media_type = (media_type or "").split(";")[0].strip()
+    for compression in COMPRESSIONS.values():
+        if compression.media_type == media_type:
+            return compression
+    return None
+
+
+def decode_response_json(response):
+    """
+    Decodes the JSON of a response, which is decompressed first if its content type is that of one
+    of the compressions. Gzip is instead sent with a content encoding, which `requests` decodes.
+
+    :type response: requests.Response
+    :return: The decoded JSON
+    """
+    compression = get_compression_for_media_type(response.headers.get("Content-Type"))
+    if compression is None:
+        return response.json()
+    return get_json_codec().loads(
+        compression.decompress(response.content).decode("utf-8")
+    )
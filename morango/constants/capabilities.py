@@ -2,3 +2,9 @@ GZIP_BUFFER_POST = "GZIP_BUFFER_POST"
 ALLOW_CERTIFICATE_PUSHING = "ALLOW_CERTIFICATE_PUSHING"
 ASYNC_OPERATIONS = "ASYNC_OPERATIONS"
 FSIC_V2_FORMAT = "FSIC_V2_FORMAT"
+INCREMENTAL_QUEUING = "INCREMENTAL_QUEUING"
+BUFFER_KEYSET_PAGINATION = "BUFFER_KEYSET_PAGINATION"
+CONCURRENT_BUFFER_POST = "CONCURRENT_BUFFER_POST"
+GZIP_BUFFER_GET = "GZIP_BUFFER_GET"
+ZSTD_BUFFER_COMPRESSION = "ZSTD_BUFFER_COMPRESSION"
+LZ4_BUFFER_COMPRESSION = "LZ4_BUFFER_COMPRESSION"
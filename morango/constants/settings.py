@@ -1,9 +1,24 @@
 ALLOW_CERTIFICATE_PUSHING = False
 MORANGO_SERIALIZE_BEFORE_QUEUING = True
 MORANGO_DESERIALIZE_AFTER_DEQUEUING = True
+MORANGO_DESERIALIZE_SCOPED_TO_TRANSFER_SESSION = False
+MORANGO_SERIALIZE_CHUNK_SIZE = 500
+MORANGO_INCREMENTAL_QUEUING = False
+MORANGO_QUEUE_BATCH_SIZE = 5000
+MORANGO_DEQUEUE_BATCH_SIZE = None
+MORANGO_INCREMENTAL_DEQUEUE = False
+MORANGO_PUSH_WINDOW_SIZE = 1
+MORANGO_PULL_PREFETCH = False
+MORANGO_PULL_UPDATE_CHUNKS = 1
+MORANGO_PULL_UPDATE_SECONDS = None
+MORANGO_DESERIALIZE_WORKERS = 1
+MORANGO_JSON_CODEC = "morango.codecs:JSONCodec"
+MORANGO_COMPRESSION = ("zstd", "lz4", "gzip")
 MORANGO_DISALLOW_ASYNC_OPERATIONS = False
 MORANGO_DISABLE_FSIC_V2_FORMAT = False
 MORANGO_DISABLE_FSIC_REDUCTION = False
+MORANGO_POSTGRES_PREPARED_STATEMENTS = False
+MORANGO_POSTGRES_MERGED_DEQUEUE = False
 MORANGO_INSTANCE_INFO = {}
 MORANGO_INITIALIZE_OPERATIONS = (
     "morango.sync.operations:InitializeOperation",
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db import models
+
+
+class ConditionalConcurrentPatternIndex(migrations.AddIndex):
+    """
+    Adds an index concurrently on PostgreSQL, if it doesn't already exist, using `text_pattern_ops`
+    for the `partition` column so the index can serve `LIKE 'prefix%'` comparisons
+    """
+
+    pattern_fields = ("partition",)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if "postgresql" in schema_editor.connection.vendor:
+            # vendored from 0021_store_partition_index_create, allowing multiple columns
+            model = to_state.apps.get_model(app_label, self.model_name)
+            quote_name = schema_editor.quote_name
+            sql_template = "CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {table_name} ({columns}){extra}"
+            fields = [model._meta.get_field(field_name) for field_name, _ in self.index.fields_orders]
+            tablespace_sql = schema_editor._get_index_tablespace_sql(model, fields)
+            columns = [
+                (
+                    '%s %s %s' % (
+                        quote_name(field.column),
+                        "text_pattern_ops" if field.name in self.pattern_fields else "",
+                        order,
+                    )
+                ).strip()
+                for field, (_, order) in zip(fields, self.index.fields_orders)
+            ]
+            schema_editor.execute(
+                sql_template.format(
+                    index_name=quote_name(self.index.name),
+                    table_name=quote_name(model._meta.db_table),
+                    columns=', '.join(columns),
+                    extra=tablespace_sql
+                )
+            )
+        else:
+            super(ConditionalConcurrentPatternIndex, self).database_forwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # In order to generate an index concurrently, we cannot run it inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('morango', '0023_add_instance_id_fields'),
+    ]
+
+    operations = [
+        ConditionalConcurrentPatternIndex(
+            model_name='store',
+            index=models.Index(
+                fields=['profile', 'last_saved_instance', 'last_saved_counter', 'partition'],
+                name='idx_morango_store_queuing',
+            ),
+        ),
+        ConditionalConcurrentPatternIndex(
+            model_name='store',
+            index=models.Index(
+                fields=['last_saved_instance', 'partition'],
+                name='idx_morango_store_instance',
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('morango', '0024_store_queuing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transfersession',
+            name='dequeue_counter',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -6,6 +6,7 @@ import logging
 import uuid
 from collections import defaultdict
 from collections import namedtuple
+from collections import OrderedDict
 from functools import reduce
 
 from django.core import exceptions
@@ -28,6 +29,7 @@ from django.utils import timezone
 from django.utils.functional import cached_property
 
 from morango import proquint
+from morango.codecs import get_json_codec
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.errors import InvalidMorangoSourceId
@@ -282,6 +284,8 @@ class TransferSession(models.Model):
     )  # total number of records to be synced across in this transfer
     bytes_sent = models.BigIntegerField(default=0, null=True, blank=True)
     bytes_received = models.BigIntegerField(default=0, null=True, blank=True)
+    # the instance counter recorded against merge conflicts dequeued during this transfer session
+    dequeue_counter = models.IntegerField(blank=True, null=True)
 
     sync_session = models.ForeignKey(SyncSession, on_delete=models.CASCADE)
 
@@ -334,9 +338,17 @@ class TransferSession(models.Model):
             self.transfer_stage_status = stage_status
         if stage is not None or stage_status is not None:
             self.last_activity_timestamp = timezone.now()
-            self.save()
+            # only the state is saved, since `records_transferred` may be concurrently incremented
+            # by chunks being received
+            self.save(
+                update_fields=[
+                    "transfer_stage",
+                    "transfer_stage_status",
+                    "last_activity_timestamp",
+                ]
+            )
             self.sync_session.last_activity_timestamp = timezone.now()
-            self.sync_session.save()
+            self.sync_session.save(update_fields=["last_activity_timestamp"])
 
     def delete_buffers(self):
         """
@@ -453,6 +465,21 @@ class Store(AbstractStore):
     class Meta:
         indexes = [
             models.Index(fields=["partition"], name="idx_morango_store_partition"),
+            # for queuing, filtering on the profile and the instance counters, covering the partition
+            models.Index(
+                fields=[
+                    "profile",
+                    "last_saved_instance",
+                    "last_saved_counter",
+                    "partition",
+                ],
+                name="idx_morango_store_queuing",
+            ),
+            # for FSIC reduction, matching the instance and the partition prefix
+            models.Index(
+                fields=["last_saved_instance", "partition"],
+                name="idx_morango_store_instance",
+            ),
         ]
 
     def _deserialize_store_model(self, fk_cache, defer_fks=False):  # noqa: C901
@@ -479,7 +506,9 @@ class Store(AbstractStore):
             return None, deferred_fks
         else:
             # load model into memory
-            app_model = klass_model.deserialize(json.loads(self.serialized))
+            app_model = klass_model.deserialize(
+                get_json_codec().loads(self.serialized)
+            )
             app_model._morango_source_id = self.source_id
             app_model._morango_partition = self.partition
             app_model._morango_dirty_bit = False
@@ -533,14 +562,27 @@ class Buffer(AbstractStore):
     transfer_session = models.ForeignKey(TransferSession, on_delete=models.CASCADE)
     model_uuid = UUIDField()
 
+    _prefetched_rmcb_list = None
+
     class Meta:
         unique_together = ("transfer_session", "model_uuid")
 
     def rmcb_list(self):
+        if self._prefetched_rmcb_list is not None:
+            return self._prefetched_rmcb_list
         return RecordMaxCounterBuffer.objects.filter(
             model_uuid=self.model_uuid, transfer_session_id=self.transfer_session_id
         )
 
+    def prefetch_rmcb_list(self, rmcb_list):
+        """
+        Sets the record max counter buffers returned by `rmcb_list`, so that they can be loaded
+        for many buffers at once
+
+        :param rmcb_list: A list of the buffer's `RecordMaxCounterBuffer`s
+        """
+        self._prefetched_rmcb_list = rmcb_list
+
 
 class AbstractCounter(models.Model):
     """
@@ -595,37 +637,37 @@ class DatabaseMaxCounter(AbstractCounter):
     @classmethod
     @transaction.atomic
     def update_fsics(cls, fsics, sync_filter, v2_format=False):
-        internal_fsic = DatabaseMaxCounter.calculate_filter_specific_instance_counters(
-            sync_filter, v2_format=v2_format
-        )
+        """
+        Raises the database max counters to those of the FSIC received from the remote, with a
+        single upsert, leaving those already covered by a counter at least as large, for the same
+        partition or a prefix of it
+
+        :param fsics: The FSIC dict received from the remote
+        :param sync_filter: The sync's filter, to whose partitions a v1 FSIC's counters apply
+        :type sync_filter: Filter
+        :param v2_format: Whether the FSIC is in the v2 format, with counters per partition
+        """
+        from morango.sync.backends.utils import load_backend
+
         if v2_format:
-            internal_fsic = internal_fsic["sub"]
-            fsics = fsics["sub"]
-            for part, insts in fsics.items():
-                for inst, counter in insts.items():
-                    if internal_fsic.get("part", {}).get(inst, 0) < counter:
-                        DatabaseMaxCounter.objects.update_or_create(
-                            instance_id=inst,
-                            partition=part,
-                            defaults={"counter": counter},
-                        )
+            counters = (
+                (inst, part, counter)
+                for part, insts in fsics["sub"].items()
+                for inst, counter in insts.items()
+            )
         else:
-            updated_fsic = {}
-            for key, value in six.iteritems(fsics):
-                if key in internal_fsic:
-                    # if same instance id, update fsic with larger value
-                    if fsics[key] > internal_fsic[key]:
-                        updated_fsic[key] = fsics[key]
-                else:
-                    # if instance id is not present, add it to updated fsics
-                    updated_fsic[key] = fsics[key]
-
-            # load database max counters
-            for (key, value) in six.iteritems(updated_fsic):
-                for f in sync_filter:
-                    DatabaseMaxCounter.objects.update_or_create(
-                        instance_id=key, partition=f, defaults={"counter": value}
-                    )
+            counters = (
+                (inst, part, counter)
+                for inst, counter in six.iteritems(fsics)
+                for part in sync_filter
+            )
+
+        db_values = [value for counter in counters for value in counter]
+        if db_values:
+            with connection.cursor() as cursor:
+                load_backend(connection)._bulk_database_max_counter_upsert(
+                    cursor, db_values
+                )
 
     @classmethod
     def get_instance_counters_for_partitions(cls, partitions, is_producer=False):
@@ -920,29 +962,54 @@ class SyncableModel(UUIDModelMixin):
         self.clean_fields(exclude=excluded_fields)
         return deferred_fks
 
-    def serialize(self):
-        """All concrete fields of the ``SyncableModel`` subclass, except for those specifically blacklisted, are returned in a dict."""
-        # NOTE: code adapted from https://github.com/django/django/blob/master/django/forms/models.py#L75
-        opts = self._meta
+    @classmethod
+    def compile_serialized_fields(cls):
+        """
+        Computes the `(attname, accessor)` pairs for the fields of this model class that are
+        serialized, and caches them on the class so that exclusions aren't re-evaluated for every
+        instance being serialized
 
-        data = {}
-        for f in opts.concrete_fields:
-            if f.attname in self.morango_fields_not_to_serialize:
+        :return: A list of tuples of the field's attname and a callable accepting the instance
+        """
+        serialized_fields = []
+        for f in cls._meta.concrete_fields:
+            if f.attname in cls.morango_fields_not_to_serialize:
                 continue
-            if f.attname in self._morango_internal_fields_not_to_serialize:
+            if f.attname in cls._morango_internal_fields_not_to_serialize:
                 continue
             # case if model is morango mptt
             if f.attname in getattr(
-                self,
+                cls,
                 "_internal_mptt_fields_not_to_serialize",
                 "_internal_fields_not_to_serialize",
             ):
                 continue
             if hasattr(f, "value_from_object_json_compatible"):
-                data[f.attname] = f.value_from_object_json_compatible(self)
+                serialized_fields.append((f.attname, f.value_from_object_json_compatible))
             else:
-                data[f.attname] = f.value_from_object(self)
-        return data
+                serialized_fields.append((f.attname, f.value_from_object))
+        cls._morango_serialized_fields = serialized_fields
+        return serialized_fields
+
+    @classmethod
+    def get_serialized_fields(cls):
+        """
+        :return: The cached `(attname, accessor)` pairs for the fields of this model class that are
+            serialized, compiling them if they haven't been already
+        """
+        # look directly on the class so we don't use the cache of a parent model class
+        serialized_fields = cls.__dict__.get("_morango_serialized_fields")
+        if serialized_fields is None:
+            serialized_fields = cls.compile_serialized_fields()
+        return serialized_fields
+
+    def serialize(self):
+        """All concrete fields of the ``SyncableModel`` subclass, except for those specifically blacklisted, are returned in a dict."""
+        # NOTE: code adapted from https://github.com/django/django/blob/master/django/forms/models.py#L75
+        # ordered, so the serialized data of an unchanged record is the same on every serialization
+        return OrderedDict(
+            (attname, accessor(self)) for attname, accessor in self.get_serialized_fields()
+        )
 
     @classmethod
     def deserialize(cls, dict_model):
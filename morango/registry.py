@@ -65,6 +65,22 @@ class SyncableModelRegistry(object):
         self.check_models_ready(profile)
         return list(self.profile_models.get(profile, {}).values())
 
+    def get_model_dependencies(self, profile):
+        """
+        Return an ordered dict of all syncable models for this profile, in dependency order, each
+        mapped to the set of models for this profile that it depends on.
+        """
+        models = self.get_models(profile)
+        dependencies = OrderedDict()
+        for model in models:
+            classes = _get_foreign_key_classes(model) | set(
+                getattr(model, "morango_model_dependencies", ())
+            )
+            dependencies[model] = set(
+                cls for cls in classes if cls in models and cls is not model
+            )
+        return dependencies
+
     def _insert_model_in_dependency_order(self, model, profile):
         # When we add models to be synced, we need to make sure
         #   that models that depend on other models are synced AFTER
@@ -169,6 +185,9 @@ class SyncableModelRegistry(object):
                         "{} model must define a morango_profile attribute".format(name)
                     )
 
+                # precompute the fields to serialize for the model
+                model.compile_serialized_fields()
+
                 # create empty list to hold model classes for profile if not yet created
                 profile = model.morango_profile
                 self.profile_models[profile] = self.profile_models.get(profile, [])
@@ -1,6 +1,7 @@
 from contextlib import contextmanager
 
 from morango.models.core import Buffer
+from morango.models.core import DatabaseMaxCounter
 from morango.models.core import RecordMaxCounter
 from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import Store
@@ -25,6 +26,20 @@ class BaseSQLWrapper(object):
         """Set the current transaction isolation level"""
         yield
 
+    def _execute_statement(self, cursor, name, sql, params, uses_temp_table=False):
+        """
+        Executes a statement whose SQL is the same for every execution, with only its bound
+        parameters varying, which allows the database to reuse it
+
+        :param cursor: The database connection cursor
+        :param name: A str name uniquely identifying the statement
+        :param sql: The SQL of the statement, with `%s` placeholders for its parameters
+        :param params: A list of the parameters
+        :param uses_temp_table: Whether the statement references a temporary table, which is
+            recreated for every use, so the statement can't be reused
+        """
+        cursor.execute(sql, params)
+
     def _create_placeholder_list(self, fields, db_values):
         # number of rows to update
         num_of_rows = len(db_values) // len(fields)
@@ -52,8 +67,125 @@ class BaseSQLWrapper(object):
     def _bulk_update(self, cursor, table_name, fields, db_values):
         raise NotImplementedError("Subclass must implement this method.")
 
-    def _dequeuing_delete_rmcb_records(self, cursor, transfersession_id):
+    def _get_record_max_counter_fields(self):
+        """
+        :return: A list of the `RecordMaxCounter` fields, in the order expected by
+            `_bulk_record_max_counter_upsert`
+        """
+        return [
+            RecordMaxCounter._meta.get_field(name)
+            for name in ("instance_id", "counter", "store_model")
+        ]
+
+    def _bulk_record_max_counter_upsert(self, cursor, db_values):
+        """
+        Inserts or updates `RecordMaxCounter` records, matching existing records on their unique
+        `store_model_id` and `instance_id` pair
+
+        :param cursor: The database connection cursor
+        :param db_values: A flat list of values, ordered by `instance_id`, `counter`, and
+            `store_model_id` for each record
+        """
+        raise NotImplementedError("Subclass must implement this method.")
+
+    def _get_database_max_counter_fields(self):
+        """
+        :return: A list of the `DatabaseMaxCounter` fields, in the order expected by
+            `_bulk_database_max_counter_upsert`
+        """
+        return [
+            DatabaseMaxCounter._meta.get_field(name)
+            for name in ("instance_id", "partition", "counter")
+        ]
+
+    def _bulk_database_max_counter_upsert(self, cursor, db_values):
+        """
+        Raises or creates `DatabaseMaxCounter` records, matching existing records on their unique
+        `instance_id` and `partition` pair, except those already covered by a counter at least as
+        large for the instance, on the same partition or a prefix of it
+
+        :param cursor: The database connection cursor
+        :param db_values: A flat list of values, ordered by `instance_id`, `partition`, and
+            `counter` for each record
+        """
+        raise NotImplementedError("Subclass must implement this method.")
+
+    def _dequeue_into_store(
+        self, cursor, transfersession_id, current_id, model_uuid_range=None
+    ):
+        """
+        Takes data from the buffers and merges into the store and record max counters, for either
+        all of the transfer session's buffered records or those within `model_uuid_range`.
+
+        ALGORITHM: Incrementally insert and delete on a case by case basis to ensure subsequent
+        cases are not affected by previous cases.
+
+        :param cursor: The database connection cursor
+        :param transfersession_id: The ID of the transfer session whose buffer is dequeued
+        :param current_id: The current `InstanceIDModel`, recorded against merge conflicts
+        :param model_uuid_range: A tuple of the first and last `model_uuid`, or None
+        """
+        self._dequeuing_delete_rmcb_records(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_delete_buffered_records(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_merge_conflict_buffer(
+            cursor, current_id, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_merge_conflict_rmcb(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_update_rmcs_last_saved_by(
+            cursor, current_id, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_delete_mc_rmcb(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_delete_mc_buffer(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_insert_remaining_buffer(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_insert_remaining_rmcb(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_delete_remaining_rmcb(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_delete_remaining_buffer(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+
+    def _dequeuing_batch(self, name, alias, model_uuid_range):
+        """
+        Scopes a dequeuing statement to a batch of the transfer session's buffered records, so the
+        buffer can be dequeued in multiple transactions. Every `_dequeuing_*` method accepts a
+        `model_uuid_range`, a tuple of the first and last `model_uuid` of the batch, inclusive,
+        or `None` to dequeue all of the buffered records.
+
+        :param name: The str name of the statement
+        :param alias: The alias of the buffer or RMCB table, whose records should be scoped
+        :param model_uuid_range: A tuple of the first and last `model_uuid`, or None
+        :return: A tuple of the statement name, the SQL condition, and the condition's params
+        """
+        if model_uuid_range is None:
+            return name, "", []
+        return (
+            "{}_batch".format(name),
+            "AND {alias}.model_uuid BETWEEN %s AND %s".format(alias=alias),
+            list(model_uuid_range),
+        )
+
+    def _dequeuing_delete_rmcb_records(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # delete all RMCBs which are a reverse FF (store version newer than buffer version)
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_delete_rmcb_records", "buffer", model_uuid_range
+        )
         delete_rmcb_records = """DELETE FROM {rmcb}
                                  WHERE model_uuid IN
                                  (SELECT rmcb.model_uuid FROM {store} as store, {buffer} as buffer, {rmc} as rmc, {rmcb} as rmcb
@@ -64,20 +196,30 @@ class BaseSQLWrapper(object):
                                  /*Checks whether LSB of buffer or less is in RMC of store*/
                                  AND buffer.last_saved_instance = rmc.instance_id
                                  AND buffer.last_saved_counter <= rmc.counter
-                                 AND rmcb.transfer_session_id = '{transfer_session_id}'
-                                 AND buffer.transfer_session_id = '{transfer_session_id}')
+                                 AND rmcb.transfer_session_id = %s
+                                 AND buffer.transfer_session_id = %s {batch})
                                   """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(delete_rmcb_records)
+        self._execute_statement(
+            cursor,
+            name,
+            delete_rmcb_records,
+            [transfersession_id] * 2 + batch_params,
+        )
 
-    def _dequeuing_delete_buffered_records(self, cursor, transfersession_id):
+    def _dequeuing_delete_buffered_records(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # delete all buffer records which are a reverse FF (store version newer than buffer version)
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_delete_buffered_records", "buffer", model_uuid_range
+        )
         delete_buffered_records = """DELETE FROM {buffer}
                                      WHERE model_uuid in
                                      (SELECT buffer.model_uuid FROM {store} as store, {buffer} as buffer, {rmc} as rmc
@@ -87,49 +229,75 @@ class BaseSQLWrapper(object):
                                      /*Checks whether LSB of buffer or less is in RMC of store*/
                                      AND buffer.last_saved_instance = rmc.instance_id
                                      AND buffer.last_saved_counter <= rmc.counter
-                                     AND buffer.transfer_session_id = '{transfer_session_id}')
+                                     AND buffer.transfer_session_id = %s {batch})
                                   """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
-        cursor.execute(delete_buffered_records)
+        self._execute_statement(
+            cursor,
+            name,
+            delete_buffered_records,
+            [transfersession_id] + batch_params,
+        )
 
-    def _dequeuing_merge_conflict_rmcb(self, cursor, transfersession_id):
+    def _dequeuing_merge_conflict_rmcb(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         raise NotImplementedError("Subclass must implement this method.")
 
-    def _dequeuing_merge_conflict_buffer(self, cursor, current_id, transfersession_id):
+    def _dequeuing_merge_conflict_buffer(
+        self, cursor, current_id, transfersession_id, model_uuid_range=None
+    ):
         raise NotImplementedError("Subclass must implement this method.")
 
     def _dequeuing_update_rmcs_last_saved_by(
-        self, cursor, current_id, transfersession_id
+        self, cursor, current_id, transfersession_id, model_uuid_range=None
     ):
         raise NotImplementedError("Subclass must implement this method.")
 
-    def _dequeuing_delete_mc_buffer(self, cursor, transfersession_id):
+    def _dequeuing_delete_mc_buffer(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # delete records with merge conflicts from buffer
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_delete_mc_buffer", Buffer._meta.db_table, model_uuid_range
+        )
         delete_mc_buffer = """DELETE FROM {buffer}
                                     WHERE EXISTS
                                     (SELECT 1 FROM {store} AS store, {buffer} AS buffer
                                     /*Scope to a single record.*/
                                     WHERE store.id = {buffer}.model_uuid
-                                    AND {buffer}.transfer_session_id = '{transfer_session_id}'
+                                    AND {buffer}.transfer_session_id = %s {batch}
                                     /*Exclude fast-forwards*/
                                     AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb WHERE store.id = rmcb.model_uuid
                                                                                   AND store.last_saved_instance = rmcb.instance_id
                                                                                   AND store.last_saved_counter <= rmcb.counter
-                                                                                  AND rmcb.transfer_session_id = '{transfer_session_id}'))
+                                                                                  AND rmcb.transfer_session_id = %s))
                                """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             store=Store._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
-        cursor.execute(delete_mc_buffer)
+        self._execute_statement(
+            cursor,
+            name,
+            delete_mc_buffer,
+            [transfersession_id] + batch_params + [transfersession_id],
+        )
 
-    def _dequeuing_delete_mc_rmcb(self, cursor, transfersession_id):
+    def _dequeuing_delete_mc_rmcb(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # delete rmcb records with merge conflicts
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_delete_mc_rmcb",
+            RecordMaxCounterBuffer._meta.db_table,
+            model_uuid_range,
+        )
         delete_mc_rmc = """DELETE FROM {rmcb}
                                     WHERE EXISTS
                                     (SELECT 1 FROM {store} AS store, {rmc} AS rmc
@@ -138,47 +306,79 @@ class BaseSQLWrapper(object):
                                     AND store.id = rmc.store_model_id
                                     /*Where buffer rmc is greater than store rmc*/
                                     AND {rmcb}.instance_id = rmc.instance_id
-                                    AND {rmcb}.transfer_session_id = '{transfer_session_id}'
+                                    AND {rmcb}.transfer_session_id = %s {batch}
                                     /*Exclude fast fast-forwards*/
                                     AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
                                                                                   AND store.last_saved_instance = rmcb2.instance_id
                                                                                   AND store.last_saved_counter <= rmcb2.counter
-                                                                                  AND rmcb2.transfer_session_id = '{transfer_session_id}'))
+                                                                                  AND rmcb2.transfer_session_id = %s))
                                """.format(
+            batch=batch,
             store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
-        cursor.execute(delete_mc_rmc)
+        self._execute_statement(
+            cursor,
+            name,
+            delete_mc_rmc,
+            [transfersession_id] + batch_params + [transfersession_id],
+        )
 
-    def _dequeuing_insert_remaining_buffer(self, cursor, transfersession_id):
+    def _dequeuing_insert_remaining_buffer(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         raise NotImplementedError("Subclass must implement this method.")
 
-    def _dequeuing_insert_remaining_rmcb(self, cursor, transfersession_id):
+    def _dequeuing_insert_remaining_rmcb(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         raise NotImplementedError("Subclass must implement this method.")
 
-    def _dequeuing_delete_remaining_rmcb(self, cursor, transfersession_id):
+    def _dequeuing_delete_remaining_rmcb(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # delete the remaining rmcb for this transfer session
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_delete_remaining_rmcb",
+            RecordMaxCounterBuffer._meta.db_table,
+            model_uuid_range,
+        )
         delete_remaining_rmcb = """
                                 DELETE FROM {rmcb}
-                                WHERE {rmcb}.transfer_session_id = '{transfer_session_id}'
+                                WHERE {rmcb}.transfer_session_id = %s {batch}
                                 """.format(
+            batch=batch,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(delete_remaining_rmcb)
+        self._execute_statement(
+            cursor,
+            name,
+            delete_remaining_rmcb,
+            [transfersession_id] + batch_params,
+        )
 
-    def _dequeuing_delete_remaining_buffer(self, cursor, transfersession_id):
+    def _dequeuing_delete_remaining_buffer(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # delete the remaining buffer for this transfer session
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_delete_remaining_buffer", Buffer._meta.db_table, model_uuid_range
+        )
         delete_remaining_buffer = """
                                   DELETE FROM {buffer}
-                                  WHERE {buffer}.transfer_session_id = '{transfer_session_id}'
+                                  WHERE {buffer}.transfer_session_id = %s {batch}
                                   """.format(
-            buffer=Buffer._meta.db_table, transfer_session_id=transfersession_id
+            batch=batch,
+            buffer=Buffer._meta.db_table
+        )
+        self._execute_statement(
+            cursor,
+            name,
+            delete_remaining_buffer,
+            [transfersession_id] + batch_params,
         )
-        cursor.execute(delete_remaining_buffer)
 
     def _create_temporary_table(self, cursor, name, field_sqls, fields_params):
         """
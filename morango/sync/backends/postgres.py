@@ -1,14 +1,20 @@
 import binascii
 import logging
+import re
 from contextlib import contextmanager
 
+from django.db.models import CharField
+
 from .base import BaseSQLWrapper
 from .utils import get_pk_field
+from .utils import TemporaryTable
 from morango.errors import MorangoDatabaseError
 from morango.models.core import Buffer
+from morango.models.core import DatabaseMaxCounter
 from morango.models.core import RecordMaxCounter
 from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import Store
+from morango.models.core import UUIDField
 from morango.utils import SETTINGS
 
 
@@ -18,6 +24,15 @@ LOCK_PARTITION = 2
 
 SIGNED_MAX_INTEGER = 2147483647
 
+# matches `%s` parameter placeholders and escaped `%%` literals
+PLACEHOLDER_REGEX = re.compile(r"%[s%]")
+
+# how each buffered record is merged into the store by the merged dequeue
+DEQUEUE_NEW = "n"
+DEQUEUE_FAST_FORWARD = "f"
+DEQUEUE_REVERSE_FAST_FORWARD = "r"
+DEQUEUE_MERGE_CONFLICT = "c"
+
 logger = logging.getLogger(__name__)
 
 
@@ -81,6 +96,52 @@ class SQLWrapper(BaseSQLWrapper):
                     self.connection.connection.set_session(isolation_level=existing_isolation_level)
                 self.connection.connection.set_session(autocommit=existing_autocommit)
 
+    def _get_prepared_statements(self):
+        """
+        :return: A set of the names of the statements prepared in the current database session,
+            which are lost if the connection is replaced
+        """
+        self.connection.ensure_connection()
+        db_connection = self.connection.connection
+        prepared = getattr(self.connection, "_morango_prepared_statements", None)
+        if prepared is None or prepared[0] is not db_connection:
+            prepared = (db_connection, set())
+            self.connection._morango_prepared_statements = prepared
+        return prepared[1]
+
+    def _execute_statement(self, cursor, name, sql, params, uses_temp_table=False):
+        """
+        When the `MORANGO_POSTGRES_PREPARED_STATEMENTS` setting is enabled, executes the statement
+        through a server-side prepared statement, which is prepared once per database session and
+        then reused, to avoid planning the statement on every execution. Prepared statements belong
+        to the database session, so they can't be used behind a pooler that assigns a different
+        session to each transaction, like pgbouncer's transaction pooling. Statements referencing a
+        temporary table aren't prepared, since they would be re-planned anyway when it's recreated.
+        """
+        if not SETTINGS.MORANGO_POSTGRES_PREPARED_STATEMENTS or uses_temp_table:
+            return super(SQLWrapper, self)._execute_statement(cursor, name, sql, params)
+
+        statement_name = "morango_{}".format(name)
+        prepared_statements = self._get_prepared_statements()
+        if statement_name not in prepared_statements:
+            numbers = iter(range(1, len(params) + 1))
+            # `PREPARE` takes numbered parameters, and is executed without parameter substitution
+            prepared_sql = PLACEHOLDER_REGEX.sub(
+                lambda m: "%" if m.group(0) == "%%" else "${}".format(next(numbers)),
+                sql,
+            )
+            cursor.execute(
+                "PREPARE {name} AS {sql}".format(name=statement_name, sql=prepared_sql)
+            )
+            prepared_statements.add(statement_name)
+
+        cursor.execute(
+            "EXECUTE {name} ({placeholders})".format(
+                name=statement_name, placeholders=", ".join(["%s"] * len(params))
+            ),
+            params,
+        )
+
     def _prepare_with_values(self, name, fields, db_values):
         placeholder_list = self._create_placeholder_list(fields, db_values)
         # convert this list to a string to be passed into raw sql query
@@ -173,8 +234,363 @@ class SQLWrapper(BaseSQLWrapper):
         # use DB-APIs parameter substitution (2nd parameter expects a sequence)
         cursor.execute(insert, db_values)
 
-    def _dequeuing_merge_conflict_rmcb(self, cursor, transfersession_id):
+    def _bulk_record_max_counter_upsert(self, cursor, db_values):
+        fields = self._get_record_max_counter_fields()
+        instance_id, counter, store_model = fields
+
+        cte_name = "new_values"
+        upsert = """
+            {cte},
+            updated as
+            (
+                UPDATE {table_name} rmc
+                SET counter = cte.{counter}::{counter_type}
+                FROM {cte_name} cte
+                WHERE rmc.{store_model} = cte.{store_model}::{store_model_type}
+                AND rmc.{instance_id} = cte.{instance_id}::{instance_id_type}
+                RETURNING rmc.{store_model}, rmc.{instance_id}
+            )
+            INSERT INTO {table_name} {fields}
+            SELECT {select_fields}
+            FROM {cte_name} cte
+            WHERE (cte.{store_model}::{store_model_type}, cte.{instance_id}::{instance_id_type})
+            NOT IN (SELECT {store_model}, {instance_id} FROM updated)
+        """.format(
+            cte=self._prepare_with_values(cte_name, fields, db_values),
+            cte_name=cte_name,
+            table_name=RecordMaxCounter._meta.db_table,
+            fields=str(tuple(str(f.column) for f in fields)).replace("'", ""),
+            select_fields=self._prepare_casted_fields(fields),
+            counter=counter.column,
+            counter_type=counter.rel_db_type(self.connection),
+            store_model=store_model.column,
+            store_model_type=store_model.rel_db_type(self.connection),
+            instance_id=instance_id.column,
+            instance_id_type=instance_id.rel_db_type(self.connection),
+        )
+        # use DB-APIs parameter substitution (2nd parameter expects a sequence)
+        cursor.execute(upsert, db_values)
+
+    def _bulk_database_max_counter_upsert(self, cursor, db_values):
+        fields = self._get_database_max_counter_fields()
+        instance_id, partition, counter = fields
+
+        cte_name = "new_values"
+        upsert = """
+            {cte},
+            raised as
+            (
+                SELECT {select_fields}
+                FROM {cte_name} cte
+                /*Exclude counters covered by one as large, for the partition or a prefix of it*/
+                WHERE NOT EXISTS (SELECT 1 FROM {table_name} dmc
+                                  WHERE dmc.{instance_id} = cte.{instance_id}::{instance_id_type}
+                                  AND cte.{partition}::{partition_type} LIKE dmc.{partition} || '%%'
+                                  AND dmc.{counter} >= cte.{counter}::{counter_type})
+            ),
+            updated as
+            (
+                UPDATE {table_name} dmc
+                SET {counter} = raised.{counter}
+                FROM raised
+                WHERE dmc.{instance_id} = raised.{instance_id}
+                AND dmc.{partition} = raised.{partition}
+                RETURNING dmc.{instance_id}, dmc.{partition}
+            )
+            INSERT INTO {table_name} {fields}
+            SELECT {raised_fields}
+            FROM raised
+            WHERE (raised.{instance_id}, raised.{partition})
+            NOT IN (SELECT {instance_id}, {partition} FROM updated)
+        """.format(
+            cte=self._prepare_with_values(cte_name, fields, db_values),
+            cte_name=cte_name,
+            table_name=DatabaseMaxCounter._meta.db_table,
+            fields=str(tuple(str(f.column) for f in fields)).replace("'", ""),
+            select_fields=self._prepare_casted_fields(fields),
+            raised_fields=", ".join("raised.{}".format(f.column) for f in fields),
+            counter=counter.column,
+            counter_type=counter.rel_db_type(self.connection),
+            partition=partition.column,
+            partition_type=partition.rel_db_type(self.connection),
+            instance_id=instance_id.column,
+            instance_id_type=instance_id.rel_db_type(self.connection),
+        )
+        # use DB-APIs parameter substitution (2nd parameter expects a sequence)
+        cursor.execute(upsert, db_values)
+
+    def _dequeue_into_store(
+        self, cursor, transfersession_id, current_id, model_uuid_range=None
+    ):
+        """
+        When the `MORANGO_POSTGRES_MERGED_DEQUEUE` setting is enabled, rather than the eleven
+        `_dequeuing_*` statements, which each rescan the buffers, store and record max counters
+        with the same joins, this classifies each buffered record once into a temporary table, as
+        new, a fast-forward, a reverse fast-forward, or a merge conflict, and merges each class
+        with a single set-based statement. The statements using the temporary table aren't
+        prepared, since the table is recreated for every dequeue.
+
+        See `BaseSQLWrapper._dequeue_into_store`
+        """
+        if not SETTINGS.MORANGO_POSTGRES_MERGED_DEQUEUE:
+            return super(SQLWrapper, self)._dequeue_into_store(
+                cursor, transfersession_id, current_id, model_uuid_range=model_uuid_range
+            )
+
+        with TemporaryTable(
+            self.connection,
+            "dequeue",
+            model_uuid=UUIDField(primary_key=True),
+            kind=CharField(max_length=1),
+        ) as classified:
+            self._dequeue_classify(
+                cursor, classified, transfersession_id, model_uuid_range
+            )
+            self._dequeue_merge_conflicts(
+                cursor, classified, current_id, transfersession_id
+            )
+            self._dequeue_fast_forwards_and_new(cursor, classified, transfersession_id)
+            self._dequeue_rmcb(cursor, classified, transfersession_id)
+
+        self._dequeuing_delete_remaining_rmcb(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+        self._dequeuing_delete_remaining_buffer(
+            cursor, transfersession_id, model_uuid_range=model_uuid_range
+        )
+
+    def _dequeue_classify(self, cursor, classified, transfersession_id, model_uuid_range):
+        # classify each buffered record by how it merges into the store, in order of precedence
+        _, batch, batch_params = self._dequeuing_batch(
+            "dequeue_classify", "buffer", model_uuid_range
+        )
+        classify = """
+            INSERT INTO {classified} (model_uuid, kind)
+            SELECT buffer.model_uuid,
+                   CASE
+                       WHEN store.id IS NULL THEN %s
+                       /*Checks whether LSB of buffer or less is in RMC of store*/
+                       WHEN EXISTS (SELECT 1 FROM {rmc} AS rmc WHERE rmc.store_model_id = store.id
+                                                               AND rmc.instance_id = buffer.last_saved_instance
+                                                               AND rmc.counter >= buffer.last_saved_counter) THEN %s
+                       /*Checks whether LSB of store or less is in RMCB of buffer*/
+                       WHEN EXISTS (SELECT 1 FROM {rmcb} AS rmcb WHERE rmcb.model_uuid = store.id
+                                                                 AND rmcb.instance_id = store.last_saved_instance
+                                                                 AND rmcb.counter >= store.last_saved_counter
+                                                                 AND rmcb.transfer_session_id = %s) THEN %s
+                       ELSE %s
+                   END
+            FROM {buffer} AS buffer
+            LEFT OUTER JOIN {store} AS store ON store.id = buffer.model_uuid
+            WHERE buffer.transfer_session_id = %s {batch}
+        """.format(
+            classified=classified.sql_name,
+            buffer=Buffer._meta.db_table,
+            store=Store._meta.db_table,
+            rmc=RecordMaxCounter._meta.db_table,
+            rmcb=RecordMaxCounterBuffer._meta.db_table,
+            batch=batch,
+        )
+        cursor.execute(
+            classify,
+            [
+                DEQUEUE_NEW,
+                DEQUEUE_REVERSE_FAST_FORWARD,
+                transfersession_id,
+                DEQUEUE_FAST_FORWARD,
+                DEQUEUE_MERGE_CONFLICT,
+                transfersession_id,
+            ]
+            + batch_params,
+        )
+
+    def _dequeue_merge_conflicts(
+        self, cursor, classified, current_id, transfersession_id
+    ):
+        # transfer buffer serialized into conflicting store
+        merge_conflict_store = """
+            UPDATE {store} AS store
+            SET serialized = CASE buffer.hard_deleted WHEN TRUE THEN '' ELSE store.serialized END,
+                deleted = store.deleted OR buffer.deleted,
+                last_saved_instance = %s::uuid,
+                last_saved_counter = %s::integer,
+                conflicting_serialized_data = CASE buffer.hard_deleted WHEN TRUE THEN '' ELSE buffer.serialized || '\n' || store.conflicting_serialized_data END,
+                dirty_bit = TRUE,
+                deserialization_error = '',
+                last_transfer_session_id = %s::uuid
+            FROM {buffer} AS buffer, {classified} AS classified
+            WHERE store.id = buffer.model_uuid
+            AND buffer.model_uuid = classified.model_uuid
+            AND buffer.transfer_session_id = %s
+            AND classified.kind = %s
+        """.format(
+            classified=classified.sql_name,
+            buffer=Buffer._meta.db_table,
+            store=Store._meta.db_table,
+        )
+        cursor.execute(
+            merge_conflict_store,
+            [
+                current_id.id,
+                current_id.counter,
+                transfersession_id,
+                transfersession_id,
+                DEQUEUE_MERGE_CONFLICT,
+            ],
+        )
+
+        # raise the record max counters of merge conflicts to those in the buffer, and update or
+        # create the record max counter for the local instance
+        merge_conflict_rmc = """
+            WITH conflicts AS
+            (
+                SELECT classified.model_uuid
+                FROM {classified} AS classified
+                WHERE classified.kind = %s
+            ),
+            raised AS
+            (
+                UPDATE {rmc} AS rmc
+                SET counter = rmcb.counter
+                FROM {rmcb} AS rmcb, conflicts
+                WHERE rmcb.model_uuid = conflicts.model_uuid
+                AND rmc.store_model_id = rmcb.model_uuid
+                /*Where buffer rmc is greater than store rmc*/
+                AND rmc.instance_id = rmcb.instance_id
+                AND rmcb.counter > rmc.counter
+                AND rmcb.transfer_session_id = %s
+                /*The local instance's counter is updated below, and a row may only be updated once*/
+                AND rmc.instance_id <> %s::uuid
+            ),
+            updated AS
+            (
+                UPDATE {rmc} AS rmc
+                SET counter = %s::integer
+                FROM conflicts
+                WHERE rmc.store_model_id = conflicts.model_uuid
+                AND rmc.instance_id = %s::uuid
+                RETURNING rmc.store_model_id
+            )
+            INSERT INTO {rmc} (instance_id, counter, store_model_id)
+            SELECT %s::uuid, %s::integer, conflicts.model_uuid
+            FROM conflicts
+            WHERE conflicts.model_uuid NOT IN (SELECT store_model_id FROM updated)
+        """.format(
+            classified=classified.sql_name,
+            rmc=RecordMaxCounter._meta.db_table,
+            rmcb=RecordMaxCounterBuffer._meta.db_table,
+        )
+        cursor.execute(
+            merge_conflict_rmc,
+            [
+                DEQUEUE_MERGE_CONFLICT,
+                transfersession_id,
+                current_id.id,
+                current_id.counter,
+                current_id.id,
+                current_id.id,
+                current_id.counter,
+            ],
+        )
+
+    def _dequeue_fast_forwards_and_new(self, cursor, classified, transfersession_id):
+        # update the store with fast-forwards, and insert new records into it
+        fast_forward_and_new_store = """
+            WITH fast_forwarded AS
+            (
+                UPDATE {store} AS store
+                SET (serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name, profile,
+                     partition, source_id, conflicting_serialized_data, dirty_bit, _self_ref_fk, deserialization_error, last_transfer_session_id)
+                    = (buffer.serialized, buffer.deleted, buffer.last_saved_instance, buffer.last_saved_counter, buffer.hard_deleted,
+                       buffer.model_name, buffer.profile, buffer.partition, buffer.source_id, buffer.conflicting_serialized_data, TRUE,
+                       buffer._self_ref_fk, '', %s::uuid)
+                FROM {buffer} AS buffer, {classified} AS classified
+                WHERE store.id = buffer.model_uuid
+                AND buffer.model_uuid = classified.model_uuid
+                AND buffer.transfer_session_id = %s
+                AND classified.kind = %s
+            )
+            INSERT INTO {store} (id, serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name, profile,
+                                 partition, source_id, conflicting_serialized_data, dirty_bit, _self_ref_fk, deserialization_error, last_transfer_session_id)
+            SELECT buffer.model_uuid, buffer.serialized, buffer.deleted, buffer.last_saved_instance, buffer.last_saved_counter, buffer.hard_deleted,
+                   buffer.model_name, buffer.profile, buffer.partition, buffer.source_id, buffer.conflicting_serialized_data, TRUE,
+                   buffer._self_ref_fk, '', %s::uuid
+            FROM {buffer} AS buffer, {classified} AS classified
+            WHERE buffer.model_uuid = classified.model_uuid
+            AND buffer.transfer_session_id = %s
+            AND classified.kind = %s
+        """.format(
+            classified=classified.sql_name,
+            buffer=Buffer._meta.db_table,
+            store=Store._meta.db_table,
+        )
+        cursor.execute(
+            fast_forward_and_new_store,
+            [
+                transfersession_id,
+                transfersession_id,
+                DEQUEUE_FAST_FORWARD,
+                transfersession_id,
+                transfersession_id,
+                DEQUEUE_NEW,
+            ],
+        )
+
+    def _dequeue_rmcb(self, cursor, classified, transfersession_id):
+        # update or create the record max counters of fast-forwards and new records from the
+        # buffer, and add those of merge conflicts for instances the store's are missing
+        rmcb_into_rmc = """
+            WITH new_values AS
+            (
+                SELECT rmcb.instance_id, rmcb.counter, rmcb.model_uuid
+                FROM {rmcb} AS rmcb, {classified} AS classified
+                WHERE rmcb.model_uuid = classified.model_uuid
+                AND rmcb.transfer_session_id = %s
+                AND (
+                    classified.kind IN (%s, %s)
+                    OR (
+                        classified.kind = %s
+                        AND NOT EXISTS (SELECT 1 FROM {rmc} AS rmc WHERE rmc.store_model_id = rmcb.model_uuid
+                                                                   AND rmc.instance_id = rmcb.instance_id)
+                    )
+                )
+            ),
+            updated AS
+            (
+                UPDATE {rmc} AS rmc
+                SET counter = nv.counter
+                FROM new_values nv
+                WHERE rmc.store_model_id = nv.model_uuid
+                AND rmc.instance_id = nv.instance_id
+                RETURNING rmc.store_model_id, rmc.instance_id
+            )
+            INSERT INTO {rmc} (instance_id, counter, store_model_id)
+            SELECT nv.instance_id, nv.counter, nv.model_uuid
+            FROM new_values nv
+            WHERE (nv.model_uuid, nv.instance_id)
+            NOT IN (SELECT store_model_id, instance_id FROM updated)
+        """.format(
+            classified=classified.sql_name,
+            rmc=RecordMaxCounter._meta.db_table,
+            rmcb=RecordMaxCounterBuffer._meta.db_table,
+        )
+        cursor.execute(
+            rmcb_into_rmc,
+            [
+                transfersession_id,
+                DEQUEUE_FAST_FORWARD,
+                DEQUEUE_NEW,
+                DEQUEUE_MERGE_CONFLICT,
+            ],
+        )
+
+    def _dequeuing_merge_conflict_rmcb(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # transfer record max counters for records with merge conflicts + perform max
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_merge_conflict_rmcb", "rmcb", model_uuid_range
+        )
         merge_conflict_rmc = """UPDATE {rmc} as rmc SET counter
                                     = rmcb.counter
                                     FROM {rmcb} AS rmcb, {store} AS store, {buffer} AS buffer
@@ -185,68 +601,86 @@ class SQLWrapper(BaseSQLWrapper):
                                     /*Where buffer rmc is greater than store rmc*/
                                     AND rmcb.instance_id = rmc.instance_id
                                     AND rmcb.counter > rmc.counter
-                                    AND rmcb.transfer_session_id = '{transfer_session_id}'
+                                    AND rmcb.transfer_session_id = %s {batch}
                                     /*Exclude fast-forwards*/
                                     AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
                                                                                   AND store.last_saved_instance = rmcb2.instance_id
                                                                                   AND store.last_saved_counter <= rmcb2.counter
-                                                                                  AND rmcb2.transfer_session_id = '{transfer_session_id}')
+                                                                                  AND rmcb2.transfer_session_id = %s)
                                """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(merge_conflict_rmc)
+        self._execute_statement(
+            cursor,
+            name,
+            merge_conflict_rmc,
+            [transfersession_id] + batch_params + [transfersession_id],
+        )
 
-    def _dequeuing_merge_conflict_buffer(self, cursor, current_id, transfersession_id):
+    def _dequeuing_merge_conflict_buffer(
+        self, cursor, current_id, transfersession_id, model_uuid_range=None
+    ):
         # transfer buffer serialized into conflicting store
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_merge_conflict_buffer", "buffer", model_uuid_range
+        )
         merge_conflict_store = """UPDATE {store} as store SET (serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name,
                                                         profile, partition, source_id, conflicting_serialized_data, dirty_bit, _self_ref_fk, deserialization_error, last_transfer_session_id)
-                                            = (CASE buffer.hard_deleted WHEN TRUE THEN '' ELSE store.serialized END, store.deleted OR buffer.deleted, '{current_instance_id}',
-                                                   {current_instance_counter}, store.hard_deleted, store.model_name, store.profile, store.partition, store.source_id,
+                                            = (CASE buffer.hard_deleted WHEN TRUE THEN '' ELSE store.serialized END, store.deleted OR buffer.deleted, %s::uuid,
+                                                   %s::integer, store.hard_deleted, store.model_name, store.profile, store.partition, store.source_id,
                                                    CASE buffer.hard_deleted WHEN TRUE THEN '' ELSE buffer.serialized || '\n' || store.conflicting_serialized_data END, TRUE, store._self_ref_fk,
-                                                   '', '{transfer_session_id}')
+                                                   '', %s::uuid)
                                             /*Scope to a single record.*/
                                             FROM {buffer} AS buffer
                                             WHERE store.id = buffer.model_uuid
-                                            AND buffer.transfer_session_id = '{transfer_session_id}'
+                                            AND buffer.transfer_session_id = %s {batch}
                                             /*Exclude fast-forwards*/
                                             AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
                                                                                           AND store.last_saved_instance = rmcb2.instance_id
                                                                                           AND store.last_saved_counter <= rmcb2.counter
-                                                                                          AND rmcb2.transfer_session_id = '{transfer_session_id}')
+                                                                                          AND rmcb2.transfer_session_id = %s)
                                       """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
             store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
-            transfer_session_id=transfersession_id,
-            current_instance_id=current_id.id,
-            current_instance_counter=current_id.counter,
         )
 
-        cursor.execute(merge_conflict_store)
+        self._execute_statement(
+            cursor,
+            name,
+            merge_conflict_store,
+            [current_id.id, current_id.counter, transfersession_id, transfersession_id]
+            + batch_params
+            + [transfersession_id],
+        )
 
     def _dequeuing_update_rmcs_last_saved_by(
-        self, cursor, current_id, transfersession_id
+        self, cursor, current_id, transfersession_id, model_uuid_range=None
     ):
         # update or create rmc for merge conflicts with local instance id
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_update_rmcs_last_saved_by", "buffer", model_uuid_range
+        )
         merge_conflict_store = """
                 WITH new_values as
             (
-                SELECT '{current_instance_id}'::uuid curr_id, {current_instance_counter} curr_counter, store.id
+                SELECT %s::uuid curr_id, %s::integer curr_counter, store.id
                 FROM {store} as store, {buffer} as buffer
                 /*Scope to a single record.*/
                 WHERE store.id = buffer.model_uuid
-                AND buffer.transfer_session_id = '{transfer_session_id}'
+                AND buffer.transfer_session_id = %s {batch}
                 /*Exclude fast-forwards*/
                 AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
                                                               AND store.last_saved_instance = rmcb2.instance_id
                                                               AND store.last_saved_counter <= rmcb2.counter
-                                                              AND rmcb2.transfer_session_id = '{transfer_session_id}')
+                                                              AND rmcb2.transfer_session_id = %s)
             ),
             updated as
             (
@@ -257,30 +691,40 @@ class SQLWrapper(BaseSQLWrapper):
                 returning rmc.*
             )
             INSERT INTO {rmc}(instance_id, counter, store_model_id)
-            SELECT '{current_instance_id}'::uuid, {current_instance_counter}, ut.id
+            SELECT %s::uuid, %s::integer, ut.id
             FROM new_values ut
             WHERE ut.id not in (SELECT store_model_id FROM updated)
         """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
             store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
-            transfer_session_id=transfersession_id,
-            current_instance_id=current_id.id,
-            current_instance_counter=current_id.counter,
         )
 
-        cursor.execute(merge_conflict_store)
+        self._execute_statement(
+            cursor,
+            name,
+            merge_conflict_store,
+            [current_id.id, current_id.counter, transfersession_id]
+            + batch_params
+            + [transfersession_id, current_id.id, current_id.counter],
+        )
 
-    def _dequeuing_insert_remaining_buffer(self, cursor, transfersession_id):
+    def _dequeuing_insert_remaining_buffer(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # insert remaining records into store
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_insert_remaining_buffer", "buffer", model_uuid_range
+        )
         insert_remaining_buffer = """
             WITH new_values as
             (
                 SELECT buffer.model_uuid, buffer.serialized, buffer.deleted, buffer.last_saved_instance, buffer.last_saved_counter, buffer.hard_deleted,
                        buffer.model_name, buffer.profile, buffer.partition, buffer.source_id, buffer.conflicting_serialized_data, buffer._self_ref_fk
                 FROM {buffer} as buffer
-                WHERE buffer.transfer_session_id = '{transfer_session_id}'
+                WHERE buffer.transfer_session_id = %s {batch}
             ),
             updated as
             (
@@ -288,7 +732,7 @@ class SQLWrapper(BaseSQLWrapper):
                                      partition, source_id, conflicting_serialized_data, dirty_bit, _self_ref_fk, deserialization_error, last_transfer_session_id)
                                     = (nv.serialized, nv.deleted, nv.last_saved_instance, nv.last_saved_counter, nv.hard_deleted,
                                        nv.model_name, nv.profile, nv.partition, nv.source_id, nv.conflicting_serialized_data, TRUE,
-                                       nv._self_ref_fk, '', '{transfer_session_id}')
+                                       nv._self_ref_fk, '', %s::uuid)
                 FROM new_values nv
                 WHERE nv.model_uuid = store.id
                 returning store.*
@@ -297,25 +741,37 @@ class SQLWrapper(BaseSQLWrapper):
                                 partition, source_id, conflicting_serialized_data, dirty_bit, _self_ref_fk, deserialization_error, last_transfer_session_id)
             SELECT ut.model_uuid, ut.serialized, ut.deleted, ut.last_saved_instance, ut.last_saved_counter, ut.hard_deleted,
                        ut.model_name, ut.profile, ut.partition, ut.source_id, ut.conflicting_serialized_data, TRUE,
-                       ut._self_ref_fk, '', '{transfer_session_id}'
+                       ut._self_ref_fk, '', %s::uuid
             FROM new_values ut
             WHERE ut.model_uuid not in (SELECT id FROM updated)
         """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             store=Store._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(insert_remaining_buffer)
+        self._execute_statement(
+            cursor,
+            name,
+            insert_remaining_buffer,
+            [transfersession_id]
+            + batch_params
+            + [transfersession_id, transfersession_id],
+        )
 
-    def _dequeuing_insert_remaining_rmcb(self, cursor, transfersession_id):
+    def _dequeuing_insert_remaining_rmcb(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # insert remaining records into rmc
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_insert_remaining_rmcb", "rmcb", model_uuid_range
+        )
         insert_remaining_rmcb = """
                 WITH new_values as
             (
                 SELECT rmcb.instance_id rmcb_instance_id, rmcb.counter, rmcb.model_uuid
                 FROM {rmcb} as rmcb
-                WHERE rmcb.transfer_session_id = '{transfer_session_id}'
+                WHERE rmcb.transfer_session_id = %s {batch}
             ),
             updated as
             (
@@ -331,12 +787,17 @@ class SQLWrapper(BaseSQLWrapper):
             WHERE (ut.model_uuid, ut.rmcb_instance_id)
             not in (SELECT store_model_id, instance_id FROM updated)
             """.format(
+            batch=batch,
             rmc=RecordMaxCounter._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(insert_remaining_rmcb)
+        self._execute_statement(
+            cursor,
+            name,
+            insert_remaining_rmcb,
+            [transfersession_id] + batch_params,
+        )
 
     def _execute_lock(self, key1, key2=None, unlock=False, session=False, shared=False, wait=True):
         """
@@ -2,6 +2,7 @@ from .base import BaseSQLWrapper
 from .utils import calculate_max_sqlite_variables
 from .utils import get_pk_field
 from morango.models.core import Buffer
+from morango.models.core import DatabaseMaxCounter
 from morango.models.core import RecordMaxCounter
 from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import Store
@@ -43,6 +44,48 @@ class SQLWrapper(BaseSQLWrapper):
             # use DB-APIs parameter substitution (2nd parameter expects a sequence)
             cursor.execute(insert, values)
 
+    def _bulk_record_max_counter_upsert(self, cursor, db_values):
+        """
+        SQLite's `REPLACE` resolves the conflict on the unique `store_model_id` and `instance_id`
+        pair, so we can reuse the full record upsert
+        """
+        self._bulk_full_record_upsert(
+            cursor,
+            RecordMaxCounter._meta.db_table,
+            self._get_record_max_counter_fields(),
+            db_values,
+        )
+
+    def _bulk_database_max_counter_upsert(self, cursor, db_values):
+        """
+        SQLite's `REPLACE` resolves the conflict on the unique `instance_id` and `partition` pair
+        """
+        fields = self._get_database_max_counter_fields()
+        num_of_values_able_to_upsert = (
+            calculate_max_sqlite_variables() // len(fields) * len(fields)
+        )
+        for x in range(0, len(db_values), num_of_values_able_to_upsert):
+            values = db_values[x : x + num_of_values_able_to_upsert]
+            upsert = """
+                REPLACE INTO {table_name} ({instance_id}, {partition}, {counter})
+                SELECT nv.column1, nv.column2, nv.column3
+                FROM (VALUES {placeholder_str}) AS nv
+                /*Exclude counters covered by one as large, for the partition or a prefix of it*/
+                WHERE NOT EXISTS (SELECT 1 FROM {table_name} AS dmc WHERE dmc.{instance_id} = nv.column1
+                                                                    AND nv.column2 LIKE dmc.{partition} || '%%'
+                                                                    AND dmc.{counter} >= nv.column3)
+            """.format(
+                table_name=DatabaseMaxCounter._meta.db_table,
+                instance_id=fields[0].column,
+                partition=fields[1].column,
+                counter=fields[2].column,
+                placeholder_str=", ".join(
+                    self._create_placeholder_list(fields, values)
+                ).replace("'", ""),
+            )
+            # use DB-APIs parameter substitution (2nd parameter expects a sequence)
+            cursor.execute(upsert, values)
+
     def _bulk_insert(self, cursor, table_name, fields, db_values):
         num_of_rows_able_to_insert = calculate_max_sqlite_variables() // len(fields)
         num_of_values_able_to_insert = num_of_rows_able_to_insert * len(fields)
@@ -107,8 +150,13 @@ class SQLWrapper(BaseSQLWrapper):
             # use DB-APIs parameter substitution (2nd parameter expects a sequence)
             cursor.execute(update, params)
 
-    def _dequeuing_merge_conflict_rmcb(self, cursor, transfersession_id):
+    def _dequeuing_merge_conflict_rmcb(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # transfer record max counters for records with merge conflicts + perform max
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_merge_conflict_rmcb", "rmcb", model_uuid_range
+        )
         merge_conflict_rmc = """REPLACE INTO {rmc} (instance_id, counter, store_model_id)
                                     SELECT rmcb.instance_id, rmcb.counter, rmcb.model_uuid
                                     FROM {rmcb} AS rmcb, {store} AS store, {rmc} AS rmc, {buffer} AS buffer
@@ -119,102 +167,145 @@ class SQLWrapper(BaseSQLWrapper):
                                     /*Where buffer rmc is greater than store rmc*/
                                     AND rmcb.instance_id = rmc.instance_id
                                     AND rmcb.counter > rmc.counter
-                                    AND rmcb.transfer_session_id = '{transfer_session_id}'
+                                    AND rmcb.transfer_session_id = %s {batch}
                                     /*Exclude fast-forwards*/
                                     AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
                                                                                   AND store.last_saved_instance = rmcb2.instance_id
                                                                                   AND store.last_saved_counter <= rmcb2.counter
-                                                                                  AND rmcb2.transfer_session_id = '{transfer_session_id}')
+                                                                                  AND rmcb2.transfer_session_id = %s)
                                """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
-        cursor.execute(merge_conflict_rmc)
+        self._execute_statement(
+            cursor,
+            name,
+            merge_conflict_rmc,
+            [transfersession_id] + batch_params + [transfersession_id],
+        )
 
-    def _dequeuing_merge_conflict_buffer(self, cursor, current_id, transfersession_id):
+    def _dequeuing_merge_conflict_buffer(
+        self, cursor, current_id, transfersession_id, model_uuid_range=None
+    ):
         # transfer buffer serialized into conflicting store
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_merge_conflict_buffer", "buffer", model_uuid_range
+        )
         merge_conflict_store = """REPLACE INTO {store} (id, serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name, profile, partition,
                                                         source_id, conflicting_serialized_data, dirty_bit, _self_ref_fk, deserialization_error, last_transfer_session_id)
-                                            SELECT store.id, CASE buffer.hard_deleted WHEN 1 THEN '' ELSE store.serialized END, store.deleted OR buffer.deleted, '{current_instance_id}',
-                                                   {current_instance_counter}, store.hard_deleted OR buffer.hard_deleted, store.model_name, store.profile, store.partition, store.source_id,
+                                            SELECT store.id, CASE buffer.hard_deleted WHEN 1 THEN '' ELSE store.serialized END, store.deleted OR buffer.deleted, %s,
+                                                   %s, store.hard_deleted OR buffer.hard_deleted, store.model_name, store.profile, store.partition, store.source_id,
                                                    CASE buffer.hard_deleted WHEN 1 THEN '' ELSE buffer.serialized || '\n' || store.conflicting_serialized_data END, 1, store._self_ref_fk,
-                                                   '', '{transfer_session_id}'
+                                                   '', %s
                                             FROM {buffer} AS buffer, {store} AS store
                                             /*Scope to a single record.*/
                                             WHERE store.id = buffer.model_uuid
-                                            AND buffer.transfer_session_id = '{transfer_session_id}'
+                                            AND buffer.transfer_session_id = %s {batch}
                                             /*Exclude fast-forwards*/
                                             AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
                                                                                           AND store.last_saved_instance = rmcb2.instance_id
                                                                                           AND store.last_saved_counter <= rmcb2.counter
-                                                                                          AND rmcb2.transfer_session_id = '{transfer_session_id}')
+                                                                                          AND rmcb2.transfer_session_id = %s)
                                       """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
             store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
-            transfer_session_id=transfersession_id,
-            current_instance_id=current_id.id,
-            current_instance_counter=current_id.counter,
         )
-        cursor.execute(merge_conflict_store)
+        self._execute_statement(
+            cursor,
+            name,
+            merge_conflict_store,
+            [current_id.id, current_id.counter, transfersession_id, transfersession_id]
+            + batch_params
+            + [transfersession_id],
+        )
 
     def _dequeuing_update_rmcs_last_saved_by(
-        self, cursor, current_id, transfersession_id
+        self, cursor, current_id, transfersession_id, model_uuid_range=None
     ):
         # update or create rmc for merge conflicts with local instance id
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_update_rmcs_last_saved_by", "buffer", model_uuid_range
+        )
         merge_conflict_store = """REPLACE INTO {rmc} (instance_id, counter, store_model_id)
-                                SELECT '{current_instance_id}', {current_instance_counter}, store.id
+                                SELECT %s, %s, store.id
                                 FROM {store} as store, {buffer} as buffer
                                 /*Scope to a single record.*/
                                 WHERE store.id = buffer.model_uuid
-                                AND buffer.transfer_session_id = '{transfer_session_id}'
+                                AND buffer.transfer_session_id = %s {batch}
                                 /*Exclude fast-forwards*/
                                 AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
                                                                               AND store.last_saved_instance = rmcb2.instance_id
                                                                               AND store.last_saved_counter <= rmcb2.counter
-                                                                              AND rmcb2.transfer_session_id = '{transfer_session_id}')
+                                                                              AND rmcb2.transfer_session_id = %s)
                                       """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
             store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
-            transfer_session_id=transfersession_id,
-            current_instance_id=current_id.id,
-            current_instance_counter=current_id.counter,
         )
-        cursor.execute(merge_conflict_store)
+        self._execute_statement(
+            cursor,
+            name,
+            merge_conflict_store,
+            [current_id.id, current_id.counter, transfersession_id]
+            + batch_params
+            + [transfersession_id],
+        )
 
-    def _dequeuing_insert_remaining_buffer(self, cursor, transfersession_id):
+    def _dequeuing_insert_remaining_buffer(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # insert remaining records into store
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_insert_remaining_buffer", "buffer", model_uuid_range
+        )
         insert_remaining_buffer = """REPLACE INTO {store} (id, serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name, profile, partition,
                                                            source_id, conflicting_serialized_data, dirty_bit, _self_ref_fk, deserialization_error, last_transfer_session_id)
                                     SELECT buffer.model_uuid, buffer.serialized, buffer.deleted, buffer.last_saved_instance, buffer.last_saved_counter, buffer.hard_deleted,
                                            buffer.model_name, buffer.profile, buffer.partition, buffer.source_id, buffer.conflicting_serialized_data, 1,
-                                           buffer._self_ref_fk, '', '{transfer_session_id}'
+                                           buffer._self_ref_fk, '', %s
                                     FROM {buffer} AS buffer
-                                    WHERE buffer.transfer_session_id = '{transfer_session_id}'
+                                    WHERE buffer.transfer_session_id = %s {batch}
                            """.format(
+            batch=batch,
             buffer=Buffer._meta.db_table,
             store=Store._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(insert_remaining_buffer)
+        self._execute_statement(
+            cursor,
+            name,
+            insert_remaining_buffer,
+            [transfersession_id] * 2 + batch_params,
+        )
 
-    def _dequeuing_insert_remaining_rmcb(self, cursor, transfersession_id):
+    def _dequeuing_insert_remaining_rmcb(
+        self, cursor, transfersession_id, model_uuid_range=None
+    ):
         # insert remaining records into rmc
+        name, batch, batch_params = self._dequeuing_batch(
+            "dequeuing_insert_remaining_rmcb", "rmcb", model_uuid_range
+        )
         insert_remaining_rmcb = """REPLACE INTO {rmc} (instance_id, counter, store_model_id)
                                     SELECT rmcb.instance_id, rmcb.counter, rmcb.model_uuid
                                     FROM {rmcb} AS rmcb
-                                    WHERE rmcb.transfer_session_id = '{transfer_session_id}'
+                                    WHERE rmcb.transfer_session_id = %s {batch}
                            """.format(
+            batch=batch,
             rmc=RecordMaxCounter._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(insert_remaining_rmcb)
+        self._execute_statement(
+            cursor,
+            name,
+            insert_remaining_rmcb,
+            [transfersession_id] + batch_params,
+        )
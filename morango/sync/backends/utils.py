@@ -129,6 +129,27 @@ class TemporaryTable(object):
         with self.connection.cursor() as c:
             c.execute("DROP TABLE IF EXISTS {name}".format(name=self.sql_name))
 
+    def create_index(self, *field_names):
+        """
+        Creates an index on the temporary table, which is dropped along with the table
+
+        :param field_names: The str names of the fields to index, in order
+        """
+        columns = [self.get_field(name).column for name in field_names]
+        index_name = self.connection.ops.quote_name(
+            "t_{}_{}_idx".format(self.name, "_".join(columns))
+        )
+        with self.connection.cursor() as c:
+            c.execute(
+                "CREATE INDEX {index_name} ON {name} ({columns})".format(
+                    index_name=index_name,
+                    name=self.sql_name,
+                    columns=", ".join(
+                        self.connection.ops.quote_name(column) for column in columns
+                    ),
+                )
+            )
+
     def bulk_insert(self, values):
         """
         Bulk inserts a list of records into the temporary table
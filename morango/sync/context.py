@@ -1,3 +1,5 @@
+import time
+
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.errors import MorangoContextUpdateError
@@ -296,7 +298,15 @@ class NetworkSessionContext(SessionContext):
     Class that holds the context for operating on a transfer remotely through network connection
     """
 
-    __slots__ = ("connection", "_stage", "_stage_status")
+    __slots__ = (
+        "connection",
+        "last_pulled_model_uuid",
+        "prefetched_chunk",
+        "chunks_since_update",
+        "last_update_time",
+        "_stage",
+        "_stage_status",
+    )
 
     def __init__(self, connection, **kwargs):
         """
@@ -305,6 +315,13 @@ class NetworkSessionContext(SessionContext):
         :type connection: NetworkSyncConnection
         """
         self.connection = connection
+        # the model UUID of the last record pulled, from which the next pull continues
+        self.last_pulled_model_uuid = None
+        # a tuple of the offset and the `BackgroundCall` pulling the chunk at that offset
+        self.prefetched_chunk = None
+        # the chunks pulled since, and time of, the last update of the remote transfer session
+        self.chunks_since_update = 0
+        self.last_update_time = time.time()
         super(NetworkSessionContext, self).__init__(**kwargs)
 
         # since this is network context, keep local reference to state vars
@@ -2,29 +2,39 @@ import functools
 import itertools
 import json
 import logging
+import time
 import uuid
 from collections import defaultdict
 from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
 from django.core import exceptions
-from django.core.serializers.json import DjangoJSONEncoder
 from django.db import connection
+from django.db import router
 from django.db import transaction
 from django.db.models import CharField
+from django.db.models import IntegerField
 from django.db.models import Q
 from django.db.models import signals
+from django.db.models import TextField
+from django.db.models.deletion import Collector
 from django.db.utils import OperationalError
+from django.utils import six
 from django.utils import timezone
+from mptt.models import MPTTModel
 from rest_framework.exceptions import ValidationError
 
 from morango.api.serializers import BufferSerializer
+from morango.codecs import get_json_codec
+from morango.compression import decode_response_json
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.constants.capabilities import ASYNC_OPERATIONS
+from morango.constants.capabilities import CONCURRENT_BUFFER_POST
 from morango.constants.capabilities import FSIC_V2_FORMAT
+from morango.constants.capabilities import INCREMENTAL_QUEUING
 from morango.errors import MorangoDatabaseError
 from morango.errors import MorangoInvalidFSICPartition
-from morango.errors import MorangoLimitExceeded
 from morango.errors import MorangoResumeSyncError
 from morango.errors import MorangoSkipOperation
 from morango.models.certificates import Filter
@@ -36,19 +46,22 @@ from morango.models.core import InstanceIDModel
 from morango.models.core import RecordMaxCounter
 from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import Store
+from morango.models.core import SyncableModel
 from morango.models.core import TransferSession
 from morango.models.core import UUIDField
 from morango.models.fsic_utils import calculate_directional_fsic_diff
 from morango.models.fsic_utils import calculate_directional_fsic_diff_v2
-from morango.models.fsic_utils import chunk_fsic_v2
 from morango.models.fsic_utils import expand_fsic_for_use
+from morango.models.morango_mptt import MorangoMPTTModel
 from morango.registry import syncable_models
 from morango.sync.backends.utils import load_backend
 from morango.sync.backends.utils import TemporaryTable
 from morango.sync.context import LocalSessionContext
 from morango.sync.context import NetworkSessionContext
+from morango.sync.utils import BackgroundCall
 from morango.sync.utils import lock_partitions
 from morango.sync.utils import mute_signals
+from morango.sync.utils import run_in_dependency_order
 from morango.sync.utils import validate_and_create_buffer_data
 from morango.utils import _assert
 from morango.utils import SETTINGS
@@ -58,7 +71,20 @@ logger = logging.getLogger(__name__)
 
 DBBackend = load_backend(connection)
 
-SQL_UNION_MAX = 500
+# max number of store records of a tree level to deserialize at once
+DESERIALIZE_CHUNK_SIZE = 500
+
+# store fields that are updated for existing store records during serialization
+SERIALIZE_UPDATE_FIELDS = (
+    "serialized",
+    "conflicting_serialized_data",
+    "dirty_bit",
+    "last_saved_instance",
+    "last_saved_counter",
+    "deleted",
+    "hard_deleted",
+    "last_transfer_session_id",
+)
 
 
 class OperationLogger(object):
@@ -76,11 +102,6 @@ class OperationLogger(object):
             logger.info("Error: {}".format(self.start_msg))
 
 
-def _join_with_logical_operator(lst, operator):
-    op = ") {operator} (".format(operator=operator)
-    return "(({items}))".format(items=op.join(lst))
-
-
 def _self_referential_fk(model):
     """
     Return whether this model has a self ref FK, and the name for the field
@@ -92,6 +113,51 @@ def _self_referential_fk(model):
     return None
 
 
+def _bulk_update_store_records(store_records):
+    """
+    Writes the serialization related fields of existing store records through a bulk update,
+    instead of saving each record individually
+
+    :param store_records: A list of `Store` model instances to update
+    :type store_records: Store[]
+    """
+    if not store_records:
+        return
+
+    fields = [Store._meta.pk] + [
+        Store._meta.get_field(name) for name in SERIALIZE_UPDATE_FIELDS
+    ]
+    db_values = []
+    for store_record in store_records:
+        for f in fields:
+            db_values.append(
+                f.get_db_prep_value(getattr(store_record, f.attname), connection)
+            )
+
+    with connection.cursor() as cursor:
+        DBBackend._bulk_update(cursor, Store._meta.db_table, fields, db_values)
+
+
+def _bulk_update_deserialization_errors(deserialization_errors):
+    """
+    Writes deserialization errors onto their store records through a bulk update, instead of
+    saving each record individually
+
+    :param deserialization_errors: A list of tuples of a store PK and its error message
+    """
+    if not deserialization_errors:
+        return
+
+    pk_field = Store._meta.pk
+    fields = [pk_field, Store._meta.get_field("deserialization_error")]
+    db_values = []
+    for pk, error in deserialization_errors:
+        db_values.extend([pk_field.get_db_prep_value(pk, connection), error])
+
+    with connection.cursor() as cursor:
+        DBBackend._bulk_update(cursor, Store._meta.db_table, fields, db_values)
+
+
 @contextmanager
 def _begin_transaction(sync_filter, isolated=False, shared_lock=False):
     """
@@ -118,17 +184,53 @@ def _begin_transaction(sync_filter, isolated=False, shared_lock=False):
             yield
 
 
-def _serialize_into_store(profile, filter=None):
+def _queryset_chunks(queryset, chunk_size):
+    """
+    Iterates over a queryset in lists of at most `chunk_size` records, using keyset pagination on
+    the primary key so that each chunk is an indexed range query and only one chunk is held in
+    memory at a time
+
+    :param queryset: The queryset to iterate over
+    :param chunk_size: An int of the max number of records per chunk
+    :return: A generator of lists of model instances
+    """
+    queryset = queryset.order_by("pk")
+    last_pk = None
+    while True:
+        chunk_queryset = queryset
+        if last_pk is not None:
+            chunk_queryset = chunk_queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk_queryset[:chunk_size])
+        if not chunk:
+            break
+        yield chunk
+        if len(chunk) < chunk_size:
+            break
+        last_pk = chunk[-1].pk
+
+
+def _serialize_into_store(profile, filter=None, chunk_size=None):
     """
     Takes data from app layer and serializes the models into the store.
 
-    ALGORITHM: On a per syncable model basis, we iterate through each class model and we go through 2 possible cases:
+    ALGORITHM: On a per syncable model basis, we iterate through each class model's dirty records in chunks, ordered by
+    primary key, and we go through 2 possible cases:
 
     1. If there is a store record pertaining to that app model, we update the serialized store record with
     the latest changes from the model's fields. We also update the counter's based on this device's current Instance ID.
+    If the serialized data is unchanged, and the store record isn't dirty or deleted, the store record is left as is.
     2. If there is no store record for this app model, we proceed to create an in memory store model and append to a list to be
-    bulk created on a per class model basis.
+    bulk created on a per chunk basis.
+
+    :param profile: The profile of the models to serialize
+    :param filter: The filter for filtering applicable records, if any
+    :type filter: morango.models.certificates.Filter|None
+    :param chunk_size: An int of the max number of app records to process at once, defaulting to
+        the `MORANGO_SERIALIZE_CHUNK_SIZE` setting
     """
+    chunk_size = chunk_size or SETTINGS.MORANGO_SERIALIZE_CHUNK_SIZE
+    json_codec = get_json_codec()
+
     # ensure that we write and retrieve the counter in one go for consistency
     current_id = InstanceIDModel.get_current_instance_and_increment_counter()
 
@@ -143,80 +245,110 @@ def _serialize_into_store(profile, filter=None):
 
         # filter through all models with the dirty bit turned on
         for model in syncable_models.get_models(profile):
-            new_store_records = []
-            new_rmc_records = []
             klass_queryset = model.objects.filter(_morango_dirty_bit=True)
             if prefix_condition:
                 klass_queryset = klass_queryset.filter(prefix_condition)
-            store_records_dict = Store.objects.in_bulk(
-                id_list=klass_queryset.values_list("id", flat=True)
-            )
-            for app_model in klass_queryset:
-                try:
-                    store_model = store_records_dict[app_model.id]
-
-                    # if store record dirty and app record dirty, append store serialized to conflicting data
-                    if store_model.dirty_bit:
-                        store_model.conflicting_serialized_data = (
-                            store_model.serialized
-                            + "\n"
-                            + store_model.conflicting_serialized_data
+
+            # check if model has FK pointing to it, to add the value to a field on the store
+            self_ref_fk = _self_referential_fk(model)
+
+            # walk the dirty app models in chunks, ordered by primary key, to bound memory usage
+            for app_models in _queryset_chunks(klass_queryset, chunk_size):
+                new_store_records = []
+                new_rmc_records = []
+                # values for upserting the record max counters of existing store records
+                rmc_upsert_values = []
+                # existing store records pending a bulk update
+                updated_store_records = []
+                store_records_dict = Store.objects.in_bulk(
+                    id_list=[app_model.id for app_model in app_models]
+                )
+
+                for app_model in app_models:
+                    try:
+                        store_model = store_records_dict[app_model.id]
+
+                        ser_dict = json_codec.loads(store_model.serialized)
+                        ser_dict.update(app_model.serialize())
+                        serialized = json_codec.dumps(ser_dict)
+
+                        # if nothing changed since the record was last serialized, leave the store
+                        # record alone so it doesn't get a new counter and queue again on every peer
+                        if (
+                            serialized == store_model.serialized
+                            and not store_model.dirty_bit
+                            and not store_model.deleted
+                            and not store_model.hard_deleted
+                        ):
+                            continue
+
+                        # if store record dirty and app record dirty, append store serialized to conflicting data
+                        if store_model.dirty_bit:
+                            store_model.conflicting_serialized_data = (
+                                store_model.serialized
+                                + "\n"
+                                + store_model.conflicting_serialized_data
+                            )
+                            store_model.dirty_bit = False
+
+                        # set new serialized data on this store model
+                        store_model.serialized = serialized
+
+                        # queue instance and counter to create or update the record max counter for
+                        # this store model
+                        rmc_upsert_values.extend(
+                            [current_id.id, current_id.counter, store_model.id]
                         )
-                        store_model.dirty_bit = False
-
-                    # set new serialized data on this store model
-                    ser_dict = json.loads(store_model.serialized)
-                    ser_dict.update(app_model.serialize())
-                    store_model.serialized = DjangoJSONEncoder().encode(ser_dict)
-
-                    # create or update instance and counter on the record max counter for this store model
-                    RecordMaxCounter.objects.update_or_create(
-                        defaults={"counter": current_id.counter},
-                        instance_id=current_id.id,
-                        store_model_id=store_model.id,
-                    )
 
-                    # update last saved bys for this store model
-                    store_model.last_saved_instance = current_id.id
-                    store_model.last_saved_counter = current_id.counter
-                    # update deleted flags in case it was previously deleted
-                    store_model.deleted = False
-                    store_model.hard_deleted = False
-                    # clear last_transfer_session_id
-                    store_model.last_transfer_session_id = None
-
-                    # update this model
-                    store_model.save()
-
-                except KeyError:
-                    kwargs = {
-                        "id": app_model.id,
-                        "serialized": DjangoJSONEncoder().encode(app_model.serialize()),
-                        "last_saved_instance": current_id.id,
-                        "last_saved_counter": current_id.counter,
-                        "model_name": app_model.morango_model_name,
-                        "profile": app_model.morango_profile,
-                        "partition": app_model._morango_partition,
-                        "source_id": app_model._morango_source_id,
-                    }
-                    # check if model has FK pointing to it and add the value to a field on the store
-                    self_ref_fk = _self_referential_fk(model)
-                    if self_ref_fk:
-                        self_ref_fk_value = getattr(app_model, self_ref_fk)
-                        kwargs.update({"_self_ref_fk": self_ref_fk_value or ""})
-                    # create store model and record max counter for the app model
-                    new_store_records.append(Store(**kwargs))
-                    new_rmc_records.append(
-                        RecordMaxCounter(
-                            store_model_id=app_model.id,
-                            instance_id=current_id.id,
-                            counter=current_id.counter,
+                        # update last saved bys for this store model
+                        store_model.last_saved_instance = current_id.id
+                        store_model.last_saved_counter = current_id.counter
+                        # update deleted flags in case it was previously deleted
+                        store_model.deleted = False
+                        store_model.hard_deleted = False
+                        # clear last_transfer_session_id
+                        store_model.last_transfer_session_id = None
+
+                        # queue this model for update
+                        updated_store_records.append(store_model)
+
+                    except KeyError:
+                        kwargs = {
+                            "id": app_model.id,
+                            "serialized": json_codec.dumps(app_model.serialize()),
+                            "last_saved_instance": current_id.id,
+                            "last_saved_counter": current_id.counter,
+                            "model_name": app_model.morango_model_name,
+                            "profile": app_model.morango_profile,
+                            "partition": app_model._morango_partition,
+                            "source_id": app_model._morango_source_id,
+                        }
+                        if self_ref_fk:
+                            self_ref_fk_value = getattr(app_model, self_ref_fk)
+                            kwargs.update({"_self_ref_fk": self_ref_fk_value or ""})
+                        # create store model and record max counter for the app model
+                        new_store_records.append(Store(**kwargs))
+                        new_rmc_records.append(
+                            RecordMaxCounter(
+                                store_model_id=app_model.id,
+                                instance_id=current_id.id,
+                                counter=current_id.counter,
+                            )
                         )
-                    )
 
-            # bulk create store and rmc records for this class
-            Store.objects.bulk_create(new_store_records)
-            RecordMaxCounter.objects.bulk_create(new_rmc_records)
+                # bulk update existing store records for this chunk
+                _bulk_update_store_records(updated_store_records)
+
+                # bulk create store and rmc records for this chunk
+                Store.objects.bulk_create(new_store_records)
+                RecordMaxCounter.objects.bulk_create(new_rmc_records)
+
+                # bulk create or update rmc records for the existing store records of this chunk
+                if rmc_upsert_values:
+                    with connection.cursor() as cursor:
+                        DBBackend._bulk_record_max_counter_upsert(
+                            cursor, rmc_upsert_values
+                        )
 
             # set dirty bit to false for all instances of this model
             klass_queryset.update(update_dirty_bit_to=False)
@@ -431,190 +563,628 @@ def _validate_store_foreign_keys(from_model_name, fk_references):
     return exclude_pks, deleted_pks
 
 
-def _deserialize_from_store(profile, skip_erroring=False, filter=None):
+@contextmanager
+def _delay_mptt_updates(model):
+    """
+    Delays the tree updates of an MPTT model until the end of the block, when the affected trees
+    are partially rebuilt, instead of shifting the tree on every inserted node
+
+    :param model: The model class
+    """
+    tree_manager = getattr(model, "_tree_manager", None)
+    if (
+        tree_manager is None
+        or model._meta.proxy
+        or tree_manager.tree_model is not model
+    ):
+        yield
+    else:
+        with tree_manager.delay_mptt_updates():
+            yield
+
+
+def _delete_app_models(klass_model, pks, hard_delete=False):
+    """
+    Deletes the app models of deleted store records, in chunks, with one collector pass per chunk
+    instead of one per record. When hard deleting, every syncable model collected for deletion,
+    including those cascaded to, is marked as hard deleted. MPTT models are instead deleted one by
+    one, so their trees are updated.
+
+    :param klass_model: The model class of the app models
+    :param pks: A list of PKs of the app models to delete
+    :param hard_delete: Whether the app models were hard deleted
+    """
+    if issubclass(klass_model, MorangoMPTTModel):
+        with _delay_mptt_updates(klass_model):
+            for pk in pks:
+                # fetched one at a time, since deleting a node changes the tree fields of others
+                try:
+                    app_model = klass_model.objects.get(id=pk)
+                except klass_model.DoesNotExist:
+                    continue
+                app_model.delete(hard_delete=hard_delete)
+        return
+
+    for i in range(0, len(pks), DESERIALIZE_CHUNK_SIZE):
+        chunk = pks[i : i + DESERIALIZE_CHUNK_SIZE]
+        queryset = klass_model.objects.filter(id__in=chunk)
+        if not hard_delete:
+            queryset.delete()
+            continue
+
+        collector = Collector(using=router.db_for_write(klass_model))
+        collector.collect(list(queryset))
+        hard_deleted_values = []
+        for collected_model, instances in six.iteritems(collector.data):
+            if issubclass(collected_model, SyncableModel) or issubclass(
+                collected_model, MorangoMPTTModel
+            ):
+                for instance in instances:
+                    hard_deleted_values.extend([instance.id, instance.morango_profile])
+        if hard_deleted_values:
+            with connection.cursor() as cursor:
+                DBBackend._bulk_full_record_upsert(
+                    cursor,
+                    HardDeletedModels._meta.db_table,
+                    HardDeletedModels._meta.fields,
+                    hard_deleted_values,
+                )
+        collector.delete()
+
+
+def _deserialize_store_records(
+    model, store_records, fk_cache, excluded_list, deleted_list, mute_save_signals=True
+):
+    """
+    Deserializes a batch of dirty store records of a model into the application, validating their
+    foreign keys (FK) in bulk, then writing them with one bulk upsert, or by saving each if the
+    model is an MPTT model, since its tree fields are computed on save
+
+    :param model: The model class of the store records
+    :param store_records: An iterable of dirty `Store` records
+    :param fk_cache: A dict used for caching FK lookups
+    :param excluded_list: A list of store PKs which failed to deserialize, which is extended
+    :param deleted_list: A list of store PKs with FKs to deleted records, which is extended
+    :param mute_save_signals: Whether to mute the save signals while saving MPTT models, which
+        the caller must otherwise have done, since muting them isn't thread safe
+    :return: A list of the store PKs which were deserialized into the application, or deleted
+    """
+    app_models = []
+    deserialized_pks = []
+    deferred_fks = defaultdict(list)
+    # tuples of store PKs and their errors, to be written to the store in bulk
+    deserialization_errors = []
+    # PKs of deleted store records, keyed by their model class, to delete from the app in bulk
+    deleted_pks = defaultdict(list)
+    hard_deleted_pks = defaultdict(list)
+    fields = model._meta.fields
+    for store_model in store_records:
+        if store_model.deleted:
+            klass_model = syncable_models.get_model(
+                store_model.profile, store_model.model_name
+            )
+            if store_model.hard_deleted:
+                hard_deleted_pks[klass_model].append(store_model.id)
+            else:
+                deleted_pks[klass_model].append(store_model.id)
+            deserialized_pks.append(store_model.id)
+            continue
+
+        try:
+            app_model, model_deferred_fks = store_model._deserialize_store_model(
+                fk_cache, defer_fks=True
+            )
+            if app_model:
+                app_models.append(app_model)
+            else:
+                deserialized_pks.append(store_model.id)
+            for fk_model, fk_refs in model_deferred_fks.items():
+                # validate that the FK references aren't to anything already in the
+                # excluded list, which should only contain models which failed to
+                # deserialize for reasons other than broken FKs at this point
+                for fk_ref in fk_refs:
+                    if fk_ref.to_pk in excluded_list:
+                        raise exceptions.ValidationError(
+                            "{} with id {} failed to deserialize".format(
+                                fk_model, fk_ref.to_pk
+                            )
+                        )
+                deferred_fks[fk_model].extend(fk_refs)
+        except (
+            exceptions.ValidationError,
+            exceptions.ObjectDoesNotExist,
+            ValueError,
+        ) as e:
+            # if the app model did not validate, we leave the store dirty bit set
+            excluded_list.append(store_model.id)
+            deserialization_errors.append((store_model.id, str(e)))
+
+    # propagate deletions to the app
+    for klass_model, pks in hard_deleted_pks.items():
+        _delete_app_models(klass_model, pks, hard_delete=True)
+    for klass_model, pks in deleted_pks.items():
+        _delete_app_models(klass_model, pks)
+
+    # validate app model FKs
+    model_excluded_pks, model_deleted_pks = _validate_store_foreign_keys(
+        model.__name__, deferred_fks
+    )
+    excluded_list.extend(model_excluded_pks)
+    deleted_list.extend(model_deleted_pks)
+
+    skipped_pks = set(excluded_list).union(model_deleted_pks)
+    app_models = [
+        app_model for app_model in app_models if app_model.pk not in skipped_pks
+    ]
+
+    if issubclass(model, MPTTModel):
+        save_signals = (signals.pre_save, signals.post_save) if mute_save_signals else ()
+        with _delay_mptt_updates(model):
+            for app_model in app_models:
+                try:
+                    with mute_signals(*save_signals):
+                        app_model.save(update_dirty_bit_to=False)
+                    deserialized_pks.append(app_model.pk)
+                except (
+                    exceptions.ValidationError,
+                    exceptions.ObjectDoesNotExist,
+                    ValueError,
+                ) as e:
+                    excluded_list.append(app_model.pk)
+                    deserialization_errors.append((app_model.pk, str(e)))
+    else:
+        # array for holding db values from the fields of each model for this class
+        db_values = []
+        for app_model in app_models:
+            # handle any errors that might come from `get_db_prep_value`
+            try:
+                new_db_values = []
+                for f in fields:
+                    value = getattr(app_model, f.attname)
+                    db_value = f.get_db_prep_value(value, connection)
+                    new_db_values.append(db_value)
+                db_values += new_db_values
+                deserialized_pks.append(app_model.pk)
+            except ValueError as e:
+                excluded_list.append(app_model.pk)
+                deserialization_errors.append((app_model.pk, str(e)))
+
+        if db_values:
+            with connection.cursor() as cursor:
+                DBBackend._bulk_full_record_upsert(
+                    cursor, model._meta.db_table, fields, db_values,
+                )
+
+    _bulk_update_deserialization_errors(deserialization_errors)
+    return deserialized_pks
+
+
+def _deserialize_self_referential_store_models(
+    model,
+    store_models,
+    dirty_store_models,
+    fk_cache,
+    excluded_list,
+    deleted_list,
+    mute_save_signals=True,
+):
+    """
+    Deserializes the dirty store records of a model with a foreign key to itself, level by level
+    down the tree, so that parents are always deserialized before their children. The levels are
+    computed once up front, and each level is deserialized in bulk, in chunks.
+
+    :param model: The model class
+    :param store_models: A queryset of the store records applicable to the model
+    :param dirty_store_models: A queryset of the dirty store records to deserialize
+    :param fk_cache: A dict used for caching FK lookups
+    :param excluded_list: A list of store PKs which failed to deserialize, which is extended
+    :param deleted_list: A list of store PKs with FKs to deleted records, which is extended
+    :param mute_save_signals: Whether to mute the save signals while saving MPTT models
+    """
+    clean_parents = set(store_models.filter(dirty_bit=False).char_ids_list())
+    children = defaultdict(list)
+    for pk, parent_pk in dirty_store_models.values_list("id", "_self_ref_fk"):
+        children[parent_pk].append(pk)
+
+    # start with records that have no parent, or a parent that's already clean
+    level = list(children.pop("", []))
+    for parent_pk in clean_parents:
+        level.extend(children.pop(parent_pk, []))
+
+    while level:
+        next_level = []
+        for i in range(0, len(level), DESERIALIZE_CHUNK_SIZE):
+            chunk = level[i : i + DESERIALIZE_CHUNK_SIZE]
+            deleted_count = len(deleted_list)
+            deserialized_pks = _deserialize_store_records(
+                model,
+                dirty_store_models.filter(id__in=chunk),
+                fk_cache,
+                excluded_list,
+                deleted_list,
+                mute_save_signals=mute_save_signals,
+            )
+            # records with FKs to deleted records aren't deserialized, but are handled, so like
+            # the deserialized ones, they're marked clean, which unblocks their children
+            handled_pks = list(deserialized_pks) + deleted_list[deleted_count:]
+            # we update the store records after we have deserialized them to be able to mark
+            # them as clean parents
+            Store.objects.filter(id__in=handled_pks).update(
+                dirty_bit=False, deserialization_error=""
+            )
+            for pk in handled_pks:
+                next_level.extend(children.pop(pk, []))
+        level = next_level
+
+    # A. Mark records that were skipped due to missing parents with error info
+    # A(i). The ones that have a parent Store entry but it's dirty
+    dirty_parents = store_models.filter(dirty_bit=True).char_ids_list()
+    dirty_store_models.filter(_self_ref_fk__in=dirty_parents).exclude(
+        id__in=excluded_list
+    ).update(deserialization_error="Parent is dirty; could not deserialize.")
+    # A(ii). The ones that don't even have Store entries for parent at all
+    all_parents = store_models.char_ids_list()
+    dirty_store_models.exclude(_self_ref_fk__in=all_parents).exclude(
+        id__in=excluded_list
+    ).update(
+        deserialization_error="Parent does not exist in Store; could not deserialize."
+    )
+
+
+def _deserialize_model_from_store(
+    model,
+    profile,
+    fk_cache,
+    excluded_list,
+    deleted_list,
+    skip_erroring=False,
+    filter=None,
+    own_records_only=False,
+    store_condition=None,
+    mute_save_signals=True,
+):
+    """
+    Deserializes the dirty store records of a single syncable model into the application
+
+    :param model: The model class
+    :param profile: The profile of the model
+    :param fk_cache: A dict used for caching FK lookups
+    :param excluded_list: A list of store PKs which failed to deserialize, which is extended
+    :param deleted_list: A list of store PKs with FKs to deleted records, which is extended
+    :param skip_erroring: Whether to skip records that previously failed to deserialize
+    :param filter: The filter for filtering applicable records, if any
+    :type filter: morango.models.certificates.Filter|None
+    :param own_records_only: Whether to only write to the store records of this model, and not
+        those of its `morango_model_dependencies`, which are still read for finding parents
+    :param store_condition: A Q object further limiting which dirty store records to deserialize
+    :param mute_save_signals: Whether to mute the save signals while saving MPTT models
+    """
+    store_models = Store.objects.filter(profile=profile)
+
+    model_condition = Q(model_name=model.morango_model_name)
+    for klass in model.morango_model_dependencies:
+        model_condition |= Q(model_name=klass.morango_model_name)
+
+    store_models = store_models.filter(model_condition)
+
+    if filter:
+        # create Q objects for filtering by prefixes
+        prefix_condition = functools.reduce(
+            lambda x, y: x | y,
+            [Q(partition__startswith=prefix) for prefix in filter],
+        )
+        store_models = store_models.filter(prefix_condition)
+
+    # if requested, skip any records that previously errored, to be faster
+    if skip_erroring:
+        store_models = store_models.filter(deserialization_error="")
+
+    dirty_store_models = store_models.filter(dirty_bit=True)
+    if store_condition is not None:
+        dirty_store_models = dirty_store_models.filter(store_condition)
+    if own_records_only:
+        dirty_store_models = dirty_store_models.filter(
+            model_name=model.morango_model_name
+        )
+
+    # handle cases where a class has a single FK reference to itself
+    if _self_referential_fk(model):
+        _deserialize_self_referential_store_models(
+            model,
+            store_models,
+            dirty_store_models,
+            fk_cache,
+            excluded_list,
+            deleted_list,
+            mute_save_signals=mute_save_signals,
+        )
+
+    else:
+        _deserialize_store_records(
+            model,
+            dirty_store_models,
+            fk_cache,
+            excluded_list,
+            deleted_list,
+            mute_save_signals=mute_save_signals,
+        )
+
+        # clear dirty bit for all store records for this model/profile except for rows that did not validate
+        dirty_store_models.exclude(id__in=excluded_list).update(dirty_bit=False)
+
+
+def _transfer_session_scope(profile, transfer_session_id):
+    """
+    Determines which dirty store records need deserializing after a transfer session: those that
+    were transferred in it, and those that previously failed to deserialize and may have been
+    waiting on them, being of a model that depends on a model with transferred records, directly,
+    through other models, or through a self referential FK
+
+    :param profile: The profile of the models
+    :param transfer_session_id: The ID of the transfer session
+    :return: A dict mapping each model with store records in scope to a Q object for filtering them
+    """
+    transferred_model_names = set(
+        Store.objects.filter(
+            profile=profile, last_transfer_session_id=transfer_session_id
+        )
+        .values_list("model_name", flat=True)
+        .distinct()
+    )
+
+    scope = {}
+    # models with store records which could newly deserialize, for determining their dependents
+    touched_models = set()
+    # dependencies are in dependency order, so a model's dependencies are always handled first
+    for model, dependencies in syncable_models.get_model_dependencies(profile).items():
+        transferred = model.morango_model_name in transferred_model_names
+        unblocked = any(dependency in touched_models for dependency in dependencies)
+        if transferred and _self_referential_fk(model):
+            unblocked = True
+
+        if not transferred and not unblocked:
+            continue
+
+        condition = Q(last_transfer_session_id=transfer_session_id)
+        if unblocked:
+            condition |= ~Q(deserialization_error="")
+        scope[model] = condition
+        touched_models.add(model)
+    return scope
+
+
+def _deserialize_from_store(
+    profile, skip_erroring=False, filter=None, transfer_session_id=None
+):
     """
     Takes data from the store and integrates into the application.
 
     ALGORITHM: On a per syncable model basis, we iterate through each class model and we go through 2 possible cases:
 
-    1. For class models that have a self referential foreign key, we iterate down the dependency tree deserializing model by model.
+    1. For class models that have a self referential foreign key, we iterate down the dependency tree deserializing
+    level by level, in bulk.
     2. On a per app model basis, we append the field values to a single list, and do a single bulk insert/replace query.
 
     If a model fails to deserialize/validate, we exclude it from being marked as clean in the store.
+
+    If `transfer_session_id` is passed, only the records transferred in that transfer session are deserialized, along
+    with records that previously failed to deserialize and may have depended on them.
+
+    On PostgreSQL, when the `MORANGO_DESERIALIZE_WORKERS` setting is greater than 1, models are deserialized
+    concurrently by a pool of worker threads, each model starting once the models it depends on have completed, and
+    each in its own transaction and database connection. The partition locks are held throughout, but each model is
+    committed on its own, so if one fails, the models already deserialized stay deserialized, with their store records
+    clean, while the failed model and those depending on it are left dirty for the next deserialization. The
+    `pre_save` and `post_save` signals are muted for the whole process while the workers run, not only for the
+    workers, so receivers of those signals aren't called for models saved by any other thread in the meantime.
     """
 
     fk_cache = {}
     excluded_list = []
     deleted_list = []
+    workers = SETTINGS.MORANGO_DESERIALIZE_WORKERS
 
     with _begin_transaction(filter, isolated=True):
-        # iterate through classes which are in foreign key dependency order
-        for model in syncable_models.get_models(profile):
-            deferred_fks = defaultdict(list)
-            store_models = Store.objects.filter(profile=profile)
-
-            model_condition = Q(model_name=model.morango_model_name)
-            for klass in model.morango_model_dependencies:
-                model_condition |= Q(model_name=klass.morango_model_name)
-
-            store_models = store_models.filter(model_condition)
-
-            if filter:
-                # create Q objects for filtering by prefixes
-                prefix_condition = functools.reduce(
-                    lambda x, y: x | y,
-                    [Q(partition__startswith=prefix) for prefix in filter],
+        scope = None
+        if transfer_session_id is not None:
+            scope = _transfer_session_scope(profile, transfer_session_id)
+
+        if workers > 1 and DBBackend.backend == "postgresql":
+            # this transaction holds the partition locks while the workers deserialize each model,
+            # and the signals are muted once here, since muting swaps their receivers globally, which
+            # mutes them for every thread in the process until the workers have completed
+            with mute_signals(signals.pre_save, signals.post_save):
+                run_in_dependency_order(
+                    syncable_models.get_model_dependencies(profile),
+                    functools.partial(
+                        _deserialize_model_in_worker,
+                        profile=profile,
+                        excluded_list=excluded_list,
+                        deleted_list=deleted_list,
+                        skip_erroring=skip_erroring,
+                        filter=filter,
+                        scope=scope,
+                        mute_save_signals=False,
+                    ),
+                    workers,
                 )
-                store_models = store_models.filter(prefix_condition)
-
-            # if requested, skip any records that previously errored, to be faster
-            if skip_erroring:
-                store_models = store_models.filter(deserialization_error="")
-
-            # handle cases where a class has a single FK reference to itself
-            if _self_referential_fk(model):
-                clean_parents = store_models.filter(dirty_bit=False).char_ids_list()
-                dirty_children = (
-                    store_models.filter(dirty_bit=True)
-                    # handle parents or if the model has no parent
-                    .filter(Q(_self_ref_fk__in=clean_parents) | Q(_self_ref_fk=""))
+        else:
+            # iterate through classes which are in foreign key dependency order
+            for model in syncable_models.get_models(profile):
+                if scope is not None and model not in scope:
+                    continue
+                _deserialize_model_from_store(
+                    model,
+                    profile,
+                    fk_cache,
+                    excluded_list,
+                    deleted_list,
+                    skip_erroring=skip_erroring,
+                    filter=filter,
+                    store_condition=scope[model] if scope is not None else None,
                 )
 
-                # keep iterating until size of dirty_children is 0
-                while len(dirty_children) > 0:
-                    for store_model in dirty_children:
-                        try:
-                            app_model, _ = store_model._deserialize_store_model(
-                                fk_cache
-                            )
-                            if app_model:
-                                with mute_signals(signals.pre_save, signals.post_save):
-                                    app_model.save(update_dirty_bit_to=False)
-                            # we update a store model after we have deserialized it to be able to mark it as a clean parent
-                            store_model.dirty_bit = False
-                            store_model.deserialization_error = ""
-                            store_model.save(
-                                update_fields=["dirty_bit", "deserialization_error"]
-                            )
-                        except (
-                            exceptions.ValidationError,
-                            exceptions.ObjectDoesNotExist,
-                            ValueError,
-                        ) as e:
-                            excluded_list.append(store_model.id)
-                            # if the app model did not validate, we leave the store dirty bit set, but mark the error
-                            store_model.deserialization_error = str(e)
-                            store_model.save(update_fields=["deserialization_error"])
-
-                    # update lists with new clean parents and dirty children
-                    clean_parents = store_models.filter(dirty_bit=False).char_ids_list()
-                    dirty_children = store_models.filter(
-                        dirty_bit=True, _self_ref_fk__in=clean_parents
-                    ).exclude(id__in=excluded_list)
-
-                # A. Mark records that were skipped due to missing parents with error info
-                # A(i). The ones that have a parent Store entry but it's dirty
-                dirty_parents = store_models.filter(dirty_bit=True).char_ids_list()
-                store_models.filter(
-                    dirty_bit=True, _self_ref_fk__in=dirty_parents
-                ).exclude(id__in=excluded_list).update(
-                    deserialization_error="Parent is dirty; could not deserialize."
-                )
-                # A(ii). The ones that don't even have Store entries for parent at all
-                all_parents = store_models.char_ids_list()
-                store_models.filter(dirty_bit=True).exclude(
-                    _self_ref_fk__in=all_parents
-                ).exclude(id__in=excluded_list).update(
-                    deserialization_error="Parent does not exist in Store; could not deserialize."
-                )
 
-            else:
-                # collect all initially valid app models
-                app_models = []
-                fields = model._meta.fields
-                for store_model in store_models.filter(dirty_bit=True):
-                    try:
-                        (
-                            app_model,
-                            model_deferred_fks,
-                        ) = store_model._deserialize_store_model(
-                            fk_cache, defer_fks=True
-                        )
-                        if app_model:
-                            app_models.append(app_model)
-                        for fk_model, fk_refs in model_deferred_fks.items():
-                            # validate that the FK references aren't to anything already in the
-                            # excluded list, which should only contain models which failed to
-                            # deserialize for reasons other than broken FKs at this point
-                            for fk_ref in fk_refs:
-                                if fk_ref.to_pk in excluded_list:
-                                    raise exceptions.ValidationError(
-                                        "{} with id {} failed to deserialize".format(
-                                            fk_model, fk_ref.to_pk
-                                        )
-                                    )
-                            deferred_fks[fk_model].extend(fk_refs)
-                    except (
-                        exceptions.ValidationError,
-                        exceptions.ObjectDoesNotExist,
-                        ValueError,
-                    ) as e:
-                        # if the app model did not validate, we leave the store dirty bit set
-                        excluded_list.append(store_model.id)
-                        store_model.deserialization_error = str(e)
-                        store_model.save(update_fields=["deserialization_error"])
-
-                # validate app model FKs
-                model_excluded_pks, model_deleted_pks = _validate_store_foreign_keys(
-                    model.__name__, deferred_fks
+def _deserialize_model_in_worker(
+    model, profile, excluded_list, deleted_list, scope=None, **kwargs
+):
+    """
+    Deserializes a model from within a worker thread, which has its own database connection, in
+    its own transaction. Only the store records of the model itself are written to, so that
+    workers never contend over the same rows.
+    """
+    if scope is not None:
+        if model not in scope:
+            return
+        kwargs.update(store_condition=scope[model])
+
+    try:
+        with DBBackend._set_transaction_repeatable_read():
+            with transaction.atomic(savepoint=False):
+                _deserialize_model_from_store(
+                    model,
+                    profile,
+                    {},
+                    excluded_list,
+                    deleted_list,
+                    own_records_only=True,
+                    **kwargs
                 )
-                excluded_list.extend(model_excluded_pks)
-                deleted_list.extend(model_deleted_pks)
+    finally:
+        # the connection belongs to this worker thread, so it must be closed here
+        connection.close()
+
+
+def _queue_fsic_diff_into_buffer(transfersession, fsic_diff, batch_size=None):
+    """
+    Queues the store records newer than the FSIC diff into the buffer. The diff is loaded into a temp table, which is joined
+    against the store in a single query, so the query doesn't grow with the number of instances and partitions in the FSICs.
+
+    :param transfersession: The transfer session to queue the records for
+    :param fsic_diff: A list of dicts of `partition`, `instance_id` and `counter`, for which any store record with a
+        partition prefixed by `partition` and last saved by `instance_id` after `counter` should be queued
+    :param batch_size: If provided, only the next batch of at most this many records is queued, in order of their IDs,
+        after the records already queued for the transfer session
+    :return: The number of records queued
+    """
+    if not fsic_diff:
+        return 0
+
+    with TemporaryTable(
+        connection,
+        "fsics",
+        partition=TextField(),
+        instance_id=UUIDField(),
+        counter=IntegerField(),
+    ) as temp_table, connection.cursor() as cursor:
+        temp_table.bulk_insert(fsic_diff)
+        temp_table.create_index("instance_id", "counter")
+
+        statement_name = "queue_buffer"
+        buffer_params = [transfersession.id, transfersession.sync_session.profile]
+        rmcb_params = [transfersession.id] * 2
+        batch_condition = ""
+        rmcb_batch_condition = ""
+        batch_limit = ""
+
+        if batch_size is not None:
+            statement_name = "queue_buffer_batch"
+            # batches are queued in order of the store IDs, so the last ID queued is where to continue from
+            cursor.execute(
+                """SELECT model_uuid FROM {outgoing_buffer}
+                   WHERE transfer_session_id = %s
+                   ORDER BY model_uuid DESC LIMIT 1
+                """.format(outgoing_buffer=Buffer._meta.db_table),
+                [transfersession.id],
+            )
+            last_queued = cursor.fetchone()
+            if last_queued is not None:
+                statement_name = "queue_buffer_next_batch"
+                batch_condition = "AND s.id > %s"
+                rmcb_batch_condition = "AND buffer.model_uuid > %s"
+                buffer_params.append(last_queued[0])
+                rmcb_params.append(last_queued[0])
+            batch_limit = "ORDER BY s.id LIMIT %s"
+            buffer_params.append(batch_size)
+
+        transfer_session_id_type = TransferSession._meta.pk.rel_db_type(connection)
+
+        # take all store records which were last saved by an instance in the diff, within the partition, after its counter
+        select_buffer_query = """SELECT
+                id, serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name, profile,
+                partition, source_id, conflicting_serialized_data,
+                CAST (%s AS {transfer_session_id_type}), _self_ref_fk
+            FROM {store} AS s
+            WHERE s.profile = %s {batch_condition} AND EXISTS (
+                SELECT 1
+                FROM {fsics} AS t
+                WHERE t.instance_id = s.last_saved_instance
+                    AND s.last_saved_counter > t.counter
+                    AND s.partition LIKE t.partition || '%%'
+            )
+            {batch_limit}
+        """.format(
+            transfer_session_id_type=transfer_session_id_type,
+            store=Store._meta.db_table,
+            fsics=temp_table.sql_name,
+            batch_condition=batch_condition,
+            batch_limit=batch_limit,
+        )
 
-                # array for holding db values from the fields of each model for this class
-                db_values = []
-                for app_model in app_models:
-                    if (
-                        app_model.pk not in excluded_list
-                        and app_model.pk not in deleted_list
-                    ):
-                        # handle any errors that might come from `get_db_prep_value`
-                        try:
-                            new_db_values = []
-                            for f in fields:
-                                value = getattr(app_model, f.attname)
-                                db_value = f.get_db_prep_value(value, connection)
-                                new_db_values.append(db_value)
-                            db_values += new_db_values
-                        except ValueError as e:
-                            excluded_list.append(app_model.pk)
-                            store_model = store_models.get(pk=app_model.pk)
-                            store_model.deserialization_error = str(e)
-                            store_model.save(update_fields=["deserialization_error"])
-
-                if db_values:
-                    with connection.cursor() as cursor:
-                        DBBackend._bulk_full_record_upsert(
-                            cursor,
-                            model._meta.db_table,
-                            fields,
-                            db_values,
-                        )
+        # take all record max counters that are foreign keyed onto store models, which were queued into the buffer
+        select_rmc_buffer_query = """SELECT instance_id, counter, CAST (%s AS {transfer_session_id_type}), store_model_id
+                FROM {record_max_counter} AS rmc
+                INNER JOIN {outgoing_buffer} AS buffer ON rmc.store_model_id = buffer.model_uuid
+                WHERE buffer.transfer_session_id = %s {batch_condition}
+            """.format(
+            transfer_session_id_type=transfer_session_id_type,
+            record_max_counter=RecordMaxCounter._meta.db_table,
+            outgoing_buffer=Buffer._meta.db_table,
+            batch_condition=rmcb_batch_condition,
+        )
 
-                # clear dirty bit for all store records for this model/profile except for rows that did not validate
-                store_models.exclude(id__in=excluded_list).filter(
-                    dirty_bit=True
-                ).update(dirty_bit=False)
+        DBBackend._execute_statement(
+            cursor,
+            statement_name,
+            """INSERT INTO {outgoing_buffer}
+               (model_uuid, serialized, deleted, last_saved_instance, last_saved_counter,
+               hard_deleted, model_name, profile, partition, source_id, conflicting_serialized_data,
+               transfer_session_id, _self_ref_fk)
+               {select}
+            """.format(
+                outgoing_buffer=Buffer._meta.db_table,
+                select=select_buffer_query,
+            ),
+            buffer_params,
+            uses_temp_table=True,
+        )
+        queued = cursor.rowcount
+        DBBackend._execute_statement(
+            cursor,
+            statement_name.replace("buffer", "rmcb"),
+            """INSERT INTO {outgoing_rmcb}
+               (instance_id, counter, transfer_session_id, model_uuid)
+               {select}
+            """.format(
+                outgoing_rmcb=RecordMaxCounterBuffer._meta.db_table,
+                select=select_rmc_buffer_query,
+            ),
+            rmcb_params,
+        )
+    return queued
 
 
-def _queue_into_buffer_v1(transfersession):
+def _queue_into_buffer_v1(transfersession, batch_size=None):
     """
     Takes a chunk of data from the store to be put into the buffer to be sent to another morango instance. This is the legacy
     code to handle backwards compatibility with older versions of Morango, with the v1 version of the FSIC data structure.
 
     ALGORITHM: We do Filter Specific Instance Counter arithmetic to get our newest data compared to the server's older data.
-    We use raw sql queries to place data in the buffer and the record max counter buffer, which matches the conditions of the FSIC,
-    as well as the partition for the data we are syncing.
+    We load the resulting instance counters, for every partition in the filter, into a temp table which is joined against the
+    store to place the matching data in the buffer and the record max counter buffer.
+
+    :param batch_size: If provided, only the next batch of at most this many records is queued
+    :return: The number of records queued
     """
     filter_prefixes = Filter(transfersession.filter)
     with _begin_transaction(filter_prefixes, shared_lock=True):
@@ -628,112 +1198,20 @@ def _queue_into_buffer_v1(transfersession):
 
         # if fsics are identical or receiving end has newer data, then there is nothing to queue
         if not fsics:
-            return
-
-        profile_condition = [
-            "profile = '{}'".format(transfersession.sync_session.profile)
-        ]
-        partition_conditions = []
-        # create condition for filtering by partitions
-        for prefix in filter_prefixes:
-            partition_conditions += ["partition LIKE '{}%'".format(prefix)]
-        if filter_prefixes:
-            partition_conditions = [
-                _join_with_logical_operator(partition_conditions, "OR")
-            ]
-
-        chunk_size = 200
-        fsics = list(fsics.items())
-        fsics_len = len(fsics)
-        fsics_limit = chunk_size * SQL_UNION_MAX
-
-        if fsics_len >= fsics_limit:
-            raise MorangoLimitExceeded(
-                "Limit of {limit} instance counters exceeded with {actual}".format(
-                    limit=fsics_limit, actual=fsics_len
-                )
-            )
+            return 0
 
-        # chunk fsics creating multiple SQL selects which will be unioned before insert
-        i = 0
-        chunk = fsics[:chunk_size]
-        select_buffers = []
-
-        while chunk:
-            # create condition for all push FSICs where instance_ids are equal, but internal counters are higher than
-            # FSICs counters
-            last_saved_by_conditions = [
-                "(last_saved_instance = '{0}' AND last_saved_counter > {1})".format(
-                    instance, counter
-                )
-                for instance, counter in chunk
-            ]
-            if last_saved_by_conditions:
-                last_saved_by_conditions = [
-                    _join_with_logical_operator(last_saved_by_conditions, "OR")
-                ]
-
-            # combine conditions and filter by profile
-            where_condition = _join_with_logical_operator(
-                profile_condition + last_saved_by_conditions + partition_conditions,
-                "AND",
-            )
-
-            # execute raw sql to take all records that match condition, to be put into buffer for transfer
-            select_buffers.append(
-                """SELECT
-                       id, serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name, profile,
-                       partition, source_id, conflicting_serialized_data,
-                       CAST ('{transfer_session_id}' AS {transfer_session_id_type}), _self_ref_fk
-                   FROM {store} WHERE {condition}
-                """.format(
-                    transfer_session_id=transfersession.id,
-                    transfer_session_id_type=TransferSession._meta.pk.rel_db_type(
-                        connection
-                    ),
-                    condition=where_condition,
-                    store=Store._meta.db_table,
-                )
-            )
-            i += chunk_size
-            chunk = fsics[i : i + chunk_size]
-
-        # take all record max counters that are foreign keyed onto store models, which were queued into the buffer
-        select_rmc_buffer_query = """SELECT instance_id, counter, CAST ('{transfer_session_id}' AS {transfer_session_id_type}), store_model_id
-                FROM {record_max_counter} AS rmc
-                INNER JOIN {outgoing_buffer} AS buffer ON rmc.store_model_id = buffer.model_uuid
-                WHERE buffer.transfer_session_id = '{transfer_session_id}'
-            """.format(
-            transfer_session_id=transfersession.id,
-            transfer_session_id_type=TransferSession._meta.pk.rel_db_type(connection),
-            record_max_counter=RecordMaxCounter._meta.db_table,
-            outgoing_buffer=Buffer._meta.db_table,
+        return _queue_fsic_diff_into_buffer(
+            transfersession,
+            [
+                dict(partition=prefix, instance_id=instance, counter=counter)
+                for prefix in filter_prefixes
+                for instance, counter in fsics.items()
+            ],
+            batch_size=batch_size,
         )
 
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """INSERT INTO {outgoing_buffer}
-                   (model_uuid, serialized, deleted, last_saved_instance, last_saved_counter,
-                   hard_deleted, model_name, profile, partition, source_id, conflicting_serialized_data,
-                   transfer_session_id, _self_ref_fk)
-                   {select}
-                """.format(
-                    outgoing_buffer=Buffer._meta.db_table,
-                    select=" UNION ".join(select_buffers),
-                )
-            )
-            cursor.execute(
-                """INSERT INTO {outgoing_rmcb}
-                   (instance_id, counter, transfer_session_id, model_uuid)
-                   {select}
-                """.format(
-                    outgoing_rmcb=RecordMaxCounterBuffer._meta.db_table,
-                    select=select_rmc_buffer_query,
-                )
-            )
-
 
-def _queue_into_buffer_v2(transfersession, chunk_size=200):
+def _queue_into_buffer_v2(transfersession, batch_size=None):
     """
     Takes a chunk of data from the store to be put into the buffer to be sent to another morango instance.
 
@@ -741,7 +1219,11 @@ def _queue_into_buffer_v2(transfersession, chunk_size=200):
     and super partitions (prefixes of the sub partitions).
 
     ALGORITHM: We do Filter Specific Instance Counter arithmetic to get our newest data compared to the server's older data.
-    We use raw sql queries to place data in the buffer and the record max counter buffer, which matches the conditions of the FSIC.
+    We load the resulting partition instance counters into a temp table which is joined against the store to place the
+    matching data in the buffer and the record max counter buffer.
+
+    :param batch_size: If provided, only the next batch of at most this many records is queued
+    :return: The number of records queued
     """
     sync_filter = Filter(transfersession.filter)
     with _begin_transaction(sync_filter, shared_lock=True):
@@ -772,141 +1254,106 @@ def _queue_into_buffer_v2(transfersession, chunk_size=200):
 
         # if fsics are identical or receiving end has newer data, then there is nothing to queue
         if not fsics:
-            return
-
-        profile_condition = [
-            "profile = '{}'".format(transfersession.sync_session.profile)
-        ]
+            return 0
 
-        fsics_len = sum(len(fsics[part]) for part in fsics) + len(fsics)
-        # subtract one because when partitions overflow chunks they add up to an extra item per chunk
-        fsics_limit = chunk_size * (SQL_UNION_MAX - 1)
+        return _queue_fsic_diff_into_buffer(
+            transfersession,
+            [
+                dict(partition=partition, instance_id=instance, counter=counter)
+                for partition, instances in fsics.items()
+                for instance, counter in instances.items()
+            ],
+            batch_size=batch_size,
+        )
 
-        if fsics_len >= fsics_limit:
-            raise MorangoLimitExceeded(
-                "Limit of {limit} instances + partitions exceeded with {actual}".format(
-                    limit=fsics_limit, actual=fsics_len
-                )
-            )
 
-        # if needed, split the fsics into chunks
-        if fsics_len > chunk_size:
-            chunked_fsics = chunk_fsic_v2(fsics, chunk_size)
-        else:
-            chunked_fsics = [fsics]
+def _get_dequeue_instance(transfer_session):
+    """
+    Gets the current instance, with the counter recorded against the merge conflicts dequeued
+    during the transfer session. The counter is incremented once for the transfer session, and
+    reused for every batch or chunk dequeued, unless another operation has since incremented it,
+    and so may have already shared records saved up to its counter. This must be called within a
+    transaction that has locked the transfer session's partitions.
 
-        select_buffers = []
+    :type transfer_session: TransferSession
+    :rtype: InstanceIDModel
+    """
+    current_id, _ = InstanceIDModel.get_or_create_current_instance()
+    if transfer_session.dequeue_counter != current_id.counter:
+        current_id = InstanceIDModel.get_current_instance_and_increment_counter()
+        transfer_session.dequeue_counter = current_id.counter
+        transfer_session.save(update_fields=["dequeue_counter"])
+    return current_id
 
-        for fsic_chunk in chunked_fsics:
 
-            # create condition for filtering by partitions
-            partition_conditions = []
-            for part, insts in fsic_chunk.items():
-                if not insts:
-                    continue
+def _dequeue_batch_into_store(transfer_session, model_uuid_range=None):
+    """
+    Takes data from the buffers and merges into the store and record max counters, for either all
+    of the transfer session's buffered records or those within `model_uuid_range`. This must be
+    called within a transaction that has locked the transfer session's partitions.
 
-                partition_conditions.append(
-                    "partition LIKE '{}%' AND (".format(part)
-                    + _join_with_logical_operator(
-                        [
-                            "(last_saved_instance = '{}' AND last_saved_counter > {})".format(
-                                inst, counter
-                            )
-                            for inst, counter in insts.items()
-                        ],
-                        "OR",
-                    )
-                    + ")"
-                )
+    :param model_uuid_range: A tuple of the first and last `model_uuid` to dequeue, inclusive
+    """
+    current_id = _get_dequeue_instance(transfer_session)
+    with connection.cursor() as cursor:
+        DBBackend._dequeue_into_store(
+            cursor, transfer_session.id, current_id, model_uuid_range=model_uuid_range
+        )
 
-            partition_conditions = [
-                _join_with_logical_operator(partition_conditions, "OR")
-            ]
 
-            # combine conditions and filter by profile
-            where_condition = _join_with_logical_operator(
-                profile_condition + partition_conditions, "AND"
-            )
+def _dequeue_received_chunk(transfer_session):
+    """
+    When the `MORANGO_INCREMENTAL_DEQUEUE` setting is enabled, dequeues a chunk of records into the
+    store as soon as it's received, rather than once the transfer has completed. The database max
+    counters are only updated once the whole transfer has been dequeued, in the dequeuing stage.
+    Merge conflicts in every chunk are recorded against the same counter, see
+    `_get_dequeue_instance`.
+    """
+    if SETTINGS.MORANGO_INCREMENTAL_DEQUEUE:
+        with _begin_transaction(Filter(transfer_session.filter)):
+            _dequeue_batch_into_store(transfer_session)
 
-            # execute raw sql to take all records that match condition, to be put into buffer for transfer
-            select_buffers.append(
-                """SELECT
-                        id, serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name, profile,
-                        partition, source_id, conflicting_serialized_data,
-                        CAST ('{transfer_session_id}' AS {transfer_session_id_type}), _self_ref_fk
-                    FROM {store} WHERE {condition}
-                """.format(
-                    transfer_session_id=transfersession.id,
-                    transfer_session_id_type=TransferSession._meta.pk.rel_db_type(
-                        connection
-                    ),
-                    condition=where_condition,
-                    store=Store._meta.db_table,
-                )
-            )
 
-        # take all record max counters that are foreign keyed onto store models, which were queued into the buffer
-        select_rmc_buffer_query = """SELECT instance_id, counter, CAST ('{transfer_session_id}' AS {transfer_session_id_type}), store_model_id
-                FROM {record_max_counter} AS rmc
-                INNER JOIN {outgoing_buffer} AS buffer ON rmc.store_model_id = buffer.model_uuid
-                WHERE buffer.transfer_session_id = '{transfer_session_id}'
-            """.format(
-            transfer_session_id=transfersession.id,
-            transfer_session_id_type=TransferSession._meta.pk.rel_db_type(connection),
-            record_max_counter=RecordMaxCounter._meta.db_table,
-            outgoing_buffer=Buffer._meta.db_table,
-        )
-
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """INSERT INTO {outgoing_buffer}
-                   (model_uuid, serialized, deleted, last_saved_instance, last_saved_counter,
-                   hard_deleted, model_name, profile, partition, source_id, conflicting_serialized_data,
-                   transfer_session_id, _self_ref_fk)
-                   {select}
-                """.format(
-                    outgoing_buffer=Buffer._meta.db_table,
-                    select=" UNION ".join(select_buffers),
-                )
-            )
-            cursor.execute(
-                """INSERT INTO {outgoing_rmcb}
-                   (instance_id, counter, transfer_session_id, model_uuid)
-                   {select}
-                """.format(
-                    outgoing_rmcb=RecordMaxCounterBuffer._meta.db_table,
-                    select=select_rmc_buffer_query,
-                )
-            )
+def _dequeue_into_store(transfer_session, fsic, v2_format=False, batch_size=None):
+    """
+    Takes data from the buffers and merges into the store and record max counters, and then
+    updates the database max counters with the `fsic`.
 
+    When `batch_size` is provided, the buffer is dequeued in batches of at most that many records,
+    ordered by `model_uuid`, and each batch is committed in its own transaction, so the partition
+    locks aren't held for the entire buffer. Since dequeued records are removed from the buffer, a
+    dequeue that failed part of the way through resumes with the remaining records when called
+    again, and the database max counters are only updated once every batch has been dequeued.
 
-def _dequeue_into_store(transfer_session, fsic, v2_format=False):
+    :param batch_size: The number of buffered records to dequeue per transaction, or None to
+        dequeue them all in one transaction
     """
-    Takes data from the buffers and merges into the store and record max counters.
+    sync_filter = Filter(transfer_session.filter)
 
-    ALGORITHM: Incrementally insert and delete on a case by case basis to ensure subsequent cases
-    are not affected by previous cases.
-    """
+    if batch_size:
+        model_uuids = (
+            Buffer.objects.filter(transfer_session=transfer_session)
+            .order_by("model_uuid")
+            .values_list("model_uuid", flat=True)
+        )
+        batch = list(model_uuids[:batch_size])
+        while batch:
+            with _begin_transaction(sync_filter):
+                _dequeue_batch_into_store(
+                    transfer_session, model_uuid_range=(batch[0], batch[-1])
+                )
+            batch = list(model_uuids[:batch_size])
 
-    with _begin_transaction(Filter(transfer_session.filter)):
-        with connection.cursor() as cursor:
-            DBBackend._dequeuing_delete_rmcb_records(cursor, transfer_session.id)
-            DBBackend._dequeuing_delete_buffered_records(cursor, transfer_session.id)
-            current_id = InstanceIDModel.get_current_instance_and_increment_counter()
-            DBBackend._dequeuing_merge_conflict_buffer(
-                cursor, current_id, transfer_session.id
+        with _begin_transaction(sync_filter):
+            DatabaseMaxCounter.update_fsics(
+                json.loads(fsic),
+                transfer_session.get_filter(),
+                v2_format=v2_format,
             )
-            DBBackend._dequeuing_merge_conflict_rmcb(cursor, transfer_session.id)
-            DBBackend._dequeuing_update_rmcs_last_saved_by(
-                cursor, current_id, transfer_session.id
-            )
-            DBBackend._dequeuing_delete_mc_rmcb(cursor, transfer_session.id)
-            DBBackend._dequeuing_delete_mc_buffer(cursor, transfer_session.id)
-            DBBackend._dequeuing_insert_remaining_buffer(cursor, transfer_session.id)
-            DBBackend._dequeuing_insert_remaining_rmcb(cursor, transfer_session.id)
-            DBBackend._dequeuing_delete_remaining_rmcb(cursor, transfer_session.id)
-            DBBackend._dequeuing_delete_remaining_buffer(cursor, transfer_session.id)
+        return
 
+    with _begin_transaction(sync_filter):
+        _dequeue_batch_into_store(transfer_session)
         DatabaseMaxCounter.update_fsics(
             json.loads(fsic),
             transfer_session.get_filter(),
@@ -1073,6 +1520,20 @@ class SerializeOperation(LocalOperation):
         return transfer_statuses.COMPLETED
 
 
+def _queue_into_buffer(context, batch_size=None):
+    """
+    Queues data into the buffer for the context's transfer session, using the FSIC format the
+    context supports
+
+    :type context: LocalSessionContext
+    :param batch_size: If provided, only the next batch of at most this many records is queued
+    :return: The number of records queued
+    """
+    if FSIC_V2_FORMAT in context.capabilities:
+        return _queue_into_buffer_v2(context.transfer_session, batch_size=batch_size)
+    return _queue_into_buffer_v1(context.transfer_session, batch_size=batch_size)
+
+
 class ProducerQueueOperation(LocalOperation):
     """
     Performs queuing of data for as local instance
@@ -1086,10 +1547,13 @@ class ProducerQueueOperation(LocalOperation):
         self._assert(context.sync_session is not None)
         self._assert(context.transfer_session is not None)
 
-        if FSIC_V2_FORMAT in context.capabilities:
-            _queue_into_buffer_v2(context.transfer_session)
-        else:
-            _queue_into_buffer_v1(context.transfer_session)
+        batch_size = None
+        if context.is_pull and INCREMENTAL_QUEUING in context.capabilities:
+            # only the first batch is queued here, so the transfer can start sooner, and the rest
+            # are queued as the records are pulled, by `PullProducerOperation`
+            batch_size = SETTINGS.MORANGO_QUEUE_BATCH_SIZE
+
+        _queue_into_buffer(context, batch_size=batch_size)
 
         # update the records_total for client and server transfer session
         records_total = Buffer.objects.filter(
@@ -1129,11 +1593,23 @@ class PullProducerOperation(LocalOperation):
         self._assert(context.is_producer)
         self._assert(context.request is not None)
 
+        transfer_session = context.transfer_session
         records_transferred = context.request.data.get(
-            "records_transferred", context.transfer_session.records_transferred
+            "records_transferred", transfer_session.records_transferred
         )
 
-        if records_transferred == context.transfer_session.records_total:
+        if INCREMENTAL_QUEUING in context.capabilities:
+            batch_size = SETTINGS.MORANGO_QUEUE_BATCH_SIZE
+            # keep at least half a batch queued ahead of the records pulled so far, which grows
+            # the records_total until everything has been queued
+            if transfer_session.records_total - records_transferred < batch_size // 2:
+                queued = _queue_into_buffer(context, batch_size=batch_size)
+                if queued:
+                    transfer_session.records_total += queued
+                    transfer_session.save(update_fields=["records_total"])
+                    return transfer_statuses.PENDING
+
+        if records_transferred == transfer_session.records_total:
             return transfer_statuses.COMPLETED
         return transfer_statuses.PENDING
 
@@ -1190,10 +1666,11 @@ class PushReceiverOperation(LocalOperation):
                 data = [context.request.data]
 
             validate_and_create_buffer_data(data, context.transfer_session)
+            _dequeue_received_chunk(context.transfer_session)
 
         if (
             context.transfer_session.records_transferred
-            == context.transfer_session.records_total
+            >= context.transfer_session.records_total
         ):
             return transfer_statuses.COMPLETED
         return transfer_statuses.PENDING
@@ -1238,6 +1715,7 @@ class ReceiverDequeueOperation(LocalOperation):
                 context.transfer_session,
                 fsic,
                 v2_format=FSIC_V2_FORMAT in context.capabilities,
+                batch_size=SETTINGS.MORANGO_DEQUEUE_BATCH_SIZE,
             )
 
         return transfer_statuses.COMPLETED
@@ -1276,7 +1754,14 @@ class ReceiverDeserializeOperation(LocalOperation):
             try:
                 # we first serialize to avoid deserialization merge conflicts
                 _serialize_into_store(context.sync_session.profile, filter=context.filter)
-                _deserialize_from_store(context.sync_session.profile, filter=context.filter)
+                transfer_session_id = None
+                if SETTINGS.MORANGO_DESERIALIZE_SCOPED_TO_TRANSFER_SESSION:
+                    transfer_session_id = context.transfer_session.id
+                _deserialize_from_store(
+                    context.sync_session.profile,
+                    filter=context.filter,
+                    transfer_session_id=transfer_session_id,
+                )
             except OperationalError as e:
                 # if we run into a transaction isolation error, we return a pending status to force
                 # retrying through the controller flow
@@ -1302,7 +1787,7 @@ class CleanupOperation(LocalOperation):
             context.transfer_session.delete_buffers()
 
         context.transfer_session.active = False
-        context.transfer_session.save()
+        context.transfer_session.save(update_fields=["active"])
         return transfer_statuses.COMPLETED
 
 
@@ -1362,6 +1847,31 @@ class NetworkOperation(BaseOperation):
         """
         return context.connection._push_record_chunk(buffers)
 
+    def put_buffers_concurrently(self, context, chunks):
+        """
+        Pushes chunks of buffers to the remote server, with all of them in flight at once
+
+        :type context: NetworkSessionContext
+        :param chunks: A list of lists of serialized Buffers
+        :return: A list of the error raised pushing each chunk, or None if it succeeded
+        """
+        if len(chunks) == 1:
+            self.put_buffers(context, chunks[0])
+            return [None]
+
+        def _put_buffers(buffers):
+            try:
+                self.put_buffers(context, buffers)
+            except Exception as e:
+                return e
+
+        pool = ThreadPool(len(chunks))
+        try:
+            return pool.map(_put_buffers, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
     def get_buffers(self, context):
         """
         Pulls a single chunk of buffers from the remote server and does some validation
@@ -1369,9 +1879,17 @@ class NetworkOperation(BaseOperation):
         :type context: NetworkSessionContext
         :return: A list of dicts, serialized Buffers
         """
-        response = context.connection._pull_record_chunk(context.transfer_session)
+        offset = context.transfer_session.records_transferred
+        prefetched_chunk, context.prefetched_chunk = context.prefetched_chunk, None
+        if prefetched_chunk is not None and prefetched_chunk[0] == offset:
+            response = prefetched_chunk[1].result()
+        else:
+            response = context.connection._pull_record_chunk(
+                context.transfer_session,
+                last_model_uuid=context.last_pulled_model_uuid,
+            )
 
-        data = response.json()
+        data = decode_response_json(response)
 
         # parse out the results from a paginated set, if needed
         if isinstance(data, dict) and "results" in data:
@@ -1397,6 +1915,28 @@ class NetworkOperation(BaseOperation):
             )
         return data
 
+    def prefetch_buffers(self, context, data):
+        """
+        Starts pulling the chunk of buffers following `data` in the background, which the next
+        call to `get_buffers` returns, if there are more records to pull
+
+        :type context: NetworkSessionContext
+        :param data: A list of dicts, the serialized Buffers from `get_buffers`
+        """
+        offset = context.transfer_session.records_transferred + len(data)
+        if not data or offset >= context.transfer_session.records_total:
+            return
+
+        context.prefetched_chunk = (
+            offset,
+            BackgroundCall(
+                context.connection._pull_record_chunk,
+                context.transfer_session,
+                last_model_uuid=data[-1]["model_uuid"],
+                offset=offset,
+            ),
+        )
+
     def remote_proceed_to(self, context, stage, **kwargs):
         """
         Uses server API's to push updates to a remote `TransferSession`, which triggers the
@@ -1599,24 +2139,41 @@ class NetworkPushTransferOperation(NetworkOperation):
         offset = context.transfer_session.records_transferred
         chunk_size = context.connection.chunk_size
 
-        buffered_records = Buffer.objects.filter(
-            transfer_session=context.transfer_session
-        ).order_by("pk")
-
-        data = BufferSerializer(
-            buffered_records[offset : offset + chunk_size], many=True
-        ).data
+        window_size = 1
+        if CONCURRENT_BUFFER_POST in context.capabilities:
+            window_size = max(SETTINGS.MORANGO_PUSH_WINDOW_SIZE, 1)
+        # the chunk that completes the transfer is pushed alone, once the others have been received,
+        # so that the remote's transfer status can't be left pending by another chunk
+        remaining = context.transfer_session.records_total - offset
+        chunk_count = max(min(window_size, (remaining - 1) // chunk_size), 1)
+
+        buffered_records = list(
+            Buffer.objects.filter(transfer_session=context.transfer_session).order_by(
+                "pk"
+            )[offset : offset + chunk_count * chunk_size]
+        )
+        chunks = [
+            BufferSerializer(buffered_records[i : i + chunk_size], many=True).data
+            for i in range(0, len(buffered_records), chunk_size)
+        ] or [[]]
 
-        # push buffers chunk to server
-        self.put_buffers(context, data)
+        # push buffers chunks to server, concurrently when there's more than one
+        errors = self.put_buffers_concurrently(context, chunks)
+        acknowledged = len(list(itertools.takewhile(lambda e: e is None, errors)))
 
+        # only the chunks before any that failed count as transferred, so a resumed transfer
+        # pushes the rest again, which the server skips if it had already received them
         context.transfer_session.records_transferred = min(
-            offset + chunk_size, context.transfer_session.records_total
+            offset + acknowledged * chunk_size, context.transfer_session.records_total
         )
         context.transfer_session.bytes_sent = context.connection.bytes_sent
         context.transfer_session.bytes_received = context.connection.bytes_received
         context.transfer_session.save()
 
+        for error in errors:
+            if error is not None:
+                raise error
+
         # if we've transferred all records, return a completed status
         op_status = transfer_statuses.PENDING
         if (
@@ -1637,22 +2194,42 @@ class NetworkPullTransferOperation(NetworkOperation):
         self._assert(context.is_pull)
 
         transfer_session = context.transfer_session
+        data = []
 
         if transfer_session.records_total > 0:
             # grab buffers, just one chunk
             data = self.get_buffers(context)
 
+            # pull the next chunk while this one is stored
+            if SETTINGS.MORANGO_PULL_PREFETCH:
+                self.prefetch_buffers(context, data)
+
             validate_and_create_buffer_data(
                 data, transfer_session, connection=context.connection
             )
+            _dequeue_received_chunk(transfer_session)
+            if data:
+                context.last_pulled_model_uuid = data[-1]["model_uuid"]
 
         # if we've transferred all records, return a completed status
         op_status = transfer_statuses.PENDING
         if transfer_session.records_transferred >= transfer_session.records_total:
             op_status = transfer_statuses.COMPLETED
 
+        # the remote is only updated every few chunks, unless the transfer is complete, or there
+        # weren't any records to pull, since the remote may be waiting on the update to queue more
+        context.chunks_since_update += 1
+        if (
+            op_status == transfer_statuses.PENDING
+            and data
+            and not self._is_update_due(context)
+        ):
+            return op_status
+        context.chunks_since_update = 0
+        context.last_update_time = time.time()
+
         # update the records transferred so client and server are in agreement
-        self.update_transfer_session(
+        data = self.update_transfer_session(
             context,
             transfer_stage=transfer_stages.TRANSFERRING,
             records_transferred=transfer_session.records_transferred,
@@ -1661,8 +2238,32 @@ class NetworkPullTransferOperation(NetworkOperation):
             bytes_sent=transfer_session.bytes_received,
         )
 
+        if INCREMENTAL_QUEUING in context.capabilities:
+            # the remote queues records as they're pulled, so its records_total is a high-water
+            # mark, and only once it has completed the transfer has everything been queued
+            transfer_session.records_total = data.get(
+                "records_total", transfer_session.records_total
+            )
+            transfer_session.save(update_fields=["records_total"])
+            if data.get("transfer_stage_status") != transfer_statuses.COMPLETED:
+                op_status = transfer_statuses.PENDING
+
         return op_status
 
+    def _is_update_due(self, context):
+        """
+        :type context: NetworkSessionContext
+        :return: Whether enough chunks have been pulled, or enough time has passed, since the last
+            update of the remote transfer session, per the `MORANGO_PULL_UPDATE_*` settings
+        """
+        if context.chunks_since_update >= SETTINGS.MORANGO_PULL_UPDATE_CHUNKS:
+            return True
+        update_seconds = SETTINGS.MORANGO_PULL_UPDATE_SECONDS
+        return (
+            update_seconds is not None
+            and time.time() - context.last_update_time >= update_seconds
+        )
+
 
 class LegacyNetworkDequeueOperation(NetworkLegacyNoOpMixin, NetworkOperation):
     """
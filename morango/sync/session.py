@@ -21,6 +21,18 @@ def _headers_content_length(headers):
     return 0
 
 
+def _raw_content_length(response):
+    """
+    :param response: A response without a length header
+    :return: The length of the content as received, before any decoding of its content encoding
+    """
+    content = response.content
+    raw_length = getattr(response.raw, "tell", lambda: None)()
+    if isinstance(raw_length, int) and raw_length > 0:
+        return raw_length
+    return super_len(content)
+
+
 def _length_of_headers(headers):
     return super_len(
         "\n".join(["{}: {}".format(key, value) for key, value in headers.items()])
@@ -44,7 +56,7 @@ class SessionWrapper(Session):
             # a chunked response though
             content_length = _headers_content_length(response.headers)
             if not content_length:
-                content_length = super_len(response.content)
+                content_length = _raw_content_length(response)
 
             self.bytes_received += len(
                 "HTTP/1.1 {} {}".format(response.status_code, response.reason)
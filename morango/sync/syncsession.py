@@ -6,7 +6,6 @@ import logging
 import os
 import socket
 import uuid
-from io import BytesIO
 
 from django.utils import timezone
 from django.utils.six import iteritems
@@ -20,11 +19,13 @@ from requests.packages.urllib3.util.retry import Retry
 from .session import SessionWrapper
 from morango.api.serializers import CertificateSerializer
 from morango.api.serializers import InstanceIDSerializer
+from morango.codecs import get_json_codec
+from morango.compression import negotiate_compression
 from morango.constants import api_urls
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.constants.capabilities import ALLOW_CERTIFICATE_PUSHING
-from morango.constants.capabilities import GZIP_BUFFER_POST
+from morango.constants.capabilities import BUFFER_KEYSET_PAGINATION
 from morango.errors import CertificateSignatureInvalid
 from morango.errors import MorangoError
 from morango.errors import MorangoResumeSyncError
@@ -42,10 +43,6 @@ from morango.sync.utils import SyncSignalGroup
 from morango.utils import CAPABILITIES
 from morango.utils import pid_exists
 
-if GZIP_BUFFER_POST in CAPABILITIES:
-    from gzip import GzipFile
-
-
 logger = logging.getLogger(__name__)
 
 
@@ -73,16 +70,6 @@ def _get_client_ip_for_server(server_host, server_port):
     return IP
 
 
-# borrowed from https://github.com/django/django/blob/1.11.20/django/utils/text.py#L295
-def compress_string(s, compresslevel=9):
-    zbuf = BytesIO()
-    with GzipFile(
-        mode="wb", compresslevel=compresslevel, fileobj=zbuf, mtime=0
-    ) as zfile:
-        zfile.write(s)
-    return zbuf.getvalue()
-
-
 class Connection(object):
     """
     Abstraction around a connection with a syncing peer (network or disk),
@@ -112,7 +99,7 @@ class NetworkSyncConnection(Connection):
     def __init__(
         self,
         base_url="",
-        compresslevel=9,
+        compresslevel=None,
         retries=7,
         backoff_factor=0.3,
         chunk_size=default_chunk_size,
@@ -477,27 +464,46 @@ class NetworkSyncConnection(Connection):
         )
 
     def _push_record_chunk(self, data):
-        # gzip the data if both client and server have gzipping capabilities
-        if GZIP_BUFFER_POST in self.capabilities and GZIP_BUFFER_POST in CAPABILITIES:
-            json_data = json.dumps([dict(el) for el in data])
-            gzipped_data = compress_string(
-                bytes(json_data.encode("utf-8")), compresslevel=self.compresslevel
+        # compress the data with the preferred compression both client and server support
+        compression = negotiate_compression(self.capabilities)
+        if compression is not None:
+            json_data = get_json_codec().dumps([dict(el) for el in data])
+            # the connection's `compresslevel` is a gzip level, so it's mapped to the compression's
+            compressed_data = compression.compress(
+                bytes(json_data.encode("utf-8")),
+                level=compression.from_gzip_level(self.compresslevel),
             )
             return self.session.post(
                 self.urlresolve(api_urls.BUFFER),
-                data=gzipped_data,
-                headers={"content-type": "application/gzip"},
+                data=compressed_data,
+                headers={"content-type": compression.media_type},
             )
         else:
             return self.session.post(self.urlresolve(api_urls.BUFFER), json=data)
 
-    def _pull_record_chunk(self, transfer_session):
-        # pull records from server for given transfer session
+    def _pull_record_chunk(self, transfer_session, last_model_uuid=None, offset=None):
+        """
+        Pulls the next chunk of records from the server for the transfer session
+
+        :param last_model_uuid: The model UUID of the last record pulled, if known, from which
+            the next chunk continues when both client and server support keyset pagination
+        :param offset: The offset of the chunk, defaulting to the records transferred so far
+        """
+        if offset is None:
+            offset = transfer_session.records_transferred
         params = {
             "limit": self.chunk_size,
-            "offset": transfer_session.records_transferred,
+            "offset": offset,
             "transfer_session_id": transfer_session.id,
         }
+        if (
+            BUFFER_KEYSET_PAGINATION in self.capabilities
+            and BUFFER_KEYSET_PAGINATION in CAPABILITIES
+        ):
+            # without the last record pulled, such as when resuming, the offset is used once
+            params.update(after=last_model_uuid or "")
+            if last_model_uuid:
+                params.update(offset=0)
         return self.session.get(self.urlresolve(api_urls.BUFFER), params=params)
 
 
@@ -1,13 +1,21 @@
 import copy
 import functools
 import logging
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.six.moves import queue
 from rest_framework.exceptions import ValidationError
 
+from morango.errors import MorangoError
 from morango.models.core import Buffer
 from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import SyncableModel
+from morango.models.core import TransferSession
 from morango.registry import syncable_models
 
 
@@ -76,12 +84,19 @@ def validate_and_create_buffer_data(  # noqa: C901
     data = copy.deepcopy(data)
     rmcb_list = []
     buffer_list = []
+    # resolve these once per call, rather than once per record
+    models_cache = {}
+    transfer_session_filter = transfer_session.get_filter()
     for record in data:
         # ensure the provided model_uuid matches the expected/computed id
-        try:
-            Model = syncable_models.get_model(record["profile"], record["model_name"])
-        except KeyError:
-            Model = SyncableModel
+        model_key = (record["profile"], record["model_name"])
+        Model = models_cache.get(model_key)
+        if Model is None:
+            try:
+                Model = syncable_models.get_model(*model_key)
+            except KeyError:
+                Model = SyncableModel
+            models_cache[model_key] = Model
 
         partition = record["partition"].replace(
             record["model_uuid"], Model.ID_PLACEHOLDER
@@ -100,7 +115,7 @@ def validate_and_create_buffer_data(  # noqa: C901
         record["profile"] = transfer_session.sync_session.profile
 
         # ensure the partition is within the transfer session's filter
-        if not transfer_session.get_filter().contains_partition(record["partition"]):
+        if not transfer_session_filter.contains_partition(record["partition"]):
             raise ValidationError(
                 "Partition {} is not contained within filter for TransferSession ({})".format(
                     record["partition"], transfer_session.filter
@@ -128,19 +143,162 @@ def validate_and_create_buffer_data(  # noqa: C901
         buffer_list += [Buffer(**record)]
 
     with transaction.atomic():
-        transfer_session.records_transferred += len(data)
+        # chunks can be received concurrently, so the transfer session is locked by updating it
+        # first, which on both PostgreSQL and SQLite makes any other chunk for it wait until this
+        # one is committed, before checking which records were already received
+        transfer_session.last_activity_timestamp = timezone.now()
+        TransferSession.objects.filter(pk=transfer_session.pk).update(
+            last_activity_timestamp=transfer_session.last_activity_timestamp
+        )
+
+        # skip any records that were already received, such as when a chunk is pushed again after
+        # a later chunk of concurrent pushes was received but an earlier one failed
+        received = _received_model_uuids(transfer_session, buffer_list)
+        if received:
+            buffer_list = [b for b in buffer_list if b.model_uuid not in received]
+            rmcb_list = [r for r in rmcb_list if r.model_uuid not in received]
+
+        # the count is incremented in the database, and never saved from the instance, which may
+        # be stale
+        TransferSession.objects.filter(pk=transfer_session.pk).update(
+            records_transferred=F("records_transferred") + len(buffer_list)
+        )
+        transfer_session.refresh_from_db(fields=["records_transferred"])
 
         if connection is not None:
             transfer_session.bytes_sent = connection.bytes_sent
-        if connection is not None:
             transfer_session.bytes_received = connection.bytes_received
-
-        transfer_session.save()
+            transfer_session.save(update_fields=["bytes_sent", "bytes_received"])
 
         Buffer.objects.bulk_create(buffer_list)
         RecordMaxCounterBuffer.objects.bulk_create(rmcb_list)
 
 
+def _received_model_uuids(transfer_session, buffer_list, batch_size=500):
+    """
+    :param transfer_session: The transfer session receiving the buffers
+    :param buffer_list: A list of `Buffer`s being received
+    :param batch_size: The max number of model UUIDs per query, within SQLite's limit on variables
+    :return: A set of the model UUIDs of the buffers which are already in the transfer session's buffer
+    """
+    received = set()
+    for i in range(0, len(buffer_list), batch_size):
+        received.update(
+            Buffer.objects.filter(
+                transfer_session_id=transfer_session.id,
+                model_uuid__in=[b.model_uuid for b in buffer_list[i : i + batch_size]],
+            ).values_list("model_uuid", flat=True)
+        )
+    return received
+
+
+def _run_node(func, completed, node):
+    """
+    Calls `func` with a node, and puts the node with the error raised, if any, on a queue
+
+    :param func: A callable accepting a node
+    :param completed: A queue of tuples of the completed nodes and their errors
+    :param node: The node
+    """
+    try:
+        func(node)
+        completed.put((node, None))
+    except Exception as e:
+        completed.put((node, e))
+
+
+def _start_ready_nodes(pool, run, remaining):
+    """
+    Starts the remaining nodes which don't depend on any other remaining nodes, and removes them
+
+    :param pool: The pool of worker threads
+    :param run: A callable accepting a node, to call in the pool
+    :param remaining: A dict mapping the remaining nodes to the set of nodes they still depend on
+    :return: The number of nodes started
+    """
+    ready = [node for node, deps in remaining.items() if not deps]
+    for node in ready:
+        del remaining[node]
+        pool.apply_async(run, (node,))
+    return len(ready)
+
+
+def run_in_dependency_order(dependencies, func, workers):
+    """
+    Calls `func` for every node of a dependency graph, concurrently using a pool of worker threads,
+    where a node is only started once all the nodes it depends on have completed. If any call
+    raises an error, no further nodes are started, and the error is raised once the running calls
+    have completed.
+
+    :param dependencies: A dict mapping each node to an iterable of the nodes it depends on
+    :param func: A callable accepting a node
+    :param workers: The number of worker threads
+    """
+    remaining = OrderedDict(
+        (node, set(deps).intersection(dependencies))
+        for node, deps in dependencies.items()
+    )
+    completed = queue.Queue()
+    run = functools.partial(_run_node, func, completed)
+
+    pool = ThreadPool(workers)
+    error = None
+    try:
+        running = _start_ready_nodes(pool, run, remaining)
+        while running:
+            node, node_error = completed.get()
+            running -= 1
+            if node_error is not None:
+                error = error or node_error
+            elif error is None:
+                # no further nodes are started once a call has failed
+                for deps in remaining.values():
+                    deps.discard(node)
+                running += _start_ready_nodes(pool, run, remaining)
+    finally:
+        pool.close()
+        pool.join()
+
+    if error is not None:
+        raise error
+    if remaining:
+        raise MorangoError(
+            "Unable to resolve the dependency order of {}".format(list(remaining))
+        )
+
+
+class BackgroundCall(object):
+    """
+    Calls a function in a background thread, so the caller can continue with other work until
+    it needs the result
+    """
+
+    __slots__ = ("_thread", "_result", "_error")
+
+    def __init__(self, func, *args, **kwargs):
+        self._result = None
+        self._error = None
+
+        def _run():
+            try:
+                self._result = func(*args, **kwargs)
+            except Exception as e:
+                self._error = e
+
+        self._thread = threading.Thread(target=_run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def result(self):
+        """
+        Waits for the call to complete, and returns its result or raises its error
+        """
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
 class SyncSignal(object):
     """
     Helper class for firing signals from the sync client
@@ -6,9 +6,15 @@ from django.conf import settings
 
 from morango.constants import settings as default_settings
 from morango.constants.capabilities import ALLOW_CERTIFICATE_PUSHING
+from morango.constants.capabilities import BUFFER_KEYSET_PAGINATION
+from morango.constants.capabilities import CONCURRENT_BUFFER_POST
 from morango.constants.capabilities import GZIP_BUFFER_POST
 from morango.constants.capabilities import ASYNC_OPERATIONS
 from morango.constants.capabilities import FSIC_V2_FORMAT
+from morango.constants.capabilities import GZIP_BUFFER_GET
+from morango.constants.capabilities import INCREMENTAL_QUEUING
+from morango.constants.capabilities import LZ4_BUFFER_COMPRESSION
+from morango.constants.capabilities import ZSTD_BUFFER_COMPRESSION
 
 
 def do_import(import_string):
@@ -40,16 +46,40 @@ class Settings(object):
 SETTINGS = Settings()
 
 
-def get_capabilities():
+def _get_compression_capabilities():
+    """
+    :return: A set of the capabilities of the compressions whose libraries can be imported
+    """
     capabilities = set()
 
     try:
         import gzip  # noqa
 
         capabilities.add(GZIP_BUFFER_POST)
+        capabilities.add(GZIP_BUFFER_GET)
     except ImportError:
         pass
 
+    try:
+        import zstandard  # noqa
+
+        capabilities.add(ZSTD_BUFFER_COMPRESSION)
+    except ImportError:
+        pass
+
+    try:
+        import lz4.frame  # noqa
+
+        capabilities.add(LZ4_BUFFER_COMPRESSION)
+    except ImportError:
+        pass
+
+    return capabilities
+
+
+def get_capabilities():
+    capabilities = _get_compression_capabilities()
+
     if SETTINGS.ALLOW_CERTIFICATE_PUSHING:
         capabilities.add(ALLOW_CERTIFICATE_PUSHING)
 
@@ -60,6 +90,16 @@ def get_capabilities():
     if not SETTINGS.MORANGO_DISALLOW_ASYNC_OPERATIONS:
         capabilities.add(ASYNC_OPERATIONS)
 
+    if SETTINGS.MORANGO_INCREMENTAL_QUEUING:
+        capabilities.add(INCREMENTAL_QUEUING)
+
+    capabilities.add(BUFFER_KEYSET_PAGINATION)
+
+    # chunks received concurrently are checked against the buffer for ones already received, which
+    # misses those already dequeued when dequeuing incrementally
+    if not SETTINGS.MORANGO_INCREMENTAL_DEQUEUE:
+        capabilities.add(CONCURRENT_BUFFER_POST)
+
     return capabilities
 
 
@@ -0,0 +1,158 @@
+"""
+Benchmarks the compressions available for buffer payloads, by compressing and decompressing pages of
+serialized buffers, as they're pushed and pulled, for the throughput and ratio of each compression
+and level. The buffers are queued from store records serialized from the test app's models.
+
+Run from the root of the repository, with `zstandard` and `lz4` installed to include them:
+
+    PYTHONPATH=.:tests/testapp python tests/testapp/benchmarks/compression.py --rows 5000
+"""
+from utils import benchmark_database
+from utils import setup
+from utils import timed
+from utils import uuid_hex
+
+PROFILE = "facilitydata"
+
+
+def populate(args):
+    """
+    Creates users, and logs for them, serializes them into the store, and queues the store records
+    into the buffer of a transfer session
+
+    :return: The transfer session
+    """
+    from django.utils import timezone
+    from facility_profile.models import InteractionLog
+    from facility_profile.models import MyUser
+    from facility_profile.models import SummaryLog
+
+    from morango.models.core import Buffer
+    from morango.models.core import RecordMaxCounter
+    from morango.models.core import RecordMaxCounterBuffer
+    from morango.models.core import Store
+    from morango.models.core import SyncSession
+    from morango.models.core import TransferSession
+    from morango.sync.controller import MorangoProfileController
+
+    users = [
+        MyUser.objects.create(username="user{}".format(i))
+        for i in range(max(args.rows // 20, 1))
+    ]
+    for i in range(args.rows):
+        user = users[i % len(users)]
+        log_model = SummaryLog if i % 2 else InteractionLog
+        log_model.objects.create(user=user)
+    MorangoProfileController(PROFILE).serialize_into_store()
+
+    sync_session = SyncSession.objects.create(
+        id=uuid_hex(), profile=PROFILE, last_activity_timestamp=timezone.now()
+    )
+    transfer_session = TransferSession.objects.create(
+        id=uuid_hex(),
+        sync_session=sync_session,
+        push=True,
+        filter="",
+        last_activity_timestamp=timezone.now(),
+    )
+    # the fields the buffer shares with the store
+    store_fields = set(f.attname for f in Store._meta.concrete_fields)
+    fields = [
+        f.attname
+        for f in Buffer._meta.concrete_fields
+        if f.attname in store_fields and not f.primary_key
+    ]
+    Buffer.objects.bulk_create(
+        Buffer(
+            model_uuid=record["id"],
+            transfer_session=transfer_session,
+            **{field: record[field] for field in fields}
+        )
+        for record in Store.objects.values("id", *fields)
+    )
+    RecordMaxCounterBuffer.objects.bulk_create(
+        RecordMaxCounterBuffer(
+            model_uuid=rmc.store_model_id,
+            transfer_session=transfer_session,
+            instance_id=rmc.instance_id,
+            counter=rmc.counter,
+        )
+        for rmc in RecordMaxCounter.objects.all()
+    )
+    return transfer_session
+
+
+def pages(args, transfer_session):
+    """
+    :return: A list of the pages of buffers, encoded as they're pushed
+    """
+    from morango.api.serializers import BufferSerializer
+    from morango.codecs import get_json_codec
+    from morango.models.core import Buffer
+
+    buffers = list(
+        Buffer.objects.filter(transfer_session=transfer_session).order_by("pk")
+    )
+    json_codec = get_json_codec()
+    return [
+        json_codec.dumps(
+            [
+                dict(record)
+                for record in BufferSerializer(
+                    buffers[i : i + args.chunk_size], many=True
+                ).data
+            ]
+        ).encode("utf-8")
+        for i in range(0, len(buffers), args.chunk_size)
+    ]
+
+
+def main():
+    args = setup(__doc__, rows=5000, chunk_size=500, repeat=3)
+
+    from morango.compression import COMPRESSIONS
+    from morango.utils import CAPABILITIES
+
+    with benchmark_database():
+        payloads = pages(args, populate(args))
+
+    size = sum(len(payload) for payload in payloads)
+    megabytes = size / 1024.0 / 1024.0
+    print(
+        "Compressing {} pages of {} buffers, {:.2f} MB in total...".format(
+            len(payloads), args.chunk_size, megabytes
+        )
+    )
+    print(
+        "{:<8} {:>6} {:>8} {:>16} {:>16}".format(
+            "", "level", "ratio", "compress MB/s", "decompress MB/s"
+        )
+    )
+    for compression in COMPRESSIONS.values():
+        if compression.push_capability not in CAPABILITIES:
+            print("{:<8} not installed".format(compression.name))
+            continue
+        levels = sorted({1, compression.default_level, 9})
+        for level in levels:
+            compressed = [compression.compress(p, level=level) for p in payloads]
+            compress_time = timed(
+                lambda: [compression.compress(p, level=level) for p in payloads],
+                repeat=args.repeat,
+            )
+            decompress_time = timed(
+                lambda: [compression.decompress(c) for c in compressed],
+                repeat=args.repeat,
+            )
+            print(
+                "{:<8} {:>6} {:>8.2f} {:>16.1f} {:>16.1f}".format(
+                    compression.name,
+                    level,
+                    size / float(sum(len(c) for c in compressed)),
+                    megabytes / compress_time,
+                    megabytes / decompress_time,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmarks dequeuing a buffer into the store, by timing the merged dequeue for PostgreSQL against
+the `_dequeuing_*` statements, with a buffer of generated records where a quarter each are new,
+fast-forwards, reverse fast-forwards and merge conflicts.
+
+Run from the root of the repository, against PostgreSQL:
+
+    PYTHONPATH=.:tests/testapp DJANGO_SETTINGS_MODULE=testapp.postgres_settings \\
+        python tests/testapp/benchmarks/dequeue.py --rows 100000
+"""
+import itertools
+import time
+
+from utils import analyze
+from utils import benchmark_database
+from utils import setup
+from utils import uuid_hex
+
+PROFILE = "facilitydata"
+
+
+def _bulk_create(model, records):
+    while True:
+        batch = list(itertools.islice(records, 10000))
+        if not batch:
+            break
+        model.objects.bulk_create(batch)
+
+
+def populate(args, transfer_session, facility):
+    from morango.models.core import Buffer
+    from morango.models.core import RecordMaxCounter
+    from morango.models.core import RecordMaxCounterBuffer
+    from morango.models.core import Store
+
+    local, remote = uuid_hex(), uuid_hex()
+    partition = "{}:user-rw:{}".format(facility, uuid_hex())
+    # for each kind of record: the store's last saved counter and record max counters, or None
+    # when new, and the buffer's last saved instance and counter, and record max counters
+    kinds = (
+        # new
+        (None, None, (remote, 1), {remote: 1}),
+        # fast-forward
+        (1, {local: 1}, (remote, 1), {local: 1, remote: 1}),
+        # reverse fast-forward
+        (2, {local: 2, remote: 1}, (remote, 1), {remote: 1}),
+        # merge conflict
+        (2, {local: 2}, (remote, 1), {local: 1, remote: 1}),
+    )
+    records = [
+        (uuid_hex(), kind) for kind in kinds for _ in range(args.rows // len(kinds))
+    ]
+
+    _bulk_create(
+        Store,
+        (
+            Store(
+                id=model_uuid,
+                profile=PROFILE,
+                serialized="{}",
+                last_saved_instance=local,
+                last_saved_counter=counter,
+                partition=partition,
+                source_id=uuid_hex(),
+                model_name="facilityuser",
+            )
+            for model_uuid, (counter, _, _, _) in records
+            if counter is not None
+        ),
+    )
+    _bulk_create(
+        RecordMaxCounter,
+        (
+            RecordMaxCounter(store_model_id=model_uuid, instance_id=instance, counter=c)
+            for model_uuid, (_, counters, _, _) in records
+            for instance, c in (counters or {}).items()
+        ),
+    )
+    _bulk_create(
+        Buffer,
+        (
+            Buffer(
+                model_uuid=model_uuid,
+                transfer_session=transfer_session,
+                profile=PROFILE,
+                serialized="{}",
+                last_saved_instance=instance,
+                last_saved_counter=counter,
+                partition=partition,
+                source_id=uuid_hex(),
+                model_name="facilityuser",
+            )
+            for model_uuid, (_, _, (instance, counter), _) in records
+        ),
+    )
+    _bulk_create(
+        RecordMaxCounterBuffer,
+        (
+            RecordMaxCounterBuffer(
+                model_uuid=model_uuid,
+                transfer_session=transfer_session,
+                instance_id=instance,
+                counter=c,
+            )
+            for model_uuid, (_, _, _, counters) in records
+            for instance, c in counters.items()
+        ),
+    )
+
+
+def dequeue(args, connection, merged):
+    from django.db import transaction
+    from django.test import override_settings
+    from django.utils import timezone
+
+    from morango.models.core import SyncSession
+    from morango.models.core import TransferSession
+    from morango.sync.operations import _dequeue_into_store
+
+    timings = []
+    for _ in range(args.repeat):
+        # every dequeue starts from the same buffer and store, by rolling back afterwards
+        with transaction.atomic():
+            facility = uuid_hex()
+            sync_session = SyncSession.objects.create(
+                id=uuid_hex(), profile=PROFILE, last_activity_timestamp=timezone.now()
+            )
+            transfer_session = TransferSession.objects.create(
+                id=uuid_hex(),
+                sync_session=sync_session,
+                push=True,
+                filter=facility,
+                last_activity_timestamp=timezone.now(),
+            )
+            populate(args, transfer_session, facility)
+            analyze(connection)
+
+            with override_settings(MORANGO_POSTGRES_MERGED_DEQUEUE=merged):
+                start = time.time()
+                _dequeue_into_store(transfer_session, "{}")
+                timings.append(time.time() - start)
+            transaction.set_rollback(True)
+    return min(timings)
+
+
+def main():
+    args = setup(__doc__, rows=100000, repeat=3)
+
+    with benchmark_database() as connection:
+        if connection.vendor != "postgresql":
+            raise SystemExit("The merged dequeue is only implemented for PostgreSQL")
+
+        print("Dequeuing a buffer of {} records...".format(args.rows))
+        print("{:<12} {:>12}".format("dequeue", "time (s)"))
+        for label, merged in (("statements", False), ("merged", True)):
+            print("{:<12} {:>12.3f}".format(label, dequeue(args, connection, merged)))
+
+
+if __name__ == "__main__":
+    main()
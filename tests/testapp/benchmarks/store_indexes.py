@@ -0,0 +1,152 @@
+"""
+Benchmarks the store indexes for queuing and FSIC reduction, by timing both against a store of
+generated records, before and after applying the migration adding the indexes.
+
+Run from the root of the repository:
+
+    PYTHONPATH=.:tests/testapp python tests/testapp/benchmarks/store_indexes.py --rows 1000000
+"""
+import itertools
+import json
+import random
+
+from utils import analyze
+from utils import benchmark_database
+from utils import setup
+from utils import timed
+from utils import uuid_hex
+
+PROFILE = "facilitydata"
+
+
+def populate(args):
+    from morango.models.core import DatabaseMaxCounter
+    from morango.models.core import Store
+
+    facilities = [uuid_hex() for _ in range(args.facilities)]
+    instances = [uuid_hex() for _ in range(args.instances)]
+    partitions = [
+        "{}:user-rw:{}".format(facility, uuid_hex())
+        for facility in facilities
+        for _ in range(args.rows // args.facilities // args.records_per_user or 1)
+    ]
+
+    def _store_records():
+        for i in range(args.rows):
+            yield Store(
+                id=uuid_hex(),
+                profile=PROFILE,
+                serialized="{}",
+                last_saved_instance=random.choice(instances),
+                last_saved_counter=random.randint(1, args.max_counter),
+                partition=random.choice(partitions),
+                source_id=uuid_hex(),
+                model_name="facilityuser",
+            )
+
+    records = _store_records()
+    while True:
+        batch = list(itertools.islice(records, 10000))
+        if not batch:
+            break
+        Store.objects.bulk_create(batch)
+
+    DatabaseMaxCounter.objects.bulk_create(
+        DatabaseMaxCounter(
+            instance_id=instance, partition=facility, counter=args.max_counter
+        )
+        for facility in facilities
+        for instance in instances
+    )
+    return facilities, instances
+
+
+def queue(args, facility, instances):
+    from django.utils import timezone
+
+    from morango.models.core import Buffer
+    from morango.models.core import RecordMaxCounterBuffer
+    from morango.models.core import SyncSession
+    from morango.models.core import TransferSession
+    from morango.sync.operations import _queue_into_buffer_v2
+
+    sync_session = SyncSession.objects.create(
+        id=uuid_hex(), profile=PROFILE, last_activity_timestamp=timezone.now()
+    )
+    # the receiving end is missing the last tenth of every instance's records
+    behind = args.max_counter - args.max_counter // 10
+    transfer_session = TransferSession.objects.create(
+        id=uuid_hex(),
+        sync_session=sync_session,
+        push=False,
+        filter=facility,
+        last_activity_timestamp=timezone.now(),
+        server_fsic=json.dumps(
+            {"super": {}, "sub": {facility: {i: args.max_counter for i in instances}}}
+        ),
+        client_fsic=json.dumps(
+            {"super": {}, "sub": {facility: {i: behind for i in instances}}}
+        ),
+    )
+
+    def _queue():
+        _queue_into_buffer_v2(transfer_session)
+        RecordMaxCounterBuffer.objects.filter(
+            transfer_session_id=transfer_session.id
+        ).delete()
+        Buffer.objects.filter(transfer_session_id=transfer_session.id).delete()
+
+    return timed(_queue, repeat=args.repeat)
+
+
+def reduce_fsics(args, facilities):
+    from morango.models.core import DatabaseMaxCounter
+
+    return timed(
+        lambda: DatabaseMaxCounter.get_instance_counters_for_partitions(
+            facilities[:1], is_producer=True
+        ),
+        repeat=args.repeat,
+    )
+
+
+def main():
+    args = setup(
+        __doc__,
+        rows=100000,
+        facilities=10,
+        instances=500,
+        records_per_user=100,
+        max_counter=1000,
+        repeat=3,
+    )
+
+    from django.db.migrations.executor import MigrationExecutor
+
+    with benchmark_database() as connection:
+        print("Populating the store with {} records...".format(args.rows))
+        facilities, instances = populate(args)
+
+        results = []
+        for label, migration in (
+            ("before", "0023_add_instance_id_fields"),
+            ("after", "0024_store_queuing_indexes"),
+        ):
+            executor = MigrationExecutor(connection)
+            executor.migrate([("morango", migration)])
+            analyze(connection)
+            results.append(
+                (
+                    label,
+                    queue(args, facilities[0], instances),
+                    reduce_fsics(args, facilities),
+                )
+            )
+
+        print("{:<8} {:>12} {:>18}".format("indexes", "queuing (s)", "fsic reduction (s)"))
+        for label, queuing, reduction in results:
+            print("{:<8} {:>12.3f} {:>18.3f}".format(label, queuing, reduction))
+
+
+if __name__ == "__main__":
+    main()
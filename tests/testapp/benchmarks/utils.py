@@ -0,0 +1,71 @@
+"""
+Helpers shared by the benchmark scripts, which are run manually against a throwaway test database
+created with the configured settings, e.g. `testapp.settings` or `testapp.postgres_settings`
+"""
+import argparse
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+import django
+
+
+def setup(description, **arguments):
+    """
+    Parses the command line arguments and sets up Django
+
+    :param description: A str description of the benchmark, for the usage message
+    :param arguments: Keyword arguments of default values, for each argument of the benchmark
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(description=description)
+    for name, default in arguments.items():
+        parser.add_argument(
+            "--{}".format(name.replace("_", "-")), type=type(default), default=default
+        )
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testapp.settings")
+    django.setup()
+    return args
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Creates a test database for the duration of the benchmark, which is destroyed afterwards
+    """
+    from django.db import connection
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def analyze(connection):
+    """
+    Updates the query planner's statistics, so the timings reflect the indexes available
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def timed(func, repeat=3):
+    """
+    :param func: A callable to time
+    :param repeat: The number of times to call it
+    :return: The fastest time in seconds of calling `func`
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+    return min(timings)
+
+
+def uuid_hex():
+    return uuid.uuid4().hex
@@ -37,3 +37,15 @@ class SerializationTestCase(TestCase):
         Facility._fields_not_to_serialize = ("now_date",)
         self.bob_dict = self.bob.serialize()
         self.assertFalse('now_data' in self.bob_dict)
+
+    def test_serialized_fields_compiled_per_model(self):
+        serialized_fields = Facility.get_serialized_fields()
+        self.assertIs(serialized_fields, Facility.get_serialized_fields())
+        self.assertEqual(
+            sorted(attname for attname, _ in serialized_fields),
+            sorted(self.bob_dict.keys()),
+        )
+        for attname in Facility._internal_mptt_fields_not_to_serialize:
+            self.assertNotIn(attname, self.bob_dict)
+        for attname in Facility._morango_internal_fields_not_to_serialize:
+            self.assertNotIn(attname, self.bob_dict)
@@ -1,8 +1,12 @@
 from django.test import TestCase
+from facility_profile.models import Facility
+from facility_profile.models import InteractionLog
 from facility_profile.models import MyUser
+from facility_profile.models import SummaryLog
 
 from morango.models.manager import SyncableModelManager
 from morango.models.query import SyncableModelQuerySet
+from morango.registry import syncable_models
 
 
 class SyncingModelsTestCase(TestCase):
@@ -61,3 +65,13 @@ class SyncingModelsTestCase(TestCase):
         self.assertTrue(MyUser.objects.first()._morango_dirty_bit)
         user.save(update_dirty_bit_to=None)
         self.assertTrue(MyUser.objects.first()._morango_dirty_bit)
+
+    def test_model_dependencies(self):
+        dependencies = syncable_models.get_model_dependencies("facilitydata")
+        self.assertEqual(
+            list(dependencies), syncable_models.get_models("facilitydata")
+        )
+        self.assertEqual(dependencies[Facility], set())
+        self.assertEqual(dependencies[MyUser], set())
+        self.assertEqual(dependencies[SummaryLog], {MyUser})
+        self.assertEqual(dependencies[InteractionLog], {MyUser})
@@ -6,6 +6,7 @@ import mock
 import pytest
 from django.conf import settings
 from django.db import connections
+from django.test import override_settings
 from django.test.testcases import LiveServerTestCase
 from facility_profile.models import InteractionLog
 from facility_profile.models import MyUser
@@ -21,6 +22,7 @@ from morango.models.core import Buffer
 from morango.models.core import InstanceIDModel
 from morango.models.core import TransferSession
 from morango.sync.controller import MorangoProfileController
+from morango.sync.syncsession import NetworkSyncConnection
 
 
 SECOND_TEST_DATABASE = "default2"
@@ -231,6 +233,112 @@ class PushPullClientTestCase(LiveServerTestCase):
         self.assertEqual(5, SummaryLog.objects.filter(user=self.local_user).count())
         self.assertEqual(5, InteractionLog.objects.filter(user=self.local_user).count())
 
+    @override_settings(MORANGO_INCREMENTAL_DEQUEUE=True)
+    def test_push_and_pull_incremental_dequeue(self):
+        for _ in range(5):
+            SummaryLog.objects.create(user=self.local_user)
+        with second_environment():
+            for _ in range(5):
+                InteractionLog.objects.create(user=self.remote_user)
+
+        client = self.client.get_push_client()
+        client.initialize(self.filter)
+        transfer_session = client.context.transfer_session
+        client.run()
+        # the server dequeued each chunk as it was pushed
+        with second_environment():
+            self.assertEqual(
+                0, Buffer.objects.filter(transfer_session_id=transfer_session.id).count()
+            )
+        client.finalize()
+
+        client = self.client.get_pull_client()
+        client.initialize(self.filter)
+        transfer_session = client.context.transfer_session
+        self.assertNotEqual(0, transfer_session.records_total)
+        client.run()
+        self.assertNotEqual(0, transfer_session.records_transferred)
+        # each chunk was dequeued as it was pulled
+        self.assertEqual(
+            0, Buffer.objects.filter(transfer_session=transfer_session).count()
+        )
+        client.finalize()
+
+        self.assertEqual(5, InteractionLog.objects.filter(user=self.local_user).count())
+        with second_environment():
+            self.assertEqual(
+                5, SummaryLog.objects.filter(user=self.remote_user).count()
+            )
+
+    @override_settings(MORANGO_PUSH_WINDOW_SIZE=3)
+    def test_push_concurrently(self):
+        for _ in range(5):
+            SummaryLog.objects.create(user=self.local_user)
+            InteractionLog.objects.create(user=self.local_user)
+
+        client = self.client.get_push_client()
+        client.initialize(self.filter)
+        transfer_session = client.context.transfer_session
+        self.assertGreater(transfer_session.records_total, 3 * self.conn.chunk_size)
+        client.run()
+        self.assertEqual(
+            transfer_session.records_total, transfer_session.records_transferred
+        )
+        with second_environment():
+            self.assertEqual(
+                transfer_session.records_total,
+                Buffer.objects.filter(transfer_session_id=transfer_session.id).count(),
+            )
+        client.finalize()
+
+        with second_environment():
+            self.assertEqual(
+                5, SummaryLog.objects.filter(user=self.remote_user).count()
+            )
+            self.assertEqual(
+                5, InteractionLog.objects.filter(user=self.remote_user).count()
+            )
+
+    @override_settings(MORANGO_PULL_PREFETCH=True, MORANGO_PULL_UPDATE_CHUNKS=2)
+    def test_pull_prefetched(self):
+        with second_environment():
+            for _ in range(5):
+                SummaryLog.objects.create(user=self.remote_user)
+                InteractionLog.objects.create(user=self.remote_user)
+
+        client = self.client.get_pull_client()
+        client.initialize(self.filter)
+        transfer_session = client.context.transfer_session
+        chunks = -(-transfer_session.records_total // self.conn.chunk_size)
+        self.assertGreater(chunks, 2)
+
+        update_transfer_session = NetworkSyncConnection._update_transfer_session
+        with mock.patch.object(
+            NetworkSyncConnection,
+            "_update_transfer_session",
+            autospec=True,
+            side_effect=update_transfer_session,
+        ) as mock_update:
+            client.run()
+        self.assertEqual(
+            transfer_session.records_total, transfer_session.records_transferred
+        )
+        # the remote was updated every other chunk, and once the transfer completed
+        progress_updates = [
+            call
+            for call in mock_update.call_args_list
+            if "records_transferred" in call[0][1]
+        ]
+        self.assertEqual(chunks // 2 + chunks % 2, len(progress_updates))
+        self.assertEqual(
+            transfer_session.records_total,
+            progress_updates[-1][0][1]["records_transferred"],
+        )
+        client.finalize()
+
+        self.assertEqual(5, SummaryLog.objects.filter(user=self.local_user).count())
+        self.assertEqual(5, InteractionLog.objects.filter(user=self.local_user).count())
+
     def test_full_flow_and_repeat(self):
         with second_environment():
             for _ in range(5):
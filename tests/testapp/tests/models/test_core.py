@@ -1,7 +1,9 @@
 import factory
 import uuid
+from django.db import connection
 from django.test import TestCase
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.utils.six import iteritems
 from facility_profile.models import MyUser
@@ -153,6 +155,66 @@ class OldDatabaseMaxCounterUpdateCalculation(TestCase):
         self.assertFalse(DatabaseMaxCounter.objects.filter(counter=1).exists())
 
 
+class DatabaseMaxCounterUpdateCalculation(TestCase):
+    def setUp(self):
+        self.partition = "partition"
+        self.sub_partition = "partition:sub"
+        DatabaseMaxCounter.objects.create(
+            instance_id="a" * 32, counter=5, partition=self.partition
+        )
+
+    def _counters(self):
+        return {
+            (dmc.instance_id, dmc.partition): dmc.counter
+            for dmc in DatabaseMaxCounter.objects.all()
+        }
+
+    def test_update_fsics(self):
+        fsics = {
+            "super": {},
+            "sub": {
+                self.partition: {"a" * 32: 3, "b" * 32: 2},
+                self.sub_partition: {"a" * 32: 4, "c" * 32: 1},
+            },
+        }
+        DatabaseMaxCounter.update_fsics(fsics, Filter(self.partition), v2_format=True)
+        # counters covered by one as large, on the partition or a prefix of it, aren't updated
+        self.assertEqual(
+            {
+                ("a" * 32, self.partition): 5,
+                ("b" * 32, self.partition): 2,
+                ("c" * 32, self.sub_partition): 1,
+            },
+            self._counters(),
+        )
+
+    def test_update_fsics__raises_counters(self):
+        fsics = {
+            "super": {},
+            "sub": {self.partition: {"a" * 32: 7}, self.sub_partition: {"a" * 32: 8}},
+        }
+        DatabaseMaxCounter.update_fsics(fsics, Filter(self.partition), v2_format=True)
+        self.assertEqual(
+            {("a" * 32, self.partition): 7, ("a" * 32, self.sub_partition): 8},
+            self._counters(),
+        )
+
+    def test_update_fsics__queries(self):
+        def _count_queries(fsics):
+            with CaptureQueriesContext(connection) as queries:
+                DatabaseMaxCounter.update_fsics(
+                    {"super": {}, "sub": {self.partition: fsics}},
+                    Filter(self.partition),
+                    v2_format=True,
+                )
+            return len(queries)
+
+        self.assertEqual(
+            _count_queries({uuid.uuid4().hex: 1}),
+            _count_queries({uuid.uuid4().hex: i for i in range(100)}),
+        )
+
+
 class DatabaseMaxCounterTestCase(BaseDatabaseMaxCounterTestCase):
     def setUp(self):
         super(DatabaseMaxCounterTestCase, self).setUp()
@@ -324,6 +386,18 @@ class TransferSessionTestCase(TestCase):
             previous_sync_activity, self.sync_session.last_activity_timestamp
         )
 
+    def test_update_state__keeps_records_transferred(self):
+        # such as when chunks are received concurrently
+        TransferSession.objects.filter(pk=self.instance.pk).update(
+            records_transferred=5
+        )
+
+        self.instance.update_state(stage=transfer_stages.TRANSFERRING)
+
+        self.instance.refresh_from_db()
+        self.assertEqual(transfer_stages.TRANSFERRING, self.instance.transfer_stage)
+        self.assertEqual(5, self.instance.records_transferred)
+
 
 class TransferSessionAndStoreTestCase(TestCase):
     def setUp(self):
@@ -1,12 +1,20 @@
 import contextlib
 import json
 import uuid
+from collections import OrderedDict
 from test.support import EnvironmentVarGuard
 
 import factory
 import mock
+import pytest
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import signals
 from django.test import SimpleTestCase
+from django.test import override_settings
 from django.test import TestCase
+from django.test import TransactionTestCase
 from facility_profile.models import Facility
 from facility_profile.models import InteractionLog
 from facility_profile.models import MyUser
@@ -22,6 +30,7 @@ from morango.models.core import HardDeletedModels
 from morango.models.core import InstanceIDModel
 from morango.models.core import RecordMaxCounter
 from morango.models.core import Store
+from morango.sync import operations
 from morango.sync.controller import _self_referential_fk
 from morango.sync.controller import MorangoProfileController
 from morango.sync.controller import SessionController
@@ -92,6 +101,29 @@ class SerializeIntoStoreTestCase(TestCase):
         deserialized_model = json.loads(store_facility.serialized)
         self.assertEqual(deserialized_model["name"], self.new_name)
 
+    @override_settings(MORANGO_SERIALIZE_CHUNK_SIZE=3)
+    def test_store_models_get_updated_in_chunks(self):
+        facs = [FacilityModelFactory() for _ in range(self.range)]
+        self.mc.serialize_into_store()
+        self.assertEqual(Store.objects.count(), self.range)
+        Store.objects.update(
+            deleted=True, hard_deleted=True, last_transfer_session_id=uuid.uuid4().hex
+        )
+
+        # mix new records in with the existing ones
+        facs.extend(FacilityModelFactory() for _ in range(self.range))
+        Facility.objects.update(name=self.new_name)
+        self.mc.serialize_into_store()
+        self.assertEqual(Store.objects.count(), self.range * 2)
+        self.assertFalse(Facility.objects.filter(_morango_dirty_bit=True).exists())
+        for fac in facs:
+            store_facility = Store.objects.get(id=fac.id)
+            deserialized_model = json.loads(store_facility.serialized)
+            self.assertEqual(deserialized_model["name"], self.new_name)
+            self.assertFalse(store_facility.deleted)
+            self.assertFalse(store_facility.hard_deleted)
+            self.assertIsNone(store_facility.last_transfer_session_id)
+
     def test_last_saved_counter_updates(self):
         FacilityModelFactory(name=self.original_name)
         self.mc.serialize_into_store()
@@ -289,6 +321,74 @@ class SerializeIntoStoreTestCase(TestCase):
         self.mc.deserialize_from_store()
         self.assertTrue(HardDeletedModels.objects.filter(id=log.id).exists())
 
+    @mock.patch("morango.sync.operations.DESERIALIZE_CHUNK_SIZE", 2)
+    def test_store_deletions_propagate_in_bulk(self):
+        users = []
+        logs = []
+        for i in range(5):
+            user = MyUser(username="user{}".format(i))
+            user.save(update_dirty_bit_to=False)
+            log = SummaryLog(user=user)
+            log.save(update_dirty_bit_to=False)
+            users.append(user)
+            logs.append(log)
+            StoreModelFacilityFactory(
+                model_name="user",
+                id=user.id,
+                serialized=json.dumps(user.serialize()),
+                hard_deleted=i % 2 == 0,
+                deleted=True,
+            )
+
+        self.mc.deserialize_from_store()
+
+        self.assertFalse(MyUser.objects.exists())
+        self.assertFalse(SummaryLog.objects.exists())
+        self.assertFalse(Store.objects.filter(dirty_bit=True).exists())
+        for i, (user, log) in enumerate(zip(users, logs)):
+            self.assertTrue(DeletedModels.objects.filter(id=user.id).exists())
+            self.assertTrue(DeletedModels.objects.filter(id=log.id).exists())
+            self.assertEqual(
+                HardDeletedModels.objects.filter(id=user.id).exists(), i % 2 == 0
+            )
+            self.assertEqual(
+                HardDeletedModels.objects.filter(id=log.id).exists(), i % 2 == 0
+            )
+
+    @mock.patch("morango.sync.operations.DESERIALIZE_CHUNK_SIZE", 2)
+    def test_store_deletions_of_mptt_models_update_tree(self):
+        parent = FacilityModelFactory(name="parent")
+        children = [
+            FacilityModelFactory(name="child{}".format(i), parent=parent)
+            for i in range(4)
+        ]
+        Facility.objects.update(update_dirty_bit_to=False)
+        for i, child in enumerate(children[:3]):
+            StoreModelFacilityFactory(
+                id=child.id,
+                serialized=DjangoJSONEncoder().encode(child.serialize()),
+                hard_deleted=i == 0,
+                deleted=True,
+            )
+
+        self.mc.deserialize_from_store()
+
+        self.assertEqual(
+            [children[3].id],
+            list(Facility.objects.filter(parent=parent).values_list("id", flat=True)),
+        )
+        parent.refresh_from_db()
+        self.assertEqual(1, parent.get_descendant_count())
+        children[3].refresh_from_db()
+        self.assertEqual(parent.lft + 1, children[3].lft)
+        self.assertEqual(parent.rght - 1, children[3].rght)
+        self.assertFalse(Store.objects.filter(dirty_bit=True).exists())
+        for i, child in enumerate(children[:3]):
+            self.assertTrue(DeletedModels.objects.filter(id=child.id).exists())
+            self.assertEqual(
+                HardDeletedModels.objects.filter(id=child.id).exists(), i == 0
+            )
+
 
 class RecordMaxCounterUpdatesDuringSerialization(TestCase):
     def setUp(self):
@@ -335,6 +435,66 @@ class RecordMaxCounterUpdatesDuringSerialization(TestCase):
         self.assertEqual(new_rmc.counter, new_store_record.last_saved_counter)
         self.assertEqual(new_rmc.instance_id, new_store_record.last_saved_instance)
 
+    def test_update_rmcs_for_many_existing_models(self):
+        facs = [FacilityModelFactory() for _ in range(10)]
+        self.mc.serialize_into_store()
+        other_instance_id = uuid.uuid4().hex
+        RecordMaxCounter.objects.create(
+            instance_id=other_instance_id, store_model_id=self.fac1.id, counter=100
+        )
+
+        Facility.objects.update(name="facility")
+        self.mc.serialize_into_store()
+
+        for fac in facs + [self.fac1]:
+            rmcs = RecordMaxCounter.objects.filter(
+                instance_id=self.current_id.id, store_model_id=fac.id
+            )
+            self.assertEqual(rmcs.count(), 1)
+            self.assertEqual(
+                rmcs[0].counter, Store.objects.get(id=fac.id).last_saved_counter
+            )
+
+        # record max counters for other instances are left untouched
+        other_rmc = RecordMaxCounter.objects.get(
+            instance_id=other_instance_id, store_model_id=self.fac1.id
+        )
+        self.assertEqual(other_rmc.counter, 100)
+
+    def test_unchanged_model_is_not_reserialized(self):
+        old_store_record = Store.objects.get(id=self.fac1.id)
+        # saving marks the record dirty, without changing any of its data
+        self.fac1.save()
+        self.mc.serialize_into_store()
+
+        new_rmc = RecordMaxCounter.objects.get(
+            instance_id=self.current_id.id, store_model_id=self.fac1.id
+        )
+        new_store_record = Store.objects.get(id=self.fac1.id)
+
+        self.assertEqual(self.old_rmc.counter, new_rmc.counter)
+        self.assertEqual(
+            old_store_record.last_saved_counter, new_store_record.last_saved_counter
+        )
+        self.assertEqual(old_store_record.serialized, new_store_record.serialized)
+        self.assertFalse(Facility.objects.get(id=self.fac1.id)._morango_dirty_bit)
+
+    def test_unchanged_model_in_any_key_order_is_not_reserialized(self):
+        # store records serialized where dicts weren't ordered may have their keys in any order
+        serialized = json.loads(Store.objects.get(id=self.fac1.id).serialized)
+        reordered = json.dumps(
+            OrderedDict((key, serialized[key]) for key in sorted(serialized, reverse=True))
+        )
+        Store.objects.filter(id=self.fac1.id).update(serialized=reordered)
+        self.fac1.save()
+        self.mc.serialize_into_store()
+
+        new_rmc = RecordMaxCounter.objects.get(
+            instance_id=self.current_id.id, store_model_id=self.fac1.id
+        )
+        self.assertEqual(self.old_rmc.counter, new_rmc.counter)
+        self.assertEqual(reordered, Store.objects.get(id=self.fac1.id).serialized)
+
     def test_new_rmc_for_non_existent_model(self):
         with EnvironmentVarGuard() as env:
             env['MORANGO_SYSTEM_ID'] = 'new_sys_id'
@@ -571,6 +731,24 @@ class SelfReferentialFKDeserializationTestCase(TestCase):
         self.assertFalse(Facility.objects.filter(id=grandchild1.id).exists())
         self.assertFalse(Facility.objects.filter(id=grandchild2.id).exists())
 
+    # the facility's clean_fields looks up its parent, which raises before its FK is validated
+    @mock.patch.object(Facility, "clean_fields", models.Model.clean_fields)
+    def test_child_of_deleted_model_is_marked_clean(self):
+        root = FacilityModelFactory()
+        child = FacilityModelFactory(parent=root)
+        grandchild = FacilityModelFactory(parent=child)
+        self.mc.serialize_into_store()
+        # simulate a node being deleted and synced, with its child still in the store
+        Store.objects.filter(id=child.id).update(deleted=True)
+        Store.objects.update(dirty_bit=True)
+
+        self.mc.deserialize_from_store()
+
+        self.assertFalse(Facility.objects.filter(id=child.id).exists())
+        self.assertFalse(Facility.objects.filter(id=grandchild.id).exists())
+        # the child has an FK to a deleted record, so it isn't deserialized, but isn't left dirty
+        self.assertFalse(Store.objects.filter(dirty_bit=True).exists())
+
     def test_models_created_successfully(self):
         root = FacilityModelFactory()
         child1 = FacilityModelFactory(parent=root)
@@ -590,6 +768,30 @@ class SelfReferentialFKDeserializationTestCase(TestCase):
         self.assertTrue(child2.exists())
         self.assertEqual(child2[0].parent_id, root.id)
 
+    @mock.patch("morango.sync.operations.DESERIALIZE_CHUNK_SIZE", 2)
+    def test_deep_tree_deserialized_level_by_level(self):
+        root = FacilityModelFactory()
+        parent = root
+        facilities = [root]
+        for _ in range(4):
+            facilities.extend(FacilityModelFactory(parent=parent) for _ in range(3))
+            parent = facilities[-1]
+        self.mc.serialize_into_store()
+        Facility.objects.all().delete()
+        DeletedModels.objects.all().delete()
+        Store.objects.update(dirty_bit=True, deleted=False)
+
+        self.mc.deserialize_from_store()
+
+        self.assertFalse(Store.objects.filter(dirty_bit=True).exists())
+        for facility in facilities:
+            deserialized = Facility.objects.get(id=facility.id)
+            self.assertEqual(deserialized.parent_id, facility.parent_id)
+        # ensure the tree fields were rebuilt correctly
+        root = Facility.objects.get(id=root.id)
+        self.assertEqual(root.get_descendant_count(), len(facilities) - 1)
+        self.assertEqual(Facility.objects.get(id=facilities[-1].id).get_level(), 4)
+
     def test_deserialization_of_model_with_missing_parent(self):
         self._test_deserialization_of_model_with_missing_parent(correct_self_ref_fk=True)
 
@@ -705,6 +907,76 @@ class ForeignKeyDeserializationTestCase(TestCase):
         self.assertTrue(SummaryLog.objects.filter(id=new_log.id).exists())
 
 
+@pytest.mark.skipif(not settings.MORANGO_TEST_POSTGRESQL, reason="Only postgres")
+@override_settings(MORANGO_DESERIALIZE_WORKERS=2)
+class ParallelDeserializationTestCase(TransactionTestCase):
+    def setUp(self):
+        InstanceIDModel.get_or_create_current_instance()
+        self.mc = MorangoProfileController("facilitydata")
+        parent = FacilityModelFactory(name="parent")
+        FacilityModelFactory(name="child", parent=parent)
+        user = MyUser.objects.create(username="learner")
+        SummaryLog.objects.create(user=user)
+        self.mc.serialize_into_store()
+        # clear the app models, so they're deserialized again from the dirty store records
+        SummaryLog.objects.all().delete()
+        MyUser.objects.all().delete()
+        Facility.objects.all().delete()
+        Store.objects.update(dirty_bit=True)
+
+    def test_save_signals_are_muted_and_restored(self):
+        receiver = mock.Mock()
+        signals.post_save.connect(receiver, sender=Facility)
+        self.addCleanup(signals.post_save.disconnect, receiver, sender=Facility)
+        receivers = {
+            signal: list(signal.receivers)
+            for signal in (signals.pre_save, signals.post_save)
+        }
+
+        self.mc.deserialize_from_store()
+
+        self.assertEqual(2, Facility.objects.count())
+        self.assertEqual(1, SummaryLog.objects.count())
+        self.assertFalse(Store.objects.filter(dirty_bit=True).exists())
+        receiver.assert_not_called()
+        for signal, signal_receivers in receivers.items():
+            self.assertEqual(signal_receivers, signal.receivers)
+
+    def test_models_are_committed_independently(self):
+        deserialize_model = operations._deserialize_model_from_store
+
+        def _deserialize_model_from_store(model, *args, **kwargs):
+            if model is MyUser:
+                raise ValueError("failed")
+            return deserialize_model(model, *args, **kwargs)
+
+        with mock.patch(
+            "morango.sync.operations._deserialize_model_from_store",
+            side_effect=_deserialize_model_from_store,
+        ):
+            with self.assertRaises(ValueError):
+                self.mc.deserialize_from_store()
+
+        # the facilities were committed by their own worker, and aren't rolled back
+        self.assertEqual(2, Facility.objects.count())
+        self.assertFalse(
+            Store.objects.filter(model_name="facility", dirty_bit=True).exists()
+        )
+        # the failed model, and the model depending on it, are left dirty
+        self.assertFalse(MyUser.objects.exists())
+        self.assertFalse(SummaryLog.objects.exists())
+        self.assertEqual(
+            2,
+            Store.objects.filter(
+                model_name__in=["user", "contentsummarylog"], dirty_bit=True
+            ).count(),
+        )
+
+        self.mc.deserialize_from_store()
+        self.assertEqual(1, SummaryLog.objects.count())
+        self.assertFalse(Store.objects.filter(dirty_bit=True).exists())
+
+
 class SessionControllerTestCase(SimpleTestCase):
     def setUp(self):
         super(SessionControllerTestCase, self).setUp()
@@ -8,7 +8,9 @@ import mock
 import pytest
 from django.conf import settings
 from django.db import connection
+from django.db import transaction
 from django.test import override_settings
+from django.test import SimpleTestCase
 from django.test import TestCase
 from django.test import TransactionTestCase
 from django.utils import timezone
@@ -20,7 +22,7 @@ from ..helpers import create_buffer_and_store_dummy_data
 from ..helpers import create_dummy_store_data
 from morango.constants import transfer_statuses
 from morango.constants.capabilities import FSIC_V2_FORMAT
-from morango.errors import MorangoLimitExceeded
+from morango.constants.capabilities import INCREMENTAL_QUEUING
 from morango.models.certificates import Filter
 from morango.models.core import Buffer
 from morango.models.core import DatabaseIDModel
@@ -31,6 +33,8 @@ from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import Store
 from morango.models.core import SyncSession
 from morango.models.core import TransferSession
+from morango.sync import operations
+from morango.sync.backends.postgres import SQLWrapper as PostgresSQLWrapper
 from morango.sync.backends.utils import load_backend
 from morango.sync.context import LocalSessionContext
 from morango.sync.controller import MorangoProfileController
@@ -44,6 +48,7 @@ from morango.sync.operations import CleanupOperation
 from morango.sync.operations import InitializeOperation
 from morango.sync.operations import ProducerDequeueOperation
 from morango.sync.operations import ProducerQueueOperation
+from morango.sync.operations import PullProducerOperation
 from morango.sync.operations import ReceiverDequeueOperation
 from morango.sync.operations import ReceiverDeserializeOperation
 from morango.sync.operations import ReceiverQueueOperation
@@ -217,12 +222,15 @@ class QueueStoreIntoBufferV1TestCase(TestCase):
         assertRecordsBuffered(self.data["group1_c2"])
         assertRecordsBuffered(self.data["group2_c1"])
 
-    def test_too_many_fsics(self):
+    def test_no_fsics_limit(self):
         fsics = {self.data["group1_id"].id: 1, self.data["group2_id"].id: 1}
         fsics.update({uuid.uuid4().hex: i for i in range(100000)})
         self.transfer_session.client_fsic = json.dumps(fsics)
-        with self.assertRaises(MorangoLimitExceeded):
-            _queue_into_buffer_v1(self.transfer_session)
+        _queue_into_buffer_v1(self.transfer_session)
+        # ensure all store and buffer records are buffered
+        assertRecordsBuffered(self.data["group1_c1"])
+        assertRecordsBuffered(self.data["group1_c2"])
+        assertRecordsBuffered(self.data["group2_c1"])
 
     def test_fsic_specific_id(self):
         fsics = {self.data["group2_id"].id: 1}
@@ -430,23 +438,29 @@ class QueueStoreIntoBufferV2TestCase(TestCase):
         assertRecordsBuffered(self.data["group1_c2"])
         assertRecordsBuffered(self.data["group2_c1"])
 
-    def test_too_many_fsic_partitions(self):
+    def test_no_limit_fsic_partitions(self):
         fsics = {"super": {}, "sub": {"": {self.data["group1_id"].id: 1, self.data["group2_id"].id: 1}}}
         for i in range(5000):
             fsics["sub"][uuid.uuid4().hex] = {uuid.uuid4().hex: i for i in range(2)}
         self.transfer_session.client_fsic = json.dumps(fsics)
         self.transfer_session.server_fsic = json.dumps({"super": {}, "sub": {}})
-        with self.assertRaises(MorangoLimitExceeded):
-            _queue_into_buffer_v2(self.transfer_session, chunk_size=10)
+        _queue_into_buffer_v2(self.transfer_session)
+        # ensure all store and buffer records are buffered
+        assertRecordsBuffered(self.data["group1_c1"])
+        assertRecordsBuffered(self.data["group1_c2"])
+        assertRecordsBuffered(self.data["group2_c1"])
 
-    def test_too_many_fsic_instances(self):
+    def test_no_limit_fsic_instances(self):
         fsics = {"super": {}, "sub": {"": {self.data["group1_id"].id: 1, self.data["group2_id"].id: 1}}}
         for i in range(2):
             fsics["sub"][uuid.uuid4().hex] = {uuid.uuid4().hex: i for i in range(5000)}
         self.transfer_session.client_fsic = json.dumps(fsics)
         self.transfer_session.server_fsic = json.dumps({"super": {}, "sub": {}})
-        with self.assertRaises(MorangoLimitExceeded):
-            _queue_into_buffer_v2(self.transfer_session, chunk_size=10)
+        _queue_into_buffer_v2(self.transfer_session)
+        # ensure all store and buffer records are buffered
+        assertRecordsBuffered(self.data["group1_c1"])
+        assertRecordsBuffered(self.data["group1_c2"])
+        assertRecordsBuffered(self.data["group2_c1"])
 
     def test_fsic_specific_id(self):
         fsics = {"super": {}, "sub": {"": {self.data["group2_id"].id: 1}}}
@@ -517,6 +531,72 @@ class QueueStoreIntoBufferV2TestCase(TestCase):
         self.assertEqual(transfer_statuses.COMPLETED, operation.handle(self.context))
         mock_queue.assert_not_called()
 
+    def test_queue_in_batches(self):
+        fsics = {"super": {}, "sub": {"": {self.data["group1_id"].id: 1, self.data["group2_id"].id: 1}}}
+        self.transfer_session.client_fsic = json.dumps(fsics)
+        self.transfer_session.server_fsic = json.dumps({"super": {}, "sub": {}})
+        records = Store.objects.filter(
+            last_saved_instance__in=[self.data["group1_id"].id, self.data["group2_id"].id]
+        )
+        for i in range(records.count()):
+            self.assertEqual(1, _queue_into_buffer_v2(self.transfer_session, batch_size=1))
+            self.assertEqual(i + 1, Buffer.objects.count())
+        self.assertEqual(0, _queue_into_buffer_v2(self.transfer_session, batch_size=1))
+        # ensure all store and buffer records are buffered, once
+        assertRecordsBuffered(records)
+        self.assertEqual(records.count(), Buffer.objects.values("model_uuid").distinct().count())
+        self.assertEqual(
+            RecordMaxCounter.objects.filter(store_model__in=records).count(),
+            RecordMaxCounterBuffer.objects.count(),
+        )
+
+    @override_settings(MORANGO_QUEUE_BATCH_SIZE=2)
+    def test_local_queue_operation__incremental(self):
+        fsics = {"super": {}, "sub": {"": {self.data["group1_id"].id: 1, self.data["group2_id"].id: 1}}}
+        self.transfer_session.client_fsic = json.dumps(fsics)
+        self.transfer_session.server_fsic = json.dumps({"super": {}, "sub": {}})
+        self.context.is_pull = True
+        self.context.capabilities = [FSIC_V2_FORMAT, INCREMENTAL_QUEUING]
+        operation = ProducerQueueOperation()
+        self.assertEqual(transfer_statuses.COMPLETED, operation.handle(self.context))
+        # only the first batch is queued
+        self.assertEqual(2, self.transfer_session.records_total)
+        self.assertEqual(2, Buffer.objects.count())
+
+    @override_settings(MORANGO_QUEUE_BATCH_SIZE=2)
+    def test_pull_producer_operation__incremental(self):
+        fsics = {"super": {}, "sub": {"": {self.data["group1_id"].id: 1, self.data["group2_id"].id: 1}}}
+        self.transfer_session.client_fsic = json.dumps(fsics)
+        self.transfer_session.server_fsic = json.dumps({"super": {}, "sub": {}})
+        self.transfer_session.records_total = 0
+        self.transfer_session.records_transferred = 0
+        self.context.is_pull = True
+        self.context.is_producer = True
+        self.context.capabilities = [FSIC_V2_FORMAT, INCREMENTAL_QUEUING]
+        self.context.request = mock.Mock(data={})
+        records_count = Store.objects.filter(
+            last_saved_instance__in=[self.data["group1_id"].id, self.data["group2_id"].id]
+        ).count()
+
+        operation = PullProducerOperation()
+        while True:
+            records_total = self.transfer_session.records_total
+            status = operation.handle(self.context)
+            if status == transfer_statuses.COMPLETED:
+                break
+            self.assertEqual(transfer_statuses.PENDING, status)
+            # another batch is queued once the previous has been transferred
+            self.assertEqual(
+                min(records_total + 2, records_count), self.transfer_session.records_total
+            )
+            self.assertEqual(self.transfer_session.records_total, Buffer.objects.count())
+            self.transfer_session.records_transferred = self.transfer_session.records_total
+
+        self.assertEqual(records_count, self.transfer_session.records_total)
+        assertRecordsBuffered(self.data["group1_c1"])
+        assertRecordsBuffered(self.data["group1_c2"])
+        assertRecordsBuffered(self.data["group2_c1"])
+
 
 @override_settings(
     MORANGO_SERIALIZE_BEFORE_QUEUING=False, MORANGO_DISABLE_FSIC_V2_FORMAT=False
@@ -769,6 +849,164 @@ class DequeueBufferIntoStoreTestCase(TestCase):
         tagged_expected = set(store_ids)
         assert tagged_actual == tagged_expected
 
+    def _dequeued_state(self):
+        stores = set(
+            Store.objects.values_list(
+                "id", "serialized", "deleted", "hard_deleted", "last_saved_instance",
+                "last_saved_counter", "conflicting_serialized_data", "last_transfer_session_id",
+            )
+        )
+        rmcs = set(
+            RecordMaxCounter.objects.values_list("instance_id", "counter", "store_model_id")
+        )
+        return stores, rmcs
+
+    def _expected_dequeued_state(self):
+        # dequeues all at once, returning the resulting state after rolling it back
+        class Rollback(Exception):
+            pass
+
+        try:
+            with transaction.atomic():
+                _dequeue_into_store(self.transfer_session, self.transfer_session.client_fsic)
+                expected = self._dequeued_state()
+                raise Rollback()
+        except Rollback:
+            pass
+        return expected
+
+    def test_dequeue_in_batches(self):
+        expected = self._expected_dequeued_state()
+        counter = InstanceIDModel.objects.get(id=self.current_id.id).counter
+        _dequeue_into_store(
+            self.transfer_session, self.transfer_session.client_fsic, batch_size=1
+        )
+        self.assertEqual(expected, self._dequeued_state())
+        # the counter is only incremented once for all the batches
+        self.assertEqual(
+            counter + 1, InstanceIDModel.objects.get(id=self.current_id.id).counter
+        )
+        self.assertFalse(Buffer.objects.filter(transfer_session=self.transfer_session).exists())
+        self.assertFalse(
+            RecordMaxCounterBuffer.objects.filter(transfer_session=self.transfer_session).exists()
+        )
+
+    @pytest.mark.skipif(
+        not settings.MORANGO_TEST_POSTGRESQL, reason="Only postgres"
+    )
+    def test_merged_dequeue(self):
+        expected = self._expected_dequeued_state()
+        with override_settings(MORANGO_POSTGRES_MERGED_DEQUEUE=True):
+            _dequeue_into_store(self.transfer_session, self.transfer_session.client_fsic)
+        self.assertEqual(expected, self._dequeued_state())
+        self.assertFalse(Buffer.objects.filter(transfer_session=self.transfer_session).exists())
+        self.assertFalse(
+            RecordMaxCounterBuffer.objects.filter(transfer_session=self.transfer_session).exists()
+        )
+
+    def test_get_dequeue_instance(self):
+        current_id = operations._get_dequeue_instance(self.transfer_session)
+        counter = current_id.counter
+        self.transfer_session.refresh_from_db()
+        self.assertEqual(counter, self.transfer_session.dequeue_counter)
+        # the counter is reused for the transfer session
+        self.assertEqual(
+            counter, operations._get_dequeue_instance(self.transfer_session).counter
+        )
+        # unless another operation has since incremented it
+        InstanceIDModel.get_current_instance_and_increment_counter()
+        self.assertEqual(
+            counter + 2, operations._get_dequeue_instance(self.transfer_session).counter
+        )
+
+    @override_settings(MORANGO_INCREMENTAL_DEQUEUE=True)
+    def test_dequeue_received_chunks__reuses_counter(self):
+        counter = InstanceIDModel.objects.get(id=self.current_id.id).counter
+        # the merge conflicts of model2 and model5 are received in separate chunks
+        second_chunk = dict(
+            transfer_session=self.transfer_session, model_uuid=self.data["model5"]
+        )
+        buffers = list(Buffer.objects.filter(**second_chunk))
+        rmcbs = list(RecordMaxCounterBuffer.objects.filter(**second_chunk))
+        Buffer.objects.filter(**second_chunk).delete()
+        RecordMaxCounterBuffer.objects.filter(**second_chunk).delete()
+        operations._dequeue_received_chunk(self.transfer_session)
+        Buffer.objects.bulk_create(buffers)
+        RecordMaxCounterBuffer.objects.bulk_create(rmcbs)
+        operations._dequeue_received_chunk(self.transfer_session)
+
+        self.assertFalse(Buffer.objects.filter(transfer_session=self.transfer_session).exists())
+        for model_uuid in (self.data["model2"], self.data["model5"]):
+            store = Store.objects.get(id=model_uuid)
+            self.assertEqual(self.current_id.id, store.last_saved_instance)
+            self.assertEqual(counter + 1, store.last_saved_counter)
+        self.assertEqual(
+            counter + 1, InstanceIDModel.objects.get(id=self.current_id.id).counter
+        )
+
+    def test_dequeue_in_batches__resumes(self):
+        self.transfer_session.client_fsic = json.dumps({self.current_id.id: 1})
+        buffered = Buffer.objects.filter(transfer_session=self.transfer_session).count()
+        dequeue_batch = operations._dequeue_batch_into_store
+        calls = []
+
+        def _dequeue_batch(*args, **kwargs):
+            calls.append(kwargs["model_uuid_range"])
+            if len(calls) > 1:
+                raise RuntimeError("Dequeue failed")
+            dequeue_batch(*args, **kwargs)
+
+        with mock.patch(
+            "morango.sync.operations._dequeue_batch_into_store", side_effect=_dequeue_batch
+        ):
+            with self.assertRaises(RuntimeError):
+                _dequeue_into_store(
+                    self.transfer_session, self.transfer_session.client_fsic, batch_size=1
+                )
+        # the first batch was committed, but the fsics were not updated
+        self.assertEqual(
+            buffered - 1, Buffer.objects.filter(transfer_session=self.transfer_session).count()
+        )
+        self.assertFalse(DatabaseMaxCounter.objects.exists())
+
+        _dequeue_into_store(
+            self.transfer_session, self.transfer_session.client_fsic, batch_size=1
+        )
+        self.assertFalse(Buffer.objects.filter(transfer_session=self.transfer_session).exists())
+        self.assertTrue(DatabaseMaxCounter.objects.exists())
+
+    @pytest.mark.skipif(
+        not settings.MORANGO_TEST_POSTGRESQL, reason="Only postgres"
+    )
+    @override_settings(
+        MORANGO_POSTGRES_PREPARED_STATEMENTS=True, MORANGO_POSTGRES_MERGED_DEQUEUE=False
+    )
+    def test_dequeuing_reuses_prepared_statements(self):
+        def _prepared_statements():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT name FROM pg_prepared_statements WHERE name LIKE 'morango_%'"
+                )
+                return sorted(name for (name,) in cursor.fetchall())
+
+        _dequeue_into_store(self.transfer_session, self.transfer_session.client_fsic)
+        prepared_statements = _prepared_statements()
+        self.assertIn("morango_dequeuing_delete_rmcb_records", prepared_statements)
+        self.assertIn("morango_dequeuing_insert_remaining_buffer", prepared_statements)
+
+        transfer_session = TransferSession.objects.create(
+            id=uuid.uuid4().hex,
+            sync_session=self.transfer_session.sync_session,
+            push=True,
+            last_activity_timestamp=timezone.now(),
+        )
+        create_buffer_and_store_dummy_data(transfer_session.id)
+        _dequeue_into_store(transfer_session, transfer_session.client_fsic)
+        self.assertEqual(prepared_statements, _prepared_statements())
+        self.assertFalse(
+            Buffer.objects.filter(transfer_session_id=transfer_session.id).exists()
+        )
+
     def test_dequeuing_delete_rmcb_records(self):
         for i in self.data["model1_rmcb_ids"]:
             self.assertTrue(
@@ -1132,6 +1370,42 @@ class DequeueBufferIntoStoreTestCase(TestCase):
         )
 
 
+class PostgresExecuteStatementTestCase(SimpleTestCase):
+    def setUp(self):
+        self.backend = PostgresSQLWrapper(
+            mock.Mock(spec=["ensure_connection", "connection"])
+        )
+        self.cursor = mock.Mock()
+
+    def test_execute_statement(self):
+        self.backend._execute_statement(
+            self.cursor, "statement", "SELECT %s, '%%'", ["a"]
+        )
+        self.cursor.execute.assert_called_once_with("SELECT %s, '%%'", ["a"])
+
+    @override_settings(MORANGO_POSTGRES_PREPARED_STATEMENTS=True)
+    def test_execute_statement__prepared(self):
+        for _ in range(2):
+            self.backend._execute_statement(
+                self.cursor, "statement", "SELECT %s, '%%'", ["a"]
+            )
+        self.assertEqual(
+            [
+                mock.call("PREPARE morango_statement AS SELECT $1, '%'"),
+                mock.call("EXECUTE morango_statement (%s)", ["a"]),
+                mock.call("EXECUTE morango_statement (%s)", ["a"]),
+            ],
+            self.cursor.execute.call_args_list,
+        )
+
+    @override_settings(MORANGO_POSTGRES_PREPARED_STATEMENTS=True)
+    def test_execute_statement__prepared__temp_table(self):
+        self.backend._execute_statement(
+            self.cursor, "statement", "SELECT %s", ["a"], uses_temp_table=True
+        )
+        self.cursor.execute.assert_called_once_with("SELECT %s", ["a"])
+
+
 class DeserializationTestCases(TestCase):
 
     def setUp(self):
@@ -1154,7 +1428,7 @@ class DeserializationTestCases(TestCase):
             "content_id": uuid.uuid4().hex,
         }
 
-    def serialize_to_store(self, Model, data):
+    def serialize_to_store(self, Model, data, **kwargs):
         instance = Model(**data)
         serialized = instance.serialize()
         Store.objects.create(
@@ -1167,6 +1441,7 @@ class DeserializationTestCases(TestCase):
             partition=instance._morango_partition,
             source_id=instance._morango_source_id,
             model_name=instance.morango_model_name,
+            **kwargs
         )
 
     def serialize_all_to_store(self):
@@ -1229,3 +1504,54 @@ class DeserializationTestCases(TestCase):
         _deserialize_from_store(self.profile)
 
         self.assert_deserialization(log1_deserialized=False)
+
+    def test_deserialization_errors_recorded(self):
+        self.serialized_user["username"] = ""
+        self.serialized_log2["content_id"] = "invalid"
+        self.serialize_all_to_store()
+
+        _deserialize_from_store(self.profile)
+
+        self.assert_deserialization(
+            user_deserialized=False, log1_deserialized=False, log2_deserialized=False
+        )
+        user_error = Store.objects.get(id=self.serialized_user["id"]).deserialization_error
+        self.assertIn("username", user_error)
+        log1_error = Store.objects.get(id=self.serialized_log1["id"]).deserialization_error
+        self.assertIn("failed to deserialize", log1_error)
+        log2_error = Store.objects.get(id=self.serialized_log2["id"]).deserialization_error
+        self.assertNotEqual(log2_error, "")
+
+    def test_scoped_deserialization__skips_other_records(self):
+        transfer_session_id = uuid.uuid4().hex
+        self.serialize_all_to_store()
+        other_user = {
+            "id": uuid.uuid4().hex,
+            "username": "otheruser",
+            "password": "testpassword",
+        }
+        self.serialize_to_store(
+            MyUser, other_user, last_transfer_session_id=transfer_session_id
+        )
+
+        _deserialize_from_store(self.profile, transfer_session_id=transfer_session_id)
+
+        self.assertTrue(MyUser.objects.filter(id=other_user["id"]).exists())
+        self.assertFalse(Store.objects.get(id=other_user["id"]).dirty_bit)
+        self.assert_deserialization(
+            user_deserialized=False, log1_deserialized=False, log2_deserialized=False
+        )
+
+    def test_scoped_deserialization__retries_dependent_errors(self):
+        transfer_session_id = uuid.uuid4().hex
+        self.serialize_to_store(
+            MyUser, self.serialized_user, last_transfer_session_id=transfer_session_id
+        )
+        self.serialize_to_store(
+            SummaryLog, self.serialized_log1, deserialization_error="error"
+        )
+        self.serialize_to_store(SummaryLog, self.serialized_log2)
+
+        _deserialize_from_store(self.profile, transfer_session_id=transfer_session_id)
+
+        self.assert_deserialization(log2_deserialized=False)
@@ -24,6 +24,25 @@ class SessionWrapperTestCase(TestCase):
         head_length = len("HTTP/1.1 200 OK") + _length_of_headers(headers)
         self.assertEqual(wrapper.bytes_received, 1024 + head_length)
 
+    @mock.patch("morango.sync.session.Session.request")
+    def test_request__gzipped(self, mocked_super_request):
+        headers = {"Content-Encoding": "gzip"}
+        mocked_super_request.return_value = mock.Mock(
+            headers=headers,
+            raise_for_status=mock.Mock(),
+            status_code=200,
+            reason="OK",
+            content=b"a" * 1024,
+            raw=mock.Mock(tell=mock.Mock(return_value=64)),
+        )
+
+        wrapper = SessionWrapper()
+        wrapper.request("GET", "test_url")
+
+        # the bytes received are those of the gzipped content, not the decoded content
+        head_length = len("HTTP/1.1 200 OK") + _length_of_headers(headers)
+        self.assertEqual(wrapper.bytes_received, 64 + head_length)
+
     @mock.patch("morango.sync.session.logger")
     @mock.patch("morango.sync.session.Session.request")
     def test_request__not_ok(self, mocked_super_request, mocked_logger):
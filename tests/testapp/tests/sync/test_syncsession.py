@@ -9,9 +9,11 @@ from requests.exceptions import HTTPError
 from ..helpers import BaseClientTestCase
 from ..helpers import BaseTransferClientTestCase
 from morango.api.serializers import CertificateSerializer
+from morango.compression import ZstdCompression
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.constants.capabilities import ALLOW_CERTIFICATE_PUSHING
+from morango.constants.capabilities import BUFFER_KEYSET_PAGINATION
 from morango.errors import CertificateSignatureInvalid
 from morango.errors import MorangoError
 from morango.errors import MorangoResumeSyncError
@@ -21,6 +23,7 @@ from morango.models.certificates import Filter
 from morango.models.certificates import Key
 from morango.models.certificates import ScopeDefinition
 from morango.models.core import SyncSession
+from morango.models.core import TransferSession
 from morango.models.fields.crypto import SharedKey
 from morango.sync.context import LocalSessionContext
 from morango.sync.context import NetworkSessionContext
@@ -218,6 +221,49 @@ class NetworkSyncConnectionTestCase(LiveServerTestCase):
         self.assertEqual(data[0]["id"], self.root_cert.id)
         self.assertEqual(data[1]["id"], self.subset_cert.id)
 
+    @mock.patch.object(SessionWrapper, "request")
+    def test_pull_record_chunk(self, mock_request):
+        transfer_session = TransferSession(id=uuid.uuid4().hex, records_transferred=5)
+        self.network_connection.capabilities = []
+        self.network_connection._pull_record_chunk(
+            transfer_session, last_model_uuid="abc"
+        )
+        params = mock_request.call_args[1]["params"]
+        self.assertEqual(5, params["offset"])
+        self.assertNotIn("after", params)
+
+    @mock.patch.object(SessionWrapper, "request")
+    def test_pull_record_chunk__keyset(self, mock_request):
+        transfer_session = TransferSession(id=uuid.uuid4().hex, records_transferred=5)
+        self.network_connection.capabilities = [BUFFER_KEYSET_PAGINATION]
+        self.network_connection._pull_record_chunk(
+            transfer_session, last_model_uuid="abc"
+        )
+        params = mock_request.call_args[1]["params"]
+        self.assertEqual(0, params["offset"])
+        self.assertEqual("abc", params["after"])
+
+        # without the last model UUID, it continues from the offset
+        self.network_connection._pull_record_chunk(transfer_session)
+        params = mock_request.call_args[1]["params"]
+        self.assertEqual(5, params["offset"])
+        self.assertEqual("", params["after"])
+
+    @mock.patch.object(SessionWrapper, "request")
+    def test_push_record_chunk__compresslevel(self, mock_request):
+        compression = ZstdCompression()
+        self.network_connection.compresslevel = 9
+        with mock.patch.object(
+            compression, "compress", return_value=b""
+        ) as mock_compress, mock.patch(
+            "morango.sync.syncsession.negotiate_compression", return_value=compression
+        ):
+            self.network_connection._push_record_chunk([{"model_uuid": "abc"}])
+        # the gzip level is mapped to the negotiated compression's highest level
+        self.assertEqual(19, mock_compress.call_args[1]["level"])
+        headers = mock_request.call_args[1]["headers"]
+        self.assertEqual(compression.media_type, headers["content-type"])
+
     @mock.patch.object(SyncSession.objects, "create")
     def test_close_sync_session(self, mock_create):
         mock_session = mock.Mock(spec=SyncSession)
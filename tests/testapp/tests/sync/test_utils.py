@@ -1,6 +1,13 @@
+import threading
+from collections import OrderedDict
+
 import mock
+from django.test import SimpleTestCase
 from django.test import TestCase
 
+from morango.errors import MorangoError
+from morango.sync.utils import BackgroundCall
+from morango.sync.utils import run_in_dependency_order
 from morango.sync.utils import SyncSignal
 from morango.sync.utils import SyncSignalGroup
 
@@ -76,3 +83,53 @@ class SyncSignalGroupTestCase(TestCase):
             completed_handler.assert_not_called()
 
         completed_handler.assert_called_once_with(this_is_a_default=True, other="A")
+
+
+class RunInDependencyOrderTestCase(SimpleTestCase):
+    def setUp(self):
+        self.dependencies = OrderedDict(
+            [
+                ("user", set()),
+                ("facility", set()),
+                ("log", {"user", "other_profile_model"}),
+                ("interaction", {"user", "log"}),
+            ]
+        )
+
+    def test_runs_nodes_after_their_dependencies(self):
+        completed = []
+        lock = threading.Lock()
+
+        def func(node):
+            with lock:
+                for dependency in self.dependencies[node]:
+                    if dependency in self.dependencies:
+                        self.assertIn(dependency, completed)
+                completed.append(node)
+
+        run_in_dependency_order(self.dependencies, func, 3)
+        self.assertEqual(set(completed), set(self.dependencies))
+
+    def test_error_stops_dependents(self):
+        func = mock.Mock(side_effect=lambda node: 1 / (node != "user"))
+        with self.assertRaises(ZeroDivisionError):
+            run_in_dependency_order(self.dependencies, func, 2)
+        called = set(call[0][0] for call in func.call_args_list)
+        self.assertNotIn("log", called)
+        self.assertNotIn("interaction", called)
+
+    def test_dependency_cycle(self):
+        self.dependencies["user"] = {"interaction"}
+        with self.assertRaises(MorangoError):
+            run_in_dependency_order(self.dependencies, mock.Mock(), 2)
+
+
+class BackgroundCallTestCase(SimpleTestCase):
+    def test_result(self):
+        call = BackgroundCall(lambda a, b=0: a + b, 1, b=2)
+        self.assertEqual(3, call.result())
+
+    def test_error(self):
+        call = BackgroundCall(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            call.result()
@@ -1,8 +1,14 @@
+import gzip
+import io
 import json
 import sys
 import uuid
+from multiprocessing.pool import ThreadPool
 from test.support import EnvironmentVarGuard
 
+import mock
+import pytest
+from django.conf import settings
 from django.db import connection
 from django.test.utils import CaptureQueriesContext
 from django.test.utils import override_settings
@@ -11,13 +17,17 @@ from django.urls.exceptions import NoReverseMatch
 from django.utils import timezone
 from django.utils.functional import SimpleLazyObject
 from facility_profile.models import MyUser
+from rest_framework.test import APIClient
 from rest_framework.test import APITestCase as BaseTestCase
+from rest_framework.test import APITransactionTestCase
 
 from morango.api.serializers import BufferSerializer
 from morango.api.serializers import CertificateSerializer
 from morango.api.serializers import InstanceIDSerializer
+from morango.compression import GzipCompression
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
+from morango.constants.capabilities import GZIP_BUFFER_GET
 from morango.models.certificates import Certificate
 from morango.models.certificates import Key
 from morango.models.certificates import Nonce
@@ -30,7 +40,6 @@ from morango.models.core import SyncSession
 from morango.models.core import TransferSession
 from morango.models.fields.crypto import SharedKey
 from morango.registry import syncable_models
-from morango.sync.syncsession import compress_string
 from morango.sync.utils import validate_and_create_buffer_data
 
 if sys.version_info >= (3,):
@@ -922,7 +931,7 @@ class BufferEndpointTestCase(CertificateTestCaseMixin, APITestCase):
         # gzip the content before sending the request
         if gzip:
             new_data = json.dumps([dict(el) for el in data])
-            data = compress_string(bytes(new_data.encode("utf-8")))
+            data = GzipCompression().compress(new_data.encode("utf-8"))
             headers["content_type"] = "application/gzip"
             headers["format"] = None
 
@@ -955,6 +964,21 @@ class BufferEndpointTestCase(CertificateTestCaseMixin, APITestCase):
         rec_3 = self.build_buffer_item(transfer_session=rec_1.transfer_session)
         self.make_buffer_post_request([rec_1, rec_2, rec_3], expected_status=201)
 
+    def test_push_valid_buffer_chunk_again(self):
+        rec_1 = self.build_buffer_item(push=True, filter=self.default_push_filter)
+        rec_2 = self.build_buffer_item(transfer_session=rec_1.transfer_session)
+        rec_3 = self.build_buffer_item(transfer_session=rec_1.transfer_session)
+        data = BufferSerializer([rec_1, rec_2, rec_3], many=True).data
+        self.make_buffer_post_request([rec_1, rec_2, rec_3], expected_status=201)
+
+        # a chunk pushed again, such as after a failed concurrent push, is skipped
+        response = self.client.post(reverse("buffers-list"), data, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Buffer.objects.count(), 3)
+        self.assertEqual(RecordMaxCounterBuffer.objects.count(), 9)
+        transfer_session = TransferSession.objects.get(id=rec_1.transfer_session_id)
+        self.assertEqual(3, transfer_session.records_transferred)
+
     def test_push_with_invalid_model_uuid(self):
         rec_1 = self.build_buffer_item(push=True, filter=self.default_push_filter)
         rec_2 = self.build_buffer_item(
@@ -1070,6 +1094,17 @@ class BufferEndpointTestCase(CertificateTestCaseMixin, APITestCase):
             for q in ctx.captured_queries:
                 self.assertFalse('morango_transfersession' in q['sql'])
 
+    def test_buffer_serializer_loads_rmcbs_in_one_query(self):
+        transfer_session_id = self.create_records_for_pulling(count=5)
+        buffers = Buffer.objects.filter(transfer_session_id=transfer_session_id)
+        expected = [BufferSerializer(instance=buffer).data for buffer in buffers]
+
+        with self.assertNumQueries(2):
+            data = BufferSerializer(instance=buffers, many=True).data
+        self.assertEqual(expected, data)
+        for record in data:
+            self.assertEqual(3, len(record["rmcb_list"]))
+
     def test_pull_valid_buffer_list(self):
 
         transfer_session_id = self.create_records_for_pulling()
@@ -1167,6 +1202,170 @@ class BufferEndpointTestCase(CertificateTestCaseMixin, APITestCase):
             last_transfer_session_id = self.create_records_for_pulling(count=10)
             offset += 5
 
+    def test_pull_gzipped(self):
+        transfer_session_id = self.create_records_for_pulling(count=5)
+        get_params = dict(transfer_session_id=transfer_session_id, limit=3, offset=1)
+        expected = json.loads(
+            self.client.get(reverse("buffers-list"), get_params).content.decode()
+        )
+
+        response = self.client.get(
+            reverse("buffers-list"),
+            get_params,
+            HTTP_X_MORANGO_CAPABILITIES=GZIP_BUFFER_GET,
+            HTTP_ACCEPT_ENCODING="gzip, deflate",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        content = io.BytesIO(b"".join(response.streaming_content))
+        with gzip.GzipFile(fileobj=content) as f:
+            data = json.loads(f.read().decode("utf-8"))
+        self.assertEqual(expected, data)
+        self.assertEqual(3, len(data["results"]))
+
+    def test_pull_gzipped__serialized_while_streamed(self):
+        transfer_session_id = self.create_records_for_pulling(count=3)
+        get_params = dict(transfer_session_id=transfer_session_id, limit=3, after="")
+        expected = json.loads(
+            self.client.get(reverse("buffers-list"), get_params).content.decode()
+        )
+
+        serialized = []
+        original_to_representation = BufferSerializer.to_representation
+
+        def to_representation(serializer, instance):
+            serialized.append(instance.model_uuid)
+            return original_to_representation(serializer, instance)
+
+        with mock.patch.object(BufferSerializer, "to_representation", to_representation):
+            response = self.client.get(
+                reverse("buffers-list"),
+                get_params,
+                HTTP_X_MORANGO_CAPABILITIES=GZIP_BUFFER_GET,
+                HTTP_ACCEPT_ENCODING="gzip",
+            )
+            self.assertEqual([], serialized)
+            with CaptureQueriesContext(connection) as ctx:
+                content = io.BytesIO(b"".join(response.streaming_content))
+            self.assertEqual(3, len(serialized))
+
+        # the record max counter buffers of the page are loaded together
+        rmcb_queries = [
+            q
+            for q in ctx.captured_queries
+            if "morango_recordmaxcounterbuffer" in q["sql"]
+        ]
+        self.assertEqual(1, len(rmcb_queries))
+
+        with gzip.GzipFile(fileobj=content) as f:
+            self.assertEqual(expected, json.loads(f.read().decode("utf-8")))
+
+    def test_pull_gzipped__not_accepted(self):
+        transfer_session_id = self.create_records_for_pulling(count=1)
+        response = self.client.get(
+            reverse("buffers-list"),
+            dict(transfer_session_id=transfer_session_id),
+            HTTP_X_MORANGO_CAPABILITIES=GZIP_BUFFER_GET,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_pull_by_keyset(self):
+        transfer_session_id = self.create_records_for_pulling(count=10)
+        model_uuids = sorted(
+            Buffer.objects.filter(transfer_session_id=transfer_session_id).values_list(
+                "model_uuid", flat=True
+            )
+        )
+
+        after = ""
+        returned_uuids = []
+        while True:
+            response = self.client.get(
+                reverse("buffers-list"),
+                dict(transfer_session_id=transfer_session_id, limit=3, after=after),
+                format="json",
+            )
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.content.decode())
+            self.assertNotIn("count", data)
+            if not data["results"]:
+                break
+            returned_uuids.extend(d["model_uuid"] for d in data["results"])
+            after = returned_uuids[-1]
+
+        self.assertEqual(model_uuids, returned_uuids)
+
+    def test_pull_by_keyset__offset(self):
+        transfer_session_id = self.create_records_for_pulling(count=5)
+        model_uuids = sorted(
+            Buffer.objects.filter(transfer_session_id=transfer_session_id).values_list(
+                "model_uuid", flat=True
+            )
+        )
+        response = self.client.get(
+            reverse("buffers-list"),
+            dict(transfer_session_id=transfer_session_id, limit=3, offset=3, after=""),
+            format="json",
+        )
+        data = json.loads(response.content.decode())
+        self.assertEqual(model_uuids[3:], [d["model_uuid"] for d in data["results"]])
+
+    def test_pull_by_keyset__invalid(self):
+        transfer_session_id = self.create_records_for_pulling(count=1)
+        self.make_buffer_get_request(
+            transfer_session_id=transfer_session_id,
+            limit=3,
+            after="invalid",
+            expected_status=404,
+        )
+
+
+@pytest.mark.skipif(not settings.MORANGO_TEST_POSTGRESQL, reason="Only postgres")
+class ConcurrentBufferEndpointTestCase(CertificateTestCaseMixin, APITransactionTestCase):
+    build_buffer_item = BufferEndpointTestCase.build_buffer_item
+
+    def setUp(self):
+        super(ConcurrentBufferEndpointTestCase, self).setUp()
+        self.default_push_filter = str(
+            self.sub_subset_cert1_with_key.get_scope().write_filter
+        )
+
+    def test_push_buffer_chunks_concurrently(self):
+        rec_1 = self.build_buffer_item(push=True, filter=self.default_push_filter)
+        records = [rec_1] + [
+            self.build_buffer_item(transfer_session=rec_1.transfer_session)
+            for _ in range(5)
+        ]
+        chunks = [
+            BufferSerializer(records[i : i + 2], many=True).data
+            for i in range(0, len(records), 2)
+        ]
+        Buffer.objects.all().delete()
+        RecordMaxCounterBuffer.objects.all().delete()
+
+        # each chunk is pushed twice, as when a failed concurrent push is retried
+        requests = chunks * 2
+
+        def push(data):
+            try:
+                return APIClient().post(reverse("buffers-list"), data, format="json")
+            finally:
+                connection.close()
+
+        pool = ThreadPool(len(requests))
+        try:
+            responses = pool.map(push, requests)
+        finally:
+            pool.close()
+            pool.join()
+
+        self.assertEqual([201] * len(requests), [r.status_code for r in responses])
+        self.assertEqual(len(records), Buffer.objects.count())
+        self.assertEqual(len(records) * 3, RecordMaxCounterBuffer.objects.count())
+        transfer_session = TransferSession.objects.get(id=rec_1.transfer_session_id)
+        self.assertEqual(len(records), transfer_session.records_transferred)
+
 
 def _lazy_settings():
     return {"this_is_a_test": "lazy"}
@@ -0,0 +1,53 @@
+import datetime
+import json
+import uuid
+
+import pytest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+
+from morango.codecs import get_json_codec
+from morango.codecs import JSONCodec
+from morango.codecs import ORJSON_EXISTS
+from morango.codecs import OrjsonCodec
+
+
+class JSONCodecTestCase(SimpleTestCase):
+    def setUp(self):
+        self.data = {
+            "id": uuid.uuid4().hex,
+            "name": "school",
+            "now_date": datetime.datetime(2020, 1, 2, 3, 4, 5, 678901),
+            "uuid": uuid.uuid4(),
+            "count": 3,
+            "missing": None,
+        }
+
+    def test_default_codec(self):
+        self.assertIsInstance(get_json_codec(), JSONCodec)
+        self.assertIs(get_json_codec(), get_json_codec())
+
+    def test_dumps__matches_django_encoder(self):
+        self.assertEqual(
+            JSONCodec().dumps(self.data), DjangoJSONEncoder().encode(self.data)
+        )
+
+    def test_loads(self):
+        encoded = JSONCodec().dumps(self.data)
+        self.assertEqual(JSONCodec().loads(encoded), json.loads(encoded))
+
+    def test_loads__dumps_in_same_order(self):
+        encoded = '{"b": 1, "a": {"d": 2, "c": 3}, "e": null}'
+        self.assertEqual(encoded, JSONCodec().dumps(JSONCodec().loads(encoded)))
+
+    @override_settings(MORANGO_JSON_CODEC="morango.codecs:OrjsonCodec")
+    @pytest.mark.skipif(not ORJSON_EXISTS, reason="orjson is not installed")
+    def test_orjson_codec(self):
+        codec = get_json_codec()
+        self.assertIsInstance(codec, OrjsonCodec)
+        encoded = codec.dumps(self.data)
+        self.assertEqual(
+            json.loads(encoded), json.loads(DjangoJSONEncoder().encode(self.data))
+        )
+        self.assertEqual(codec.loads(encoded), JSONCodec().loads(encoded))
@@ -0,0 +1,193 @@
+import io
+import json
+
+import mock
+import pytest
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+
+from morango.api.parsers import COMPRESSED_PARSERS
+from morango.compression import decode_response_json
+from morango.compression import get_compression_for_media_type
+from morango.compression import GzipCompression
+from morango.compression import LZ4_EXISTS
+from morango.compression import Lz4Compression
+from morango.compression import negotiate_compression
+from morango.compression import ZSTD_EXISTS
+from morango.compression import ZstdCompression
+from morango.constants.capabilities import GZIP_BUFFER_GET
+from morango.constants.capabilities import GZIP_BUFFER_POST
+from morango.constants.capabilities import LZ4_BUFFER_COMPRESSION
+from morango.constants.capabilities import ZSTD_BUFFER_COMPRESSION
+from morango.utils import get_capabilities
+
+
+ALL_CAPABILITIES = {
+    GZIP_BUFFER_GET,
+    GZIP_BUFFER_POST,
+    LZ4_BUFFER_COMPRESSION,
+    ZSTD_BUFFER_COMPRESSION,
+}
+
+
+class CompressionTestCaseMixin(object):
+    compression = None
+
+    def setUp(self):
+        self.data = json.dumps(
+            [{"serialized": '{"name": "record"}', "counter": i} for i in range(100)]
+        ).encode("utf-8")
+
+    def test_compress(self):
+        compressed = self.compression.compress(self.data)
+        self.assertLess(len(compressed), len(self.data))
+        self.assertEqual(self.data, self.compression.decompress(compressed))
+
+    def test_compress__level(self):
+        compressed = self.compression.compress(self.data, level=1)
+        self.assertEqual(self.data, self.compression.decompress(compressed))
+
+    def test_compressobj(self):
+        compressor = self.compression.compressobj()
+        compressed = b"".join(
+            [
+                compressor.compress(self.data[:100]),
+                compressor.compress(self.data[100:]),
+                compressor.flush(),
+            ]
+        )
+        self.assertEqual(self.data, self.compression.decompress(compressed))
+
+    def test_compress__gzip_levels(self):
+        for gzip_level in range(1, 10):
+            level = self.compression.from_gzip_level(gzip_level)
+            compressed = self.compression.compress(self.data, level=level)
+            self.assertEqual(self.data, self.compression.decompress(compressed))
+
+    def test_parse(self):
+        parser = next(
+            parser
+            for parser in COMPRESSED_PARSERS
+            if parser.media_type == self.compression.media_type
+        )
+        records = json.loads(self.data.decode("utf-8"))
+        stream = io.BytesIO(self.compression.compress(self.data))
+        self.assertEqual(records, parser().parse(stream))
+
+
+class GzipCompressionTestCase(CompressionTestCaseMixin, SimpleTestCase):
+    compression = GzipCompression()
+
+    def test_decompress__gzip_file(self):
+        import gzip
+
+        with gzip.GzipFile(fileobj=io.BytesIO(self.compression.compress(self.data))) as f:
+            self.assertEqual(self.data, f.read())
+
+
+class FromGzipLevelTestCase(SimpleTestCase):
+    def test_gzip(self):
+        compression = GzipCompression()
+        self.assertIsNone(compression.from_gzip_level(None))
+        for level in range(1, 10):
+            self.assertEqual(level, compression.from_gzip_level(level))
+
+    def test_zstd(self):
+        compression = ZstdCompression()
+        self.assertEqual(1, compression.from_gzip_level(1))
+        self.assertEqual(3, compression.from_gzip_level(6))
+        self.assertEqual(19, compression.from_gzip_level(9))
+        self.assertEqual(19, compression.from_gzip_level(12))
+
+    def test_lz4(self):
+        compression = Lz4Compression()
+        self.assertEqual(0, compression.from_gzip_level(1))
+        self.assertEqual(0, compression.from_gzip_level(6))
+        self.assertEqual(16, compression.from_gzip_level(9))
+
+
+@pytest.mark.skipif(not ZSTD_EXISTS, reason="zstandard is not installed")
+class ZstdCompressionTestCase(CompressionTestCaseMixin, SimpleTestCase):
+    compression = ZstdCompression()
+
+
+@pytest.mark.skipif(not LZ4_EXISTS, reason="lz4 is not installed")
+class Lz4CompressionTestCase(CompressionTestCaseMixin, SimpleTestCase):
+    compression = Lz4Compression()
+
+
+@mock.patch("morango.compression.CAPABILITIES", ALL_CAPABILITIES)
+class NegotiateCompressionTestCase(SimpleTestCase):
+    def test_preferred(self):
+        self.assertEqual("zstd", negotiate_compression(ALL_CAPABILITIES).name)
+        self.assertEqual("zstd", negotiate_compression(ALL_CAPABILITIES, pull=True).name)
+
+    def test_remote_capabilities(self):
+        capabilities = {GZIP_BUFFER_POST, LZ4_BUFFER_COMPRESSION}
+        self.assertEqual("lz4", negotiate_compression(capabilities).name)
+        self.assertEqual("gzip", negotiate_compression({GZIP_BUFFER_POST}).name)
+        self.assertIsNone(negotiate_compression({GZIP_BUFFER_POST}, pull=True))
+        self.assertIsNone(negotiate_compression(set()))
+
+    @override_settings(MORANGO_COMPRESSION=("gzip", "zstd"))
+    def test_setting(self):
+        self.assertEqual("gzip", negotiate_compression(ALL_CAPABILITIES).name)
+        capabilities = {LZ4_BUFFER_COMPRESSION, ZSTD_BUFFER_COMPRESSION}
+        self.assertEqual("zstd", negotiate_compression(capabilities).name)
+        self.assertIsNone(negotiate_compression({LZ4_BUFFER_COMPRESSION}))
+
+    def test_local_capabilities(self):
+        with mock.patch("morango.compression.CAPABILITIES", {GZIP_BUFFER_POST}):
+            self.assertEqual("gzip", negotiate_compression(ALL_CAPABILITIES).name)
+
+
+class FallbackCompressionTestCase(SimpleTestCase):
+    def test_without_optional_packages(self):
+        modules = {"zstandard": None, "lz4": None, "lz4.frame": None}
+        with mock.patch.dict("sys.modules", modules):
+            capabilities = get_capabilities()
+
+        self.assertNotIn(ZSTD_BUFFER_COMPRESSION, capabilities)
+        self.assertNotIn(LZ4_BUFFER_COMPRESSION, capabilities)
+        with mock.patch("morango.compression.CAPABILITIES", capabilities):
+            self.assertEqual("gzip", negotiate_compression(ALL_CAPABILITIES).name)
+            self.assertEqual(
+                "gzip", negotiate_compression(ALL_CAPABILITIES, pull=True).name
+            )
+
+    def test_installed_packages(self):
+        unavailable = set()
+        if not ZSTD_EXISTS:
+            unavailable.add(ZstdCompression.name)
+        if not LZ4_EXISTS:
+            unavailable.add(Lz4Compression.name)
+
+        for pull in (False, True):
+            compression = negotiate_compression(ALL_CAPABILITIES, pull=pull)
+            self.assertNotIn(compression.name, unavailable)
+
+
+class DecodeResponseJSONTestCase(SimpleTestCase):
+    def test_get_compression_for_media_type(self):
+        self.assertEqual(
+            "zstd", get_compression_for_media_type("application/zstd").name
+        )
+        self.assertEqual(
+            "gzip", get_compression_for_media_type("application/gzip; q=1").name
+        )
+        self.assertIsNone(get_compression_for_media_type("application/json"))
+        self.assertIsNone(get_compression_for_media_type(None))
+
+    def test_decode_response_json(self):
+        response = mock.Mock(headers={"Content-Type": "application/json"})
+        response.json.return_value = {"results": []}
+        self.assertEqual({"results": []}, decode_response_json(response))
+
+    def test_decode_response_json__compressed(self):
+        data = {"results": [{"model_uuid": "abc"}]}
+        response = mock.Mock(
+            headers={"Content-Type": "application/gzip"},
+            content=GzipCompression().compress(json.dumps(data).encode("utf-8")),
+        )
+        self.assertEqual(data, decode_response_json(response))
+        response.json.assert_not_called()
@@ -7,6 +7,7 @@ import pytest
 
 from morango.constants.capabilities import ALLOW_CERTIFICATE_PUSHING
 from morango.constants.capabilities import ASYNC_OPERATIONS
+from morango.constants.capabilities import CONCURRENT_BUFFER_POST
 from morango.constants.capabilities import FSIC_V2_FORMAT
 from morango.constants import transfer_stages
 from morango.utils import SETTINGS
@@ -68,6 +69,13 @@ class CapabilitiesTestCase(SimpleTestCase):
         with self.settings(MORANGO_DISABLE_FSIC_V2_FORMAT=True):
             self.assertNotIn(FSIC_V2_FORMAT, get_capabilities())
 
+    def test_get_capabilities__concurrent_buffer_post(self):
+        with self.settings(MORANGO_INCREMENTAL_DEQUEUE=False):
+            self.assertIn(CONCURRENT_BUFFER_POST, get_capabilities())
+
+        with self.settings(MORANGO_INCREMENTAL_DEQUEUE=True):
+            self.assertNotIn(CONCURRENT_BUFFER_POST, get_capabilities())
+
     @mock.patch("morango.utils.CAPABILITIES", ("TEST", "SERIALIZE"))
     def test_serialize(self):
         req = Request()